@@ -0,0 +1,183 @@
+"""
+Deterministic SIP/SDP corpus for the benchmarks
+"""
+import hashlib
+import random
+from typing import Dict, List
+
+DOMAIN = "ims.mnc221.mcc302.3gppnetwork.org"
+
+CODECS = [
+    ("EVS/16000", "br=5.9-24.4;bw=nb-swb;ch-aw-recv=2"),
+    ("AMR-WB/16000/1", "mode-set=0,1,2;mode-change-capability=2;max-red=220"),
+    ("AMR-WB/16000/1", "mode-set=0,1,2;octet-align=1;mode-change-capability=2;max-red=220"),
+    ("AMR/8000/1", "mode-change-capability=2;max-red=220"),
+    ("AMR/8000/1", "octet-align=1;mode-change-capability=2;max-red=220"),
+    ("H264/90000", "profile-level-id=42e01f;packetization-mode=1"),
+    ("H265/90000", "profile-id=1;level-id=93"),
+    ("telephone-event/16000", "0-15"),
+    ("telephone-event/8000", "0-15"),
+]
+
+KINDS = ("invite_sdp", "register_digest", "response_many_via", "compact")
+
+
+def _token(rnd: random.Random, length: int = 16) -> str:
+    return "".join(rnd.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(length))
+
+
+def _ipv6(rnd: random.Random) -> str:
+    return "2001:56b:f:%x:0:%x:%x:%x" % tuple(rnd.randrange(0x10000) for _ in range(4))
+
+
+def _join(lines: List[str], body: str = "") -> str:
+    lines = [line for line in lines if line]
+    lines.append(f"Content-Length: {len(body)}")
+    return "\r\n".join(lines) + "\r\n\r\n" + body
+
+
+def make_sdp(rnd: random.Random, media_count: int = 4) -> str:
+    addr = _ipv6(rnd)
+    session_id = rnd.randrange(10 ** 10, 10 ** 11)
+    lines = [
+        "v=0",
+        f"o=SAMSUNG-IMS-UE {session_id} {session_id} IN IP6 {addr}",
+        "s=SS VOIP",
+        f"c=IN IP6 {addr}",
+        "t=0 0",
+    ]
+    for i in range(media_count):
+        media = "audio" if i % 2 == 0 else "video"
+        payload_types = list(range(96 + i * 10, 96 + i * 10 + len(CODECS)))
+        lines.append(f"m={media} {rnd.randrange(1024, 65535)} RTP/AVP " + " ".join(map(str, payload_types)))
+        for pt, (codec, fmtp) in zip(payload_types, CODECS):
+            lines.append(f"a=rtpmap:{pt} {codec}")
+            lines.append(f"a=fmtp:{pt} {fmtp}")
+
+        lines += [
+            "a=curr:qos local none",
+            "a=curr:qos remote none",
+            "a=des:qos mandatory local sendrecv",
+            "a=des:qos optional remote sendrecv",
+            "a=sendrecv",
+            "a=ptime:20",
+            "a=maxptime:240",
+        ]
+
+    return "\r\n".join(lines) + "\r\n"
+
+
+def make_invite(rnd: random.Random) -> str:
+    ue, callee = _ipv6(rnd), rnd.randrange(10 ** 10, 10 ** 11)
+    user = rnd.randrange(10 ** 10, 10 ** 11)
+    body = make_sdp(rnd)
+    return _join(
+        [
+            f"INVITE sip:{callee};phone-context={DOMAIN}@{DOMAIN};user=phone SIP/2.0",
+            f"Via: SIP/2.0/TCP [{ue}]:7200;branch=z9hG4bK-524287-1---{_token(rnd)};rport;transport=TCP",
+            "Max-Forwards: 70",
+            f"Route: <sip:[{_ipv6(rnd)}]:12003;lr>",
+            "Proxy-Require: sec-agree",
+            "Require: sec-agree",
+            f'Contact: <sip:{user}@[{ue}]:7200>;+sip.instance="<urn:gsma:imei:35269610-004503-0>";'
+            '+g.3gpp.icsi-ref="urn%3Aurn-7%3A3gpp-service.ims.icsi.mmtel";+g.3gpp.mid-call;'
+            "+g.3gpp.srvcc-alerting;+g.3gpp.ps2cs-srvcc-orig-pre-alerting",
+            f"To: <sip:{callee};phone-context={DOMAIN}@{DOMAIN};user=phone>",
+            f"From: <sip:{user}@{DOMAIN}>;tag={_token(rnd, 8)}",
+            f"Call-ID: {_token(rnd, 22)}..@{ue}",
+            "CSeq: 1 INVITE",
+            "Session-Expires: 1800",
+            "Accept: application/sdp, application/3gpp-ims+xml",
+            "Allow: INVITE, ACK, OPTIONS, CANCEL, BYE, UPDATE, INFO, REFER, NOTIFY, MESSAGE, PRACK",
+            "Content-Type: application/sdp",
+            "Supported: timer, 100rel, precondition, gruu, sec-agree",
+            "User-Agent: SM-G975W-G975WVLS5GUD1 6.0",
+            f"P-Preferred-Identity: <sip:{user}@{DOMAIN}>",
+            'Accept-Contact: *;+g.3gpp.icsi-ref="urn%3Aurn-7%3A3gpp-service.ims.icsi.mmtel"',
+            "P-Early-Media: supported",
+            "P-Preferred-Service: urn:urn-7:3gpp-service.ims.icsi.mmtel",
+            "P-Access-Network-Info: 3GPP-E-UTRAN-FDD;utran-cell-id-3gpp=3022202b081b15848",
+        ],
+        body,
+    )
+
+
+def make_register(rnd: random.Random) -> str:
+    ue, imsi = _ipv6(rnd), "30222100%07d" % rnd.randrange(10 ** 7)
+    response = hashlib.md5(_token(rnd).encode()).hexdigest()
+    return _join(
+        [
+            f"REGISTER sip:{DOMAIN} SIP/2.0",
+            f"Via: SIP/2.0/TCP [{ue}]:8800;branch=z9hG4bK-524287-1---{_token(rnd)};rport;transport=TCP",
+            "Max-Forwards: 70",
+            "Proxy-Require: sec-agree",
+            "Require: sec-agree",
+            f'Contact: <sip:{imsi}@192.168.1.10:8800>;+sip.instance="<urn:gsma:imei:35269610-004587-0>";'
+            'q=1.0;+g.3gpp.icsi-ref="urn%3Aurn-7%3A3gpp-service.ims.icsi.mmtel";+g.3gpp.smsip',
+            f"To: <sip:{imsi}@{DOMAIN}>",
+            f"From: <sip:{imsi}@{DOMAIN}>;tag={_token(rnd, 8)}",
+            f"Call-ID: {_token(rnd, 22)}..@{ue}",
+            f"CSeq: {rnd.randrange(1, 100)} REGISTER",
+            "Expires: 3600",
+            "Allow: INVITE, ACK, OPTIONS, CANCEL, BYE, UPDATE, INFO, REFER, NOTIFY, MESSAGE, PRACK",
+            "Supported: path, gruu, sec-agree",
+            "User-Agent: SM-G975W-G975WVLU4FUA2 6.0",
+            f'Authorization: Digest username="{imsi}@{DOMAIN}",realm="{DOMAIN}",uri="sip:{DOMAIN}",'
+            f'nonce="{_token(rnd, 44)}",response="{response}",algorithm=MD5,nc=00000005,qop=auth,'
+            f'cnonce="{_token(rnd, 32)}"',
+            "Security-Client: ipsec-3gpp;prot=esp;mod=trans;spi-c=73111;spi-s=73112;port-c=8802;port-s=8800;alg=hmac-sha-1-96;ealg=null",
+            "P-Access-Network-Info: 3GPP-E-UTRAN-FDD;utran-cell-id-3gpp=302220d6dd8683a2a",
+        ]
+    )
+
+
+def make_response(rnd: random.Random, hops: int = 8) -> str:
+    user = rnd.randrange(10 ** 10, 10 ** 11)
+    lines = ["SIP/2.0 180 Ringing"]
+    for i in range(hops):
+        lines.append(
+            f"Via: SIP/2.0/UDP pcscf{i}.{DOMAIN}:5060;branch=z9hG4bK{_token(rnd)};received=10.0.{i}.1;rport=5060"
+        )
+    for i in range(hops):
+        lines.append(f"Record-Route: <sip:scscf{i}.{DOMAIN};transport=udp;lr>")
+
+    lines += [
+        f"From: <sip:{user}@{DOMAIN}>;tag={_token(rnd, 8)}",
+        f"To: <sip:{user + 1}@{DOMAIN}>;tag={_token(rnd, 8)}",
+        f"Call-ID: {_token(rnd, 22)}@{DOMAIN}",
+        "CSeq: 1 INVITE",
+        f"Contact: <sip:{user + 1}@[{_ipv6(rnd)}]:5060>",
+    ]
+    return _join(lines)
+
+
+def make_compact(rnd: random.Random) -> str:
+    user = rnd.randrange(10 ** 10, 10 ** 11)
+    body = make_sdp(rnd, media_count=1)
+    lines = [
+        f"INVITE sip:{user + 1}@{DOMAIN} SIP/2.0",
+        f"v: SIP/2.0/UDP 10.0.0.1:5060;branch=z9hG4bK{_token(rnd)}",
+        f"f: <sip:{user}@{DOMAIN}>;tag={_token(rnd, 8)}",
+        f"t: <sip:{user + 1}@{DOMAIN}>",
+        f"i: {_token(rnd, 22)}@10.0.0.1",
+        "CSeq: 1 INVITE",
+        f"m: <sip:{user}@10.0.0.1:5060>",
+        "k: 100rel, timer",
+        "c: application/sdp",
+        "Max-Forwards: 70",
+    ]
+    return "\r\n".join(lines) + f"\r\nl: {len(body)}\r\n\r\n" + body
+
+
+GENERATORS = {
+    "invite_sdp": make_invite,
+    "register_digest": make_register,
+    "response_many_via": make_response,
+    "compact": make_compact,
+}
+
+
+def generate_corpus(count: int = 200, seed: int = 1) -> Dict[str, List[str]]:
+    """ count messages of each kind, always the same ones for a given seed """
+    rnd = random.Random(seed)
+    return {kind: [GENERATORS[kind](rnd) for _ in range(count)] for kind in KINDS}
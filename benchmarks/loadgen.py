@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+SIP load generator over loopback UDP.
+
+    python benchmarks/loadgen.py [--scenario invite] [--rate 200] [--duration 10]
+                                 [--target 127.0.0.1:5060] [--uas-only]
+                                 [--min-cps 150] [--max-failures 0]
+
+Without --target, a UAS (sip_loadgen.LoadUas) is started in a child process on --port.
+The UAC runs REGISTER, OPTIONS or INVITE/ACK/BYE scenarios at --rate per second and
+reports the achieved scenarios per second (CPS), final response times per request method
+(INVITE and BYE separately for calls) and the retransmissions of both sides. --min-cps and --max-failures make the exit status
+nonzero when they're not met, to gate releases on it. --uas-only just runs the UAS.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sys
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sip_loadgen import SCENARIOS, DEFAULT_MAX_INFLIGHT, LoadUac, LoadUas  # noqa: E402
+
+READY_TIMEOUT = 10.0
+
+
+async def _serve(host: str, port: int, ready: Any, stop: Any, results: Optional[Any]):
+    uas = LoadUas()
+    await uas.start(host, port)
+    ready.set()
+
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, stop.wait)
+    uas.close()
+    if results is not None:
+        results.put({"requests": dict(uas.requests), "retransmissions": uas.retransmissions,
+                     "dropped": uas.endpoint.dropped})
+
+
+def _run_uas(host: str, port: int, ready: Any, stop: Any, results: Optional[Any]):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent stops it
+    asyncio.run(_serve(host, port, ready, stop, results))
+
+
+def _print_report(args: argparse.Namespace, report: Dict[str, Any], uas: Optional[Dict[str, Any]]):
+    print(f"scenario {args.scenario}: {report['started']} started at {args.rate:g}/s for {args.duration:g}s")
+    print(f"  completed {report['completed']}, failed {report['failed']}, timeouts {report['timeouts']}, "
+          f"unfinished {report['unfinished']}")
+    print(f"  achieved {report['cps']:.1f} CPS")
+    print(f"  retransmissions: UAC {report['retransmissions']}", end="")
+    if uas is not None:
+        print(f", UAS {uas['retransmissions']} (UAS dropped {uas['dropped']})")
+    else:
+        print()
+
+    for method, stats in report["methods"].items():
+        print(
+            f"  {method} response time ms: p50 {stats['p50_ms']:.2f}  p90 {stats['p90_ms']:.2f}  "
+            f"p99 {stats['p99_ms']:.2f}  max {stats['max_ms']:.2f}"
+        )
+        print(f"  {method} final responses: {stats['statuses']}, timeouts {stats['timeouts']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS, default="invite")
+    parser.add_argument("--rate", type=float, default=200.0, help="scenarios started per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--max-inflight", type=int, default=DEFAULT_MAX_INFLIGHT)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=15070, help="UAS port")
+    parser.add_argument("--target", help="host:port of an external UAS")
+    parser.add_argument("--uas-only", action="store_true", help="only run the UAS")
+    parser.add_argument("--min-cps", type=float, help="fail if the achieved CPS is lower")
+    parser.add_argument("--max-failures", type=int, help="fail if more scenarios failed or didn't finish")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.uas_only:
+        stop = multiprocessing.Event()
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        print(f"UAS listening on {args.host}:{args.port}")
+        asyncio.run(_serve(args.host, args.port, multiprocessing.Event(), stop, None))
+        return 0
+
+    uas_process = uas_stats = None
+    if args.target:
+        host, _, port = args.target.rpartition(":")
+        target = (host, int(port))
+    else:
+        target = (args.host, args.port)
+        ready, stop, results = multiprocessing.Event(), multiprocessing.Event(), multiprocessing.Queue()
+        uas_process = multiprocessing.Process(
+            target=_run_uas, args=(args.host, args.port, ready, stop, results), daemon=True
+        )
+        uas_process.start()
+        if not ready.wait(READY_TIMEOUT):
+            uas_process.terminate()
+            raise RuntimeError("The UAS didn't start")
+
+    try:
+        uac = LoadUac(args.scenario, target, args.rate, args.duration, args.max_inflight)
+        report = asyncio.run(uac.run(args.host)).report()
+    finally:
+        if uas_process is not None:
+            stop.set()
+            uas_stats = results.get(timeout=READY_TIMEOUT)
+            uas_process.join()
+
+    if args.json:
+        print(json.dumps({"uac": report, "uas": uas_stats}, indent=2))
+    else:
+        _print_report(args, report, uas_stats)
+
+    failures = report["failed"] + report["unfinished"]
+    if args.min_cps is not None and report["cps"] < args.min_cps:
+        print(f"FAIL: {report['cps']:.1f} CPS is below {args.min_cps:g}", file=sys.stderr)
+        return 1
+    if args.max_failures is not None and failures > args.max_failures:
+        print(f"FAIL: {failures} failed scenarios, at most {args.max_failures} allowed", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""
+Capture ingestion benchmark: SIP messages read from a pcap/pcapng file with sip_pcap.
+
+    python benchmarks/pcap.py [--size 256] [--format pcap|pcapng] [--capture file.pcap]
+
+Without --capture, a capture of --size MB is generated in a temporary file: SIP over
+UDP (IPv4 and IPv6) and over TCP (messages split over segments, some out of order or
+retransmitted) mixed with RTP packets. The reader's throughput in MB/s and messages/s is
+reported, for decoding the frames only and for the full parse, along with the peak RSS
+growth, which stays flat whatever the capture size.
+"""
+import argparse
+import os
+import random
+import resource
+import struct
+import sys
+import tempfile
+import time
+from typing import BinaryIO, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import generate_corpus  # noqa: E402
+from sip_pcap import PcapReader, TCP_SYN  # noqa: E402
+
+MAC_HEADER = b"\x02\x00\x00\x00\x00\x01\x02\x00\x00\x00\x00\x02"
+TCP_ACK_PSH = 0x18
+
+
+def _ipv4(src: int, dst: int, protocol: int, payload: bytes) -> bytes:
+    header = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(payload), 0, 0x4000, 64, protocol, 0,
+                         src.to_bytes(4, "big"), dst.to_bytes(4, "big"))
+    return MAC_HEADER + b"\x08\x00" + header + payload
+
+
+def _ipv6(src: int, dst: int, protocol: int, payload: bytes) -> bytes:
+    header = struct.pack("!IHBB16s16s", 0x60000000, len(payload), protocol, 64,
+                         src.to_bytes(16, "big"), dst.to_bytes(16, "big"))
+    return MAC_HEADER + b"\x86\xdd" + header + payload
+
+
+def _udp(sport: int, dport: int, payload: bytes) -> bytes:
+    return struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload
+
+
+def _tcp(sport: int, dport: int, seq: int, flags: int, payload: bytes) -> bytes:
+    return struct.pack("!HHIIBBHHH", sport, dport, seq, 0, 5 << 4, flags, 65535, 0, 0) + payload
+
+
+class CaptureWriter:
+    """ Writes Ethernet frames as pcap or pcapng (nanosecond timestamps) """
+
+    def __init__(self, out: BinaryIO, fmt: str):
+        self.out = out
+        self.fmt = fmt
+        if fmt == "pcap":
+            out.write(struct.pack("<IHHiIII", 0xA1B23C4D, 2, 4, 0, 0, 65535, 1))
+        else:
+            out.write(struct.pack("<IIIHHqI", 0x0A0D0D0A, 28, 0x1A2B3C4D, 1, 0, -1, 28))
+            options = struct.pack("<HHB3xHH", 9, 1, 9, 0, 0)  # if_tsresol: nanoseconds
+            length = 20 + len(options)
+            out.write(struct.pack("<IIHHI", 1, length, 1, 0, 65535) + options + struct.pack("<I", length))
+
+    def write(self, timestamp_ns: int, frame: bytes):
+        if self.fmt == "pcap":
+            seconds, ns = divmod(timestamp_ns, 10 ** 9)
+            self.out.write(struct.pack("<IIII", seconds, ns, len(frame), len(frame)) + frame)
+        else:
+            padding = -len(frame) % 4
+            length = 32 + len(frame) + padding
+            self.out.write(
+                struct.pack("<IIIIIII", 6, length, 0, timestamp_ns >> 32, timestamp_ns & 0xFFFFFFFF,
+                            len(frame), len(frame))
+                + frame + b"\0" * padding + struct.pack("<I", length)
+            )
+
+
+def write_capture(path: str, size: int, fmt: str, seed: int = 1) -> int:
+    """ Writes about `size` bytes of capture, returns the number of SIP messages in it """
+    rnd = random.Random(seed)
+    messages = [raw.encode() for kind in generate_corpus(100).values() for raw in kind]
+    rtp = [bytes([0x80, 0]) + rnd.randbytes(170) for _ in range(16)]
+    expected = 0
+    timestamp = 1_700_000_000 * 10 ** 9
+    flows: List[Tuple[int, int]] = []  # (client port, next seq)
+
+    with open(path, "wb") as out:
+        writer = CaptureWriter(out, fmt)
+        while out.tell() < size:
+            timestamp += rnd.randrange(10_000, 200_000)
+            kind = rnd.random()
+            if kind < 0.3:
+                writer.write(timestamp, _ipv4(0x0A000001, 0x0A000002, 17, _udp(4000, 4002, rnd.choice(rtp))))
+                continue
+
+            message = rnd.choice(messages)
+            expected += 1
+            if kind < 0.75:
+                writer.write(timestamp, _ipv4(0x0A000001, 0x0A000002, 17, _udp(5060, 5060, message)))
+            elif kind < 0.85:
+                writer.write(timestamp, _ipv6(0x20010DB8 << 96 | 1, 0x20010DB8 << 96 | 2, 17,
+                                              _udp(5060, 5060, message)))
+            else:
+                if not flows or rnd.random() < 0.01:
+                    port, seq = 30000 + len(flows), rnd.randrange(1 << 32)
+                    writer.write(timestamp, _ipv4(0x0A000001, 0x0A000003, 6, _tcp(port, 5060, seq, TCP_SYN, b"")))
+                    flows.append((port, (seq + 1) & 0xFFFFFFFF))
+
+                index = rnd.randrange(len(flows))
+                port, seq = flows[index]
+                cut = rnd.randrange(1, len(message))
+                segments = [(seq, message[:cut]), ((seq + cut) & 0xFFFFFFFF, message[cut:])]
+                if rnd.random() < 0.1:
+                    segments.reverse()  # Out of order
+                if rnd.random() < 0.1:
+                    segments.append(segments[0])  # Retransmission
+                for segment_seq, data in segments:
+                    writer.write(timestamp, _ipv4(0x0A000001, 0x0A000003, 6,
+                                                  _tcp(port, 5060, segment_seq, TCP_ACK_PSH, data)))
+                flows[index] = (port, (seq + len(message)) & 0xFFFFFFFF)
+
+    return expected
+
+
+def _max_rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run(path: str, expected: Optional[int]):
+    size = os.path.getsize(path)
+    rss_before = _max_rss_kb()
+
+    with PcapReader(path) as reader:
+        start = time.perf_counter()
+        frames = sum(1 for _ in reader.iter_frames())
+        frames_elapsed = time.perf_counter() - start
+
+    with PcapReader(path) as reader:
+        start = time.perf_counter()
+        count = sum(1 for _ in reader)
+        elapsed = time.perf_counter() - start
+        errors, skipped = reader.errors, reader.skipped
+
+    mb = size / 1e6
+    print(f"{mb:.1f} MB, {frames} frames")
+    print(f"  frames only   {mb / frames_elapsed:>8.1f} MB/s")
+    print(f"  SIP messages  {mb / elapsed:>8.1f} MB/s  {count / elapsed:>9.0f} msg/s  "
+          f"({count} messages, {errors} errors, {skipped} skipped)")
+    if expected is not None:
+        print(f"  expected {expected} messages: {'ok' if count == expected else 'MISMATCH'}")
+    print(f"  peak RSS growth {(_max_rss_kb() - rss_before) / 1024:.1f} MB")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=float, default=256, help="MB of generated capture")
+    parser.add_argument("--format", choices=("pcap", "pcapng"), default="pcap")
+    parser.add_argument("--capture", help="read this capture instead of a generated one")
+    args = parser.parse_args(argv)
+
+    if args.capture:
+        run(args.capture, None)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"capture.{args.format}")
+        expected = write_capture(path, int(args.size * 1e6), args.format)
+        run(path, expected)
+
+
+if __name__ == "__main__":
+    main()
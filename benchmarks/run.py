@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for the SIP/SDP parser, runnable offline.
+
+    python benchmarks/run.py [--count 200] [--repeat 5] [--filter from_string]
+                             [--output results.json] [--compare baseline.json]
+
+For every benchmark it reports messages (operations) per second, latency percentiles
+and peak traced memory per message. --output writes the results as JSON and --compare
+prints the change against a previous results file.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import generate_corpus, make_sdp  # noqa: E402
+import sip_parser  # noqa: E402
+from sip_message import SipMessage  # noqa: E402
+from sdp_message import SdpMessage  # noqa: E402
+from sip_peek import peek  # noqa: E402
+from sdp_fields import Codec  # noqa: E402
+from sdp_negotiation import CodecNegotiator, offer_key  # noqa: E402
+from sip_template import MessageTemplate, Slot  # noqa: E402
+
+MEMORY_SAMPLE_SIZE = 100
+
+# Local codecs of the SDP negotiation benchmarks
+CAPABILITIES = {
+    "audio": [
+        Codec(None, "AMR-WB", 16000, 1, "octet-align=1"),
+        Codec(None, "AMR", 8000, 1, None),
+        Codec(None, "PCMU", 8000, 1, None),
+        Codec(None, "telephone-event", 16000, 1, None),
+    ],
+    "video": [Codec(None, "H264", 90000, 1, "packetization-mode=1")],
+}
+
+
+# from_dict data of an OPTIONS keepalive, with slots for the per-message values
+def _options_data(call_id: Any, branch: Any, from_tag: Any, cseq: Any) -> Dict[str, Any]:
+    return {
+        "method": "OPTIONS",
+        "uri": "sip:gateway@192.0.2.10:5060",
+        "version": "2.0",
+        "headers": {
+            "via": [{"version": "2.0", "protocol": "UDP", "host": "192.0.2.20", "port": 5060,
+                     "params": {"branch": branch, "rport": None}}],
+            "max-forwards": 70,
+            "from": {"name": "Monitor", "uri": "sip:monitor@192.0.2.20", "params": {"tag": from_tag}},
+            "to": {"uri": "sip:gateway@192.0.2.10", "params": {}},
+            "call-id": call_id,
+            "cseq": {"seq": cseq, "method": "OPTIONS"},
+            "contact": [{"uri": "sip:monitor@192.0.2.20:5060", "params": {}}],
+            "accept": "application/sdp",
+            "user-agent": "pySIP monitor",
+        },
+    }
+
+
+class Benchmark:
+    """ An operation run over every input of a corpus """
+
+    def __init__(self, name: str, fn: Callable[[Any], Any], inputs: Sequence):
+        self.name = name
+        self.fn = fn
+        self.inputs = inputs
+
+
+def _percentile(sorted_values: List[int], pct: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _header_values(corpus: Dict[str, List[str]], names: Sequence[str]) -> List[str]:
+    values = []
+    for messages in corpus.values():
+        for raw in messages:
+            for line in raw.split("\r\n\r\n", 1)[0].split("\r\n")[1:]:
+                name, _, value = line.partition(":")
+                if name.strip().lower() in names:
+                    values.append(value.strip())
+
+    return values
+
+
+def build_benchmarks(corpus: Dict[str, List[str]]) -> List[Benchmark]:
+    benchmarks = []
+    for kind, messages in corpus.items():
+        raw_bytes = [raw.encode() for raw in messages]
+        parsed = [SipMessage.from_string(raw) for raw in messages]
+        as_dicts = [
+            {
+                "method": m.method,
+                "uri": m.uri,
+                "version": m.version,
+                "headers": m.headers.copy(),
+                "content": m.content,
+            }
+            if m.type == SipMessage.TYPE_REQUEST
+            else {
+                "status": m.status,
+                "reason": m.reason,
+                "version": m.version,
+                "headers": m.headers.copy(),
+                "content": m.content,
+            }
+            for m in parsed
+        ]
+
+        benchmarks += [
+            Benchmark(f"sip.from_string[{kind}]", SipMessage.from_string, messages),
+            Benchmark(
+                f"sip.from_string_lazy[{kind}]",
+                lambda raw: SipMessage.from_string(raw, lazy=True),
+                messages,
+            ),
+            Benchmark(f"sip.from_bytes[{kind}]", SipMessage.from_bytes, raw_bytes),
+            # Messages from the wire (unmodified headers copied verbatim) and built ones
+            Benchmark(
+                f"sip.stringify[{kind}]",
+                SipMessage.stringify,
+                [SipMessage.from_string(raw, lazy=True) for raw in messages],
+            ),
+            Benchmark(
+                f"sip.stringify_rendered[{kind}]",
+                SipMessage.stringify,
+                [SipMessage.from_dict(dict(data, headers=dict(data["headers"]))) for data in as_dicts],
+            ),
+            Benchmark(f"sip.from_dict[{kind}]", SipMessage.from_dict, as_dicts),
+            Benchmark(f"sip.peek[{kind}]", peek, messages),
+            Benchmark(f"sip.peek_bytes[{kind}]", peek, raw_bytes),
+        ]
+
+    vias = _header_values(corpus, ("via", "v"))
+    aors = _header_values(corpus, ("from", "to", "f", "t", "contact", "m"))
+    routes = _header_values(corpus, ("route", "record-route"))
+    auths = _header_values(corpus, ("authorization",))
+    cseqs = _header_values(corpus, ("cseq",))
+    uris = [sip_parser.parse_aor(aor)[0]["uri"] for aor in aors]
+    params = [aor[aor.index(">") + 1 :] for aor in aors if ">" in aor]
+
+    benchmarks += [
+        Benchmark("parser.parse_via", sip_parser.parse_via, vias),
+        Benchmark("parser.parse_aor", sip_parser.parse_aor, aors),
+        Benchmark("parser.parse_uri", sip_parser.parse_uri, uris),
+        Benchmark("parser.parse_aor_with_uri", sip_parser.parse_aor_with_uri, routes),
+        Benchmark("parser.parse_auth_header_with_scheme", sip_parser.parse_auth_header_with_scheme, auths),
+        Benchmark("parser.parse_params", sip_parser.parse_params, params),
+        Benchmark("parser.parse_cseq", sip_parser.parse_cseq, cseqs),
+        Benchmark(
+            "parser.parse_multi_header[via]",
+            lambda value: sip_parser.parse_multi_header(sip_parser.parse_via, value),
+            [", ".join(vias[i : i + 8]) for i in range(0, len(vias), 8)],
+        ),
+    ]
+
+    sdp_bodies = [
+        raw.split("\r\n\r\n", 1)[1].strip()
+        for kind in ("invite_sdp", "compact")
+        for raw in corpus[kind]
+    ]
+    # Conference/video offers with many media descriptions
+    conference = [make_sdp(random.Random(seed), media_count=24) for seed in range(20)]
+    for name, bodies in (("", sdp_bodies), ("[conference]", conference)):
+        benchmarks += [
+            Benchmark(f"sdp.from_string{name}", SdpMessage.from_string, bodies),
+            Benchmark(
+                f"sdp.from_string_lazy{name}",
+                lambda raw: SdpMessage.from_string(raw, lazy=True),
+                bodies,
+            ),
+        ]
+
+    # Offers parsed beforehand: the memoized negotiation against a fresh one each time
+    offers = [SdpMessage.from_string(body) for body in sdp_bodies]
+    negotiator = CodecNegotiator(CAPABILITIES)
+    benchmarks += [
+        Benchmark("sdp.negotiate", negotiator.negotiate, offers),
+        Benchmark(
+            "sdp.negotiate_uncached",
+            lambda offer: negotiator.negotiate_key(offer_key(offer)),
+            offers,
+        ),
+    ]
+
+    # Message generation: from_dict + stringify for each message against a template
+    options_template = MessageTemplate(_options_data(Slot("call_id"), Slot("branch"), Slot("from_tag"), Slot("cseq")))
+    options_values = [
+        {"call_id": f"{i:08x}@192.0.2.20", "branch": f"z9hG4bK{i:08x}", "from_tag": f"{i:06x}", "cseq": i}
+        for i in range(1, 201)
+    ]
+    benchmarks += [
+        Benchmark(
+            "build.from_dict_stringify[options]",
+            lambda values: SipMessage.from_dict(_options_data(**values)).stringify().encode(),
+            options_values,
+        ),
+        Benchmark("build.template_render[options]", lambda values: options_template.render(**values), options_values),
+    ]
+
+    return benchmarks
+
+
+def run_benchmark(benchmark: Benchmark, repeat: int) -> Dict[str, Any]:
+    fn, inputs = benchmark.fn, benchmark.inputs
+    result: Dict[str, Any] = {"name": benchmark.name, "inputs": len(inputs)}
+    try:
+        fn(inputs[0])  # Warm up (and fail early)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+
+    # Throughput, timing whole passes so the clock isn't part of the measure
+    gc.collect()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for value in inputs:
+            fn(value)
+        best = min(best, time.perf_counter() - start)
+
+    # Latency of each operation
+    perf_counter_ns = time.perf_counter_ns
+    latencies = []
+    for value in inputs:
+        start = perf_counter_ns()
+        fn(value)
+        latencies.append(perf_counter_ns() - start)
+    latencies.sort()
+
+    # Peak memory, keeping the results alive as a caller would
+    sample = inputs[:MEMORY_SAMPLE_SIZE]
+    gc.collect()
+    tracemalloc.start()
+    kept = [fn(value) for value in sample]
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del kept
+
+    result.update(
+        {
+            "ops_per_sec": round(len(inputs) / best, 1),
+            "p50_us": round(_percentile(latencies, 50) / 1000, 2),
+            "p90_us": round(_percentile(latencies, 90) / 1000, 2),
+            "p99_us": round(_percentile(latencies, 99) / 1000, 2),
+            "max_us": round(latencies[-1] / 1000, 2),
+            "peak_bytes_per_op": round(peak / len(sample)),
+        }
+    )
+    return result
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+
+    print(f"\nChange against {baseline_path} (throughput, peak memory):")
+    for result in results:
+        old = baseline.get(result["name"])
+        if not old or "ops_per_sec" not in old or "ops_per_sec" not in result:
+            continue
+
+        speed = (result["ops_per_sec"] / old["ops_per_sec"] - 1) * 100
+        memory = (result["peak_bytes_per_op"] / max(old["peak_bytes_per_op"], 1) - 1) * 100
+        print(f"  {result['name']:<48} {speed:+7.1f}% {memory:+7.1f}%")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200, help="messages of each kind in the corpus")
+    parser.add_argument("--seed", type=int, default=1, help="corpus generation seed")
+    parser.add_argument("--repeat", type=int, default=5, help="timed passes, the best one is kept")
+    parser.add_argument("--filter", default="", help="only run benchmarks containing this text")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="results JSON of a previous run to compare against")
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.count, args.seed)
+    results = []
+    print(f"{'benchmark':<48} {'msg/s':>10} {'p50 us':>8} {'p99 us':>8} {'B/msg':>8}")
+    for benchmark in build_benchmarks(corpus):
+        if args.filter not in benchmark.name:
+            continue
+
+        result = run_benchmark(benchmark, args.repeat)
+        results.append(result)
+        if "error" in result:
+            print(f"{benchmark.name:<48} failed: {result['error']}")
+        else:
+            print(
+                f"{benchmark.name:<48} {result['ops_per_sec']:>10.0f} {result['p50_us']:>8.1f} "
+                f"{result['p99_us']:>8.1f} {result['peak_bytes_per_op']:>8}"
+            )
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "count": args.count,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
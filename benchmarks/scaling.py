@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Loopback throughput of sip_server.SipServer from 1 to N worker processes.
+
+    python benchmarks/scaling.py [--workers 1,2,4] [--clients 4] [--duration 5]
+
+Client processes send OPTIONS requests over UDP (each with a new Call-ID, keeping a
+window of them in flight) to a server answering 200 OK, and the answered requests per
+second are reported for each worker count. Clients use CPU too: on a machine with few
+cores they compete with the workers and the scaling flattens.
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import uuid
+from typing import List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sip_server import SipServer  # noqa: E402
+from sip_transaction import build_response  # noqa: E402
+
+REQUEST = (
+    "OPTIONS sip:server@127.0.0.1 SIP/2.0\r\n"
+    "Via: SIP/2.0/UDP 127.0.0.1:{port};branch=z9hG4bK{branch}\r\n"
+    "Max-Forwards: 70\r\n"
+    "From: <sip:client@127.0.0.1>;tag={tag}\r\n"
+    "To: <sip:server@127.0.0.1>\r\n"
+    "Call-ID: {call_id}\r\n"
+    "CSeq: 1 OPTIONS\r\n"
+    "Content-Length: 0\r\n\r\n"
+)
+
+
+async def answer_ok(message, addr, endpoint):
+    endpoint.send(build_response(message, 200, "OK", to_tag="srv"), addr)
+
+
+def _client(port: int, duration: float, window: int, results: multiprocessing.Queue):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(0.2)
+    local_port = sock.getsockname()[1]
+    target = ("127.0.0.1", port)
+
+    def send_one():
+        call_id = uuid.uuid4().hex
+        raw = REQUEST.format(port=local_port, branch=call_id[:16], tag=call_id[16:24], call_id=call_id)
+        sock.sendto(raw.encode(), target)
+
+    answered = 0
+    for _ in range(window):
+        send_one()
+
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        try:
+            sock.recv(65535)
+        except socket.timeout:
+            for _ in range(window):  # Requests were lost, fill the window again
+                send_one()
+            continue
+
+        answered += 1
+        send_one()
+
+    sock.close()
+    results.put(answered)
+
+
+def run(workers: int, clients: int, duration: float, window: int, port: int) -> float:
+    with SipServer(answer_ok, "127.0.0.1", port, workers=workers, queue_size=4096):
+        results: multiprocessing.Queue = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=_client, args=(port, duration, window, results))
+            for _ in range(clients)
+        ]
+        for process in processes:
+            process.start()
+
+        answered = sum(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+
+    return answered / duration
+
+
+def main(argv: Optional[List[str]] = None):
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, max(1, cpus // 4), max(1, cpus // 2)})
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=",".join(map(str, default_workers)), help="worker counts to run")
+    parser.add_argument("--clients", type=int, default=max(1, cpus // 2), help="load generating processes")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--window", type=int, default=32, help="requests in flight per client")
+    parser.add_argument("--port", type=int, default=15060)
+    args = parser.parse_args(argv)
+
+    print(f"{cpus} CPUs, {args.clients} client processes")
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8}")
+    base = None
+    for workers in (int(w) for w in args.workers.split(",")):
+        rate = run(workers, args.clients, args.duration, args.window, args.port)
+        base = base or rate
+        print(f"{workers:>8} {rate:>10.0f} {rate / base:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+Transaction layer benchmark: memory and CPU with many live transactions.
+
+    python benchmarks/transactions.py [--sizes 10000,100000,500000]
+
+For each size it opens that many client transactions over UDP (half INVITE, half
+OPTIONS) on a simulated clock, runs 4 seconds of retransmission timers, answers them
+all and runs the clock until every transaction is gone. It then compares scheduling
+and cancelling the same number of timers on the timing wheel and with asyncio.
+"""
+import argparse
+import asyncio
+import gc
+import os
+import resource
+import sys
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sip_message import SipMessage  # noqa: E402
+from sip_transaction import TransactionManager  # noqa: E402
+from timing_wheel import TimingWheel  # noqa: E402
+
+REQUEST = (
+    "{method} sip:bob@example.com SIP/2.0\r\n"
+    "Via: SIP/2.0/UDP 10.0.0.1:5060;branch=z9hG4bK{index:08x}\r\n"
+    "Max-Forwards: 70\r\n"
+    "From: <sip:alice@example.com>;tag={index:x}\r\n"
+    "To: <sip:bob@example.com>\r\n"
+    "Call-ID: {index:x}@10.0.0.1\r\n"
+    "CSeq: 1 {method}\r\n"
+    "Content-Length: 0\r\n\r\n"
+)
+
+RESPONSE = (
+    "SIP/2.0 {status} {reason}\r\n"
+    "Via: SIP/2.0/UDP 10.0.0.1:5060;branch=z9hG4bK{index:08x}\r\n"
+    "From: <sip:alice@example.com>;tag={index:x}\r\n"
+    "To: <sip:bob@example.com>;tag=b{index:x}\r\n"
+    "Call-ID: {index:x}@10.0.0.1\r\n"
+    "CSeq: 1 {method}\r\n"
+    "Content-Length: 0\r\n\r\n"
+)
+
+TICK = 0.01
+
+
+def _rss() -> int:
+    """ Resident memory of the process in bytes """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _run_clock(wheel: TimingWheel, clock: Clock, seconds: float) -> float:
+    """ Advances the simulated clock tick by tick. Returns the CPU time it took """
+    start = time.process_time()
+    end = clock.now + seconds
+    while clock.now < end:
+        clock.now += TICK
+        wheel.advance()
+
+    return time.process_time() - start
+
+
+def bench_transactions(size: int) -> Dict[str, float]:
+    clock = Clock()
+    wheel = TimingWheel(tick=TICK, clock=clock)
+    sent = [0]
+
+    def send(data: bytes, addr):
+        sent[0] += 1
+
+    manager = TransactionManager(send, wheel=wheel)
+    addr = ("10.0.0.2", 5060)
+    methods = ("INVITE", "OPTIONS")
+
+    gc.collect()
+    rss_before = _rss()
+    start = time.process_time()
+    for index in range(size):
+        raw = REQUEST.format(method=methods[index % 2], index=index).encode()
+        manager.send_request(SipMessage.from_bytes(raw), addr)
+    open_cpu = time.process_time() - start
+    gc.collect()
+    rss_live = _rss() - rss_before
+
+    retransmit_cpu = _run_clock(wheel, clock, 4.0)
+    retransmissions = manager.retransmissions
+
+    start = time.process_time()
+    for index in range(size):
+        method = methods[index % 2]
+        status, reason = (486, "Busy Here") if method == "INVITE" else (200, "OK")
+        raw = RESPONSE.format(status=status, reason=reason, method=method, index=index).encode()
+        manager.receive(SipMessage.from_bytes(raw), addr)
+    answer_cpu = time.process_time() - start
+
+    cleanup_cpu = _run_clock(wheel, clock, 33.0)
+
+    return {
+        "size": size,
+        "open_us": open_cpu / size * 1e6,
+        "bytes_per_tx": rss_live / size,
+        "retransmissions": retransmissions,
+        "retransmit_ms": retransmit_cpu * 1000,
+        "answer_us": answer_cpu / size * 1e6,
+        "cleanup_ms": cleanup_cpu * 1000,
+        "left": len(manager) + len(wheel),
+    }
+
+
+def bench_timers(count: int) -> Dict[str, float]:
+    """ Schedules count timers at spread delays and cancels them """
+    delays = [1 + (i % 3200) / 100 for i in range(count)]
+
+    def noop():
+        pass
+
+    gc.collect()
+    wheel = TimingWheel(tick=TICK)
+    start = time.process_time()
+    timers = [wheel.schedule(delay, noop) for delay in delays]
+    for timer in timers:
+        wheel.cancel(timer)
+    wheel_cpu = time.process_time() - start
+    del timers
+
+    loop = asyncio.new_event_loop()
+    try:
+        start = time.process_time()
+        handles = [loop.call_later(delay, noop) for delay in delays]
+        for handle in handles:
+            handle.cancel()
+        asyncio_cpu = time.process_time() - start
+    finally:
+        loop.close()
+
+    return {"wheel_us": wheel_cpu / count * 1e6, "asyncio_us": asyncio_cpu / count * 1e6}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,500000", help="comma separated transaction counts")
+    args = parser.parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    print(
+        f"{'live tx':>8} {'open us':>8} {'B/tx':>7} {'retrans':>8} {'4s timers ms':>13} "
+        f"{'answer us':>10} {'cleanup ms':>11} {'left':>5}"
+    )
+    for size in sizes:
+        r = bench_transactions(size)
+        print(
+            f"{r['size']:>8} {r['open_us']:>8.1f} {r['bytes_per_tx']:>7.0f} {r['retransmissions']:>8} "
+            f"{r['retransmit_ms']:>13.1f} {r['answer_us']:>10.1f} {r['cleanup_ms']:>11.1f} {r['left']:>5}"
+        )
+        gc.collect()
+
+    print(f"\n{'timers':>8} {'wheel us':>9} {'asyncio us':>11}   (schedule + cancel, per timer)")
+    for size in sizes:
+        r = bench_timers(size * 2)
+        print(f"{size * 2:>8} {r['wheel_us']:>9.2f} {r['asyncio_us']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,4 +6,5 @@ setuptools.setup(
     version="0.1",
     package_dir={"": "src"},
     packages=setuptools.find_namespace_packages(where="src"),
+    extras_require={"analytics": ["numpy"]},
 )
@@ -8,3 +8,7 @@ class SipParserError(Exception):
 
 class SipBuilderError(Exception):
     pass
+
+
+class SipTransactionError(Exception):
+    pass
@@ -1,4 +1,5 @@
 import collections
+from typing import Any, Dict, List, Optional
 
 FieldRaw = collections.namedtuple("FieldRaw", "name value")
 MediaField = collections.namedtuple("MediaField", "media port number_of_ports proto fmt")
@@ -10,10 +11,127 @@ RepeatTimesField = collections.namedtuple(
     "RepeatTimesField", "repeat_interval active_duration offsets"
 )
 TimeDescription = collections.namedtuple("TimeDescription", "timing repeat_times")
-MediaDescription = collections.namedtuple(
-    "MediaDescription",
-    "media media_title connection_information bandwidth_information encryption_key media_attributes",
-)
+RtpMapField = collections.namedtuple("RtpMapField", "payload_type encoding clock_rate channels")
+Codec = collections.namedtuple("Codec", "payload_type encoding clock_rate channels fmtp")
+
+# Payload types with a static mapping (RFC 3551), used when there's no rtpmap attribute
+STATIC_PAYLOAD_TYPES = {
+    "0": ("PCMU", 8000, 1),
+    "3": ("GSM", 8000, 1),
+    "4": ("G723", 8000, 1),
+    "5": ("DVI4", 8000, 1),
+    "6": ("DVI4", 16000, 1),
+    "7": ("LPC", 8000, 1),
+    "8": ("PCMA", 8000, 1),
+    "9": ("G722", 8000, 1),
+    "10": ("L16", 44100, 2),
+    "11": ("L16", 44100, 1),
+    "12": ("QCELP", 8000, 1),
+    "13": ("CN", 8000, 1),
+    "14": ("MPA", 90000, 1),
+    "15": ("G728", 8000, 1),
+    "16": ("DVI4", 11025, 1),
+    "17": ("DVI4", 22050, 1),
+    "18": ("G729", 8000, 1),
+    "25": ("CelB", 90000, 1),
+    "26": ("JPEG", 90000, 1),
+    "28": ("nv", 90000, 1),
+    "31": ("H261", 90000, 1),
+    "32": ("MPV", 90000, 1),
+    "33": ("MP2T", 90000, 1),
+    "34": ("H263", 90000, 1),
+}
+
+# Attributes whose value starts with the payload type they apply to
+PAYLOAD_ATTRIBUTE_NAMES = ("rtpmap", "fmtp", "rtcp-fb")
+
+
+def parse_rtpmap(value: str) -> RtpMapField:
+    """ "<payload type> <encoding name>/<clock rate>[/<channels>]" """
+    payload_type, _, encoding = value.strip().partition(" ")
+    parts = encoding.strip().split("/")
+    channels = int(parts[2]) if len(parts) > 2 and parts[2] else 1
+    clock_rate = int(parts[1]) if len(parts) > 1 and parts[1] else 0
+    return RtpMapField(payload_type, parts[0], clock_rate, channels)
+
+
+def make_codec(payload_type: str, rtpmap: Optional[str], fmtp: Optional[str]) -> Optional[Codec]:
+    """ A codec from the rtpmap and fmtp values (without payload type) of a format. Static
+        payload types don't need an rtpmap. None if the encoding is unknown or the payload
+        type or rtpmap is malformed
+    """
+    if not payload_type.isdigit():
+        return None
+
+    if rtpmap is not None:
+        try:
+            _, encoding, clock_rate, channels = parse_rtpmap(f"{payload_type} {rtpmap}")
+        except ValueError:
+            return None
+    elif payload_type in STATIC_PAYLOAD_TYPES:
+        encoding, clock_rate, channels = STATIC_PAYLOAD_TYPES[payload_type]
+    else:
+        return None
+
+    return Codec(payload_type, encoding, clock_rate, channels, fmtp)
+
+
+class MediaDescription(
+    collections.namedtuple(
+        "MediaDescription",
+        "media media_title connection_information bandwidth_information encryption_key media_attributes",
+    )
+):
+    """ A media description (m= section). Its attributes are indexed by name and by payload
+        type the first time they're looked up
+    """
+
+    def _index(self):
+        index = self.__dict__.get("_indexes")
+        if index is not None:
+            return index
+
+        by_name: Dict[str, List[Any]] = {}
+        by_payload: Dict[str, Dict[str, Any]] = {}
+        for name, value in self.media_attributes or ():
+            by_name.setdefault(name, []).append(value)
+            if name in PAYLOAD_ATTRIBUTE_NAMES and isinstance(value, str):
+                payload_type, _, params = value.partition(" ")
+                attrs = by_payload.setdefault(payload_type, {})
+                if name == "rtcp-fb":
+                    attrs.setdefault(name, []).append(params)
+                elif name not in attrs:
+                    attrs[name] = params
+
+        index = self.__dict__["_indexes"] = (by_name, by_payload)
+        return index
+
+    def attributes(self, name: str) -> List[Any]:
+        """ Values of every a=<name> attribute of the media (True for flags) """
+        return self._index()[0].get(name, [])
+
+    def attribute(self, name: str, default: Any = None) -> Any:
+        """ Value of the first a=<name> attribute of the media """
+        values = self._index()[0].get(name)
+        return values[0] if values else default
+
+    def payload_attributes(self, payload_type: str) -> Dict[str, Any]:
+        """ The rtpmap, fmtp and rtcp-fb values (without the payload type) of a format """
+        return self._index()[1].get(payload_type, {})
+
+    @property
+    def payload_types(self) -> List[str]:
+        return self.media.fmt.split() if self.media else []
+
+    def codec(self, payload_type: str) -> Optional[Codec]:
+        """ A format of the media, from its rtpmap (or static payload type) and fmtp """
+        attrs = self.payload_attributes(payload_type)
+        return make_codec(payload_type, attrs.get("rtpmap"), attrs.get("fmtp"))
+
+    def codecs(self) -> List[Codec]:
+        """ The formats of the media with a known encoding, in the offered order """
+        codecs = (self.codec(payload_type) for payload_type in self.payload_types)
+        return [codec for codec in codecs if codec is not None]
 ConnectionDataField = collections.namedtuple(
     "ConnectionDataField", "net_type addr_type connection_address"
 )
@@ -1,13 +1,140 @@
 """ SDP message parser following RFC4566 """
 from typing import List, Dict, Any, Optional, Union
 
-import re
 from exceptions import SdpParserError
-from sdp_parser import parse_functions
-from sdp_fields import FieldRaw, TimeDescription, MediaDescription
+from sdp_parser import parse_functions, parse_media_attributes
+from sdp_fields import TimeDescription, MediaDescription
 
 REPEATABLE_HEADER_NAMES = ("b", "r", "a")
 
+# Fields allowed after each field (RFC 4566 5): v o s i? u? e* p* c? b* (t r*)+ z? k? a*
+# then media descriptions (m i? c* b* k? a*)*. Media fields are prefixed with "m"
+FIELD_TRANSITIONS = {
+    "": "v",
+    "v": "o",
+    "o": "s",
+    "s": "iuepcbt",
+    "i": "uepcbt",
+    "u": "epcbt",
+    "e": "epcbt",
+    "p": "pcbt",
+    "c": "bt",
+    "b": "bt",
+    "t": "rtzkam",
+    "r": "rtzkam",
+    "z": "kam",
+    "k": "am",
+    "a": "am",
+    "m": "icbkam",
+    "mi": "cbkam",
+    "mc": "cbkam",
+    "mb": "bkam",
+    "mk": "am",
+    "ma": "am",
+}
+FINAL_STATES = ("t", "r", "z", "k", "a", "m", "mi", "mc", "mb", "mk", "ma")
+
+MEDIA_FIELD_NAMES = {
+    "m": "media",
+    "i": "media_title",
+    "c": "connection_information",
+    "b": "bandwidth_information",
+    "k": "encryption_key",
+    "a": "media_attributes",
+}
+
+
+def _add_media_field(attrs: Dict[str, Any], name: str, value: Any):
+    target_key = MEDIA_FIELD_NAMES[name]
+    if name in REPEATABLE_HEADER_NAMES:
+        if attrs[target_key] is None:
+            attrs[target_key] = []
+
+        attrs[target_key].append(value)
+    else:
+        attrs[target_key] = value
+
+
+def parse_media_description(lines: List[str]) -> MediaDescription:
+    """ Parses the lines of a media description (starting with its m= line), whose order
+        has already been checked
+    """
+    attrs: Dict[str, Any] = dict.fromkeys(MEDIA_FIELD_NAMES.values())
+    for line in lines:
+        line = line.strip()
+        if line:
+            _add_media_field(attrs, line[0], parse_functions[line[0]](line[2:]))
+
+    return MediaDescription(**attrs)
+
+
+class LazyMediaDescriptions(list):
+    """ The media descriptions of a parsed message. Those not read yet are kept as the
+        slice of the message lines they span, and parsed when first accessed
+    """
+
+    def __init__(self, lines: List[str]):
+        super().__init__()
+        self._lines = lines
+
+    def add_raw(self, start: int, end: int):
+        list.append(self, slice(start, end))
+
+    def is_parsed(self, index: int) -> bool:
+        return not isinstance(list.__getitem__(self, index), slice)
+
+    def resolve_all(self):
+        for index in range(len(self)):
+            self[index]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        value = list.__getitem__(self, index)
+        if isinstance(value, slice):
+            value = parse_media_description(self._lines[value])
+            list.__setitem__(self, index, value)
+
+        return value
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __reversed__(self):
+        for index in reversed(range(len(self))):
+            yield self[index]
+
+    def __contains__(self, value):
+        return any(item == value for item in self)
+
+    def __eq__(self, other):
+        return list(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+    def pop(self, index: int = -1):
+        value = self[index]
+        list.pop(self, index)
+        return value
+
+    def index(self, value, *args):
+        return list(self).index(value, *args)
+
+    def count(self, value):
+        return list(self).count(value)
+
+    def copy(self) -> List[MediaDescription]:
+        return list(self)
+
 
 class SdpMessage:
     def __init__(self):
@@ -31,80 +158,78 @@ class SdpMessage:
         self.media_descriptions.append(media_desc)
 
     @staticmethod
-    def from_string(raw_message: str):
+    def from_string(raw_message: str, lazy: bool = False):
+        """ Parses an SDP message in a single pass over its lines, checking the order of
+            the fields (RFC 4566 5) as it goes
+
+            With lazy=True, media descriptions are kept raw and each one is only parsed
+            when it's first read from media_descriptions
+        """
         sdp_msg = SdpMessage()
-        lines = [line.strip().split("=", maxsplit=1) for line in raw_message.split("\n")]
-
-        fields_order = ""
-        fields = []
-        for line in lines:
-            name, value = line[0], line[1]
-            fields_order += name
-            fields.append(FieldRaw(name, value))
-
-        # This is the right order for the headers (repetition/optionality too)
-        # If this doesn't match, it's the wrong order.
-        m = re.match(r"vosi?u?e?p?c?b*(tr?)+z?k?a?(mi?c?b*k?a*)*", fields_order)
-        if not m:
-            raise SdpParserError(f"Incorrect SDP header order detected")
-
-        # Now that we know how they're properly sorted, we can process the time descriptors
-        time_fields = [field for field in fields if field.name in ("t", "r")]
-        cur_time_attrs = {"timing": None, "repeat_times": []}
-        for i, field in enumerate(time_fields):
-            parsed_value = parse_functions[field.name](field.value)
-            if field.name == "t":
-                cur_time_attrs["timing"] = parsed_value
+        lines = raw_message.split("\n")
+        sdp_msg.media_descriptions = media = LazyMediaDescriptions(lines)
+
+        state = ""
+        in_media = False
+        media_start = -1
+        media_attrs: Dict[str, Any] = {}
+        attributes: Optional[List] = None  # media_attributes of the current media (not lazy)
+        for index, line in enumerate(lines):
+            line = line.strip()
+            if not line:
+                continue
+
+            name = line[0]
+            if line[1:2] != "=":
+                raise SdpParserError(f"Invalid SDP line found: <{line}>")
+
+            if name == "a" and state == "ma":
+                # Fast path for the following attributes of a media, the bulk of large offers
+                if attributes is not None:
+                    attributes.append(parse_media_attributes(line[2:]))
+                continue
+
+            if name not in FIELD_TRANSITIONS[state]:
+                raise SdpParserError(
+                    f"Incorrect SDP header order detected: {name}= can't follow {state[-1:] or 'the start'}="
+                )
+
+            if name == "m":
+                state = "m"
+                in_media = True
+                if lazy:
+                    if media_start >= 0:
+                        media.add_raw(media_start, index)
+                    media_start = index
+                    continue
+
+                if media_attrs:
+                    media.append(MediaDescription(**media_attrs))
+                media_attrs = dict.fromkeys(MEDIA_FIELD_NAMES.values())
+            elif in_media:
+                state = "m" + name
+                if lazy:
+                    continue
+            else:
+                state = name
+
+            parsed_value = parse_functions[name](line[2:])
+            if in_media:
+                _add_media_field(media_attrs, name, parsed_value)
+                attributes = media_attrs["media_attributes"]
+            elif name == "t":
+                sdp_msg.add_time_description(TimeDescription(parsed_value, []))
+            elif name == "r":
+                sdp_msg.time_descriptions[-1].repeat_times.append(parsed_value)
             else:
-                cur_time_attrs["repeat_times"].append(parsed_value)
-
-            # Determine if we're done with this time description: This happens when we either
-            # are on a "r" attribute or there's "t" attribute next. If so, save it
-            if i + 1 >= len(time_fields) or time_fields[i + 1][0] == "t":
-                sdp_msg.add_time_description(TimeDescription(**cur_time_attrs))
-                cur_time_attrs = {"timing": None, "repeat_times": []}
-
-        # Then, process the media fields
-        if "m" in fields_order:
-            target_attr_map = {
-                "m": "media",
-                "i": "media_title",
-                "c": "connection_information",
-                "b": "bandwidth_information",
-                "k": "encryption_key",
-                "a": "media_attributes",
-            }
-
-            # Factory for new media descriptions
-            new_media_desc = lambda: {name: None for name in target_attr_map.values()}
-
-            # Iterate through all media fields
-            cur_media_desc_attrs = new_media_desc()
-            media_desc_fields = fields[fields_order.index("m") :]
-            for i, field in enumerate(media_desc_fields):
-                target_key = target_attr_map[field.name]
-                processed_value = parse_functions[field.name](field.value)
-                if target_key in REPEATABLE_HEADER_NAMES:
-                    if cur_media_desc_attrs[target_key] is None:
-                        cur_media_desc_attrs[target_key] = []
-
-                    cur_media_desc_attrs[target_key].append(processed_value)
-                else:
-                    cur_media_desc_attrs[target_key] = processed_value
-
-                # Determine if we're done with this media description. If so, save it
-                if i + 1 >= len(media_desc_fields) or media_desc_fields[i + 1][0] == "m":
-                    sdp_msg.add_media_description(MediaDescription(**cur_media_desc_attrs))
-                    cur_media_desc_attrs = new_media_desc()
-
-            # *Discard* the media fields
-            fields = fields[: fields_order.index("m")]
-
-        # Process the regular session description fields
-        session_fields = [field for field in fields if field.name not in ("t", "r")]
-        for i, field in enumerate(session_fields):
-            sdp_msg.add_session_description_field(
-                name=field.name, value=parse_functions[field.name](field.value)
-            )
+                sdp_msg.add_session_description_field(name, parsed_value)
+
+        if state not in FINAL_STATES:
+            raise SdpParserError("Incomplete SDP message: expected at least v=, o=, s= and t=")
+
+        if media_attrs:
+            media.append(MediaDescription(**media_attrs))
+        elif media_start >= 0:
+            media.add_raw(media_start, len(lines))
 
         return sdp_msg
@@ -0,0 +1,156 @@
+"""
+SDP offer/answer codec negotiation (RFC 3264) against a local capability set.
+
+Each offer is reduced to its codec set (per m= line: media type, whether it's active and
+the payload types with their rtpmap and fmtp values) and the outcome for each distinct set
+is memoized in a bounded LRU cache, as offers from the same device model are repeated call
+after call. The codecs themselves are only parsed on cache misses.
+"""
+import collections
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from lru_cache import LruCache, CacheInfo
+from sdp_fields import Codec, MediaDescription, make_codec
+from sdp_message import SdpMessage
+
+DEFAULT_CACHE_SIZE = 1024
+
+# fmtp parameters that must be equal on both sides for a codec to match, with their default
+FMTP_MATCH_PARAMS = {
+    "amr": {"octet-align": "0"},
+    "amr-wb": {"octet-align": "0"},
+    "h264": {"packetization-mode": "0"},
+}
+
+# Codecs that don't carry the media on their own: a media with only these is rejected
+AUXILIARY_ENCODINGS = ("telephone-event", "cn", "red", "ulpfec", "rtx")
+
+NegotiatedMedia = collections.namedtuple("NegotiatedMedia", "index media codecs")
+
+# Per media: (media type, active, ((payload type, rtpmap, fmtp), ...))
+OfferKey = Tuple[Tuple[str, bool, Tuple[Tuple[str, Optional[str], Optional[str]], ...]], ...]
+
+
+def parse_fmtp_params(fmtp: Optional[str]) -> Dict[str, str]:
+    """ "a=1;b=2" format parameters as a dict with lowercase names. Values that aren't
+        name=value pairs (e.g. telephone-event's "0-15") are ignored
+    """
+    params = {}
+    for param in (fmtp or "").split(";"):
+        name, sep, value = param.partition("=")
+        if sep:
+            params[name.strip().lower()] = value.strip()
+
+    return params
+
+
+def offer_key(offer: SdpMessage) -> OfferKey:
+    """ The codec set of an offer, everything the negotiation depends on """
+    return tuple(
+        (media.media.media, media.media.port != 0, _media_formats(media))
+        for media in offer.media_descriptions
+    )
+
+
+def _media_formats(media: MediaDescription) -> Tuple[Tuple[str, Optional[str], Optional[str]], ...]:
+    formats = []
+    for payload_type in media.payload_types:
+        attrs = media.payload_attributes(payload_type)
+        formats.append((payload_type, attrs.get("rtpmap"), attrs.get("fmtp")))
+
+    return tuple(formats)
+
+
+def _fmtp_compatible(offered: Codec, local: Codec) -> bool:
+    match_params = FMTP_MATCH_PARAMS.get(offered.encoding.lower())
+    if not match_params:
+        return True
+
+    offered_params = parse_fmtp_params(offered.fmtp)
+    local_params = parse_fmtp_params(local.fmtp)
+    return all(
+        offered_params.get(name, default) == local_params.get(name, default)
+        for name, default in match_params.items()
+    )
+
+
+class CodecNegotiator:
+    """ Negotiates offers against local capabilities: for each media type ("audio", "video",
+        ...), the supported codecs in order of preference. Their payload types don't matter
+        and their fmtp is only used for the parameters that must match (FMTP_MATCH_PARAMS).
+
+        The answer keeps the offerer's payload types and fmtp, in the offer's order unless
+        prefer_local is set (then in the local preference order)
+    """
+
+    def __init__(
+        self,
+        capabilities: Dict[str, Sequence[Codec]],
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        prefer_local: bool = False,
+    ):
+        self.prefer_local = prefer_local
+        self.cache = LruCache(cache_size)
+
+        # media type -> (encoding, clock rate, channels) -> [(preference, local codec)]
+        self._capabilities: Dict[str, Dict[Tuple[str, int, int], List[Tuple[int, Codec]]]] = {}
+        for media_type, codecs in capabilities.items():
+            by_format = self._capabilities.setdefault(media_type, {})
+            for preference, codec in enumerate(codecs):
+                key = (codec.encoding.lower(), codec.clock_rate, codec.channels or 1)
+                by_format.setdefault(key, []).append((preference, codec))
+
+    def negotiate(self, offer: SdpMessage) -> Tuple[NegotiatedMedia, ...]:
+        """ The accepted codecs of each media description of the offer, in order. A media
+            without codecs must be rejected in the answer (port 0)
+        """
+        key = offer_key(offer)
+        result = self.cache.get(key)
+        if result is None:
+            result = self.negotiate_key(key)
+            self.cache.put(key, result)
+
+        return result
+
+    def negotiate_media(self, media: MediaDescription) -> Tuple[Codec, ...]:
+        """ The accepted codecs of a single media description (not memoized) """
+        return self._negotiate_media(media.media.media, _media_formats(media))
+
+    def negotiate_key(self, key: OfferKey) -> Tuple[NegotiatedMedia, ...]:
+        return tuple(
+            NegotiatedMedia(index, media_type, self._negotiate_media(media_type, formats) if active else ())
+            for index, (media_type, active, formats) in enumerate(key)
+        )
+
+    def _negotiate_media(
+        self, media_type: str, formats: Tuple[Tuple[str, Optional[str], Optional[str]], ...]
+    ) -> Tuple[Codec, ...]:
+        by_format = self._capabilities.get(media_type)
+        if not by_format:
+            return ()
+
+        accepted = []
+        for payload_type, rtpmap, fmtp in formats:
+            codec = make_codec(payload_type, rtpmap, fmtp)
+            if codec is None:
+                continue
+
+            candidates = by_format.get((codec.encoding.lower(), codec.clock_rate, codec.channels or 1), ())
+            for preference, local in candidates:
+                if _fmtp_compatible(codec, local):
+                    accepted.append((preference, codec))
+                    break
+
+        if all(codec.encoding.lower() in AUXILIARY_ENCODINGS for _, codec in accepted):
+            return ()
+
+        if self.prefer_local:
+            accepted.sort(key=lambda item: item[0])
+
+        return tuple(codec for _, codec in accepted)
+
+    def cache_info(self) -> CacheInfo:
+        return self.cache.info()
+
+    def clear_cache(self):
+        self.cache.clear()
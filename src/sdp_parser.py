@@ -51,7 +51,7 @@ def parse_media(value):
         port=port,
         number_of_ports=number_of_ports,
         proto=subfields[2],
-        fmt=subfields[3],
+        fmt=" ".join(subfields[3:]),
     )
 
 
@@ -64,7 +64,8 @@ def parse_repeat(value):
 
 
 def parse_media_attributes(value):
-    subfields = value.split(":")
+    # Only split on the first colon, values may have more (fingerprints, candidates, ...)
+    subfields = value.split(":", 1)
     if len(subfields) > 1:
         return (subfields[0], subfields[1])
 
@@ -84,4 +85,7 @@ parse_functions = {
     "e": lambda val: val,
     "p": lambda val: val,
     "c": lambda val: ConnectionDataField(*val.split(" ")),
+    "b": lambda val: val,
+    "z": lambda val: val,
+    "k": lambda val: val,
 }
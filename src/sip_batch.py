@@ -0,0 +1,123 @@
+"""
+Batch parsing of SIP messages over a process pool
+"""
+import collections
+import itertools
+import marshal
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Iterable, Iterator, List, Optional, Tuple, Union
+
+from sip_message import SipMessage
+from sip_fields import pack_header_value, unpack_header_value
+from exceptions import SipParserError
+
+BatchResult = collections.namedtuple("BatchResult", "index message error")
+
+DEFAULT_CHUNKSIZE = 256
+
+
+def _parse_one(raw_message: Union[str, bytes]) -> Tuple:
+    """ Parses a message into a tuple of builtins, or (None, error message) on failure
+    """
+    try:
+        if isinstance(raw_message, str):
+            message = SipMessage.from_string(raw_message)
+            headers = message.headers
+        else:
+            message = SipMessage.from_bytes(raw_message)
+            headers = message.headers.copy()
+
+        if message.type == SipMessage.TYPE_RESPONSE:
+            start_line = (message.status, message.reason)
+        else:
+            start_line = (message.method, message.uri)
+
+        headers = {name: pack_header_value(value) for name, value in headers.items()}
+        return (message.type, message.version) + start_line + (headers, message.content)
+    except SipParserError as e:
+        return (None, str(e))
+    except Exception as e:
+        # The header parsers report malformed values with builtin exceptions
+        return (None, f"{type(e).__name__}: {e}")
+
+
+def _parse_chunk(raw_messages: List[Union[str, bytes]]) -> bytes:
+    """ Worker entry point: results are shipped back marshalled as one blob per chunk
+    """
+    return marshal.dumps([_parse_one(raw) for raw in raw_messages])
+
+
+def _to_result(index: int, parsed: Tuple) -> BatchResult:
+    if parsed[0] is None:
+        return BatchResult(index, None, SipParserError(parsed[1]))
+
+    message = SipMessage()
+    message.type, message.version = parsed[0], parsed[1]
+    if message.type == SipMessage.TYPE_RESPONSE:
+        message.status, message.reason = parsed[2], parsed[3]
+    else:
+        message.method, message.uri = parsed[2], parsed[3]
+
+    message.headers = {name: unpack_header_value(value) for name, value in parsed[4].items()}
+    message.content = parsed[5]
+    return BatchResult(index, message, None)
+
+
+def _chunks(raw_messages: Iterable, chunksize: int) -> Iterator[Tuple[int, List]]:
+    it = iter(raw_messages)
+    start = 0
+    while True:
+        chunk = list(itertools.islice(it, chunksize))
+        if not chunk:
+            return
+
+        yield start, chunk
+        start += len(chunk)
+
+
+def parse_many(
+    raw_messages: Iterable[Union[str, bytes]],
+    workers: Optional[int] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    ordered: bool = True,
+) -> Iterator[BatchResult]:
+    """ Parses many messages (str or bytes) spreading the work over a pool of worker processes.
+
+        Yields a BatchResult(index, message, error) per message, where index is the position of
+        the message in raw_messages and error is the SipParserError that prevented parsing it
+        (a failing message doesn't abort the batch). Results come in input order, or as soon
+        as each chunk of messages is done with ordered=False.
+
+        The input is consumed lazily with a bounded number of chunks in flight. workers=None
+        uses every CPU, workers <= 1 parses in the calling process.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1:
+        for index, raw in enumerate(raw_messages):
+            yield _to_result(index, _parse_one(raw))
+        return
+
+    max_in_flight = workers * 2
+    chunks = _chunks(raw_messages, chunksize)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight: collections.deque = collections.deque()
+        for start, chunk in itertools.islice(chunks, max_in_flight):
+            in_flight.append((start, executor.submit(_parse_chunk, chunk)))
+
+        while in_flight:
+            if ordered:
+                start, future = in_flight.popleft()
+            else:
+                done, _ = wait([f for _, f in in_flight], return_when=FIRST_COMPLETED)
+                start, future = next(item for item in in_flight if item[1] in done)
+                in_flight.remove((start, future))
+
+            # Keep the pool busy before handing results to the caller
+            for next_start, chunk in itertools.islice(chunks, 1):
+                in_flight.append((next_start, executor.submit(_parse_chunk, chunk)))
+
+            for offset, parsed in enumerate(marshal.loads(future.result())):
+                yield _to_result(start + offset, parsed)
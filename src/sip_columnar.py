@@ -0,0 +1,362 @@
+"""
+Columnar export of parsed messages to NumPy arrays, for vectorized call analytics.
+
+ColumnarExporter accumulates a few fields of each message (timestamp, method, status,
+Call-ID hash, CSeq, whether it's in a dialog, From/To user and host, top Via host) into
+preallocated column arrays and hands them out as fixed-size ColumnChunk objects, so memory
+stays bounded whatever the input size. String fields are dictionary encoded: the columns
+hold int32 codes into a StringDictionary shared by all the chunks of an exporter (it only
+grows with the number of distinct users and hosts).
+
+The aggregations consume chunks as they come: status_histogram() and value_counts() per
+chunk (their results add up), CallSetupStats for per-dialog setup time, post-dial delay
+and ASR, with the calls still waiting for an answer carried over between chunks.
+
+NumPy is an optional dependency (pip install pySIP[analytics]).
+"""
+import hashlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from lru_cache import LruCache
+from sip_message import SipMessage
+from sip_parser import parse_uri
+
+DEFAULT_CHUNK_SIZE = 65536
+URI_CACHE_SIZE = 4096
+
+# Method codes. Responses are coded with the method of their CSeq
+METHODS = (
+    "", "INVITE", "ACK", "BYE", "CANCEL", "REGISTER", "OPTIONS", "PRACK", "UPDATE",
+    "INFO", "SUBSCRIBE", "NOTIFY", "REFER", "MESSAGE", "PUBLISH", "OTHER",
+)
+METHOD_CODES = {method: code for code, method in enumerate(METHODS)}
+METHOD_OTHER = METHOD_CODES["OTHER"]
+METHOD_INVITE = METHOD_CODES["INVITE"]
+
+STRING_COLUMNS = ("from_user", "from_host", "to_user", "to_host", "via_host")
+MAX_STATUS = 700
+
+# Calls without a final response this long after their INVITE are dropped
+DEFAULT_SETUP_TIMEOUT = 300.0
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Columnar export needs NumPy: pip install numpy")
+
+
+def _column_types() -> Dict[str, Any]:
+    columns = {
+        "timestamp": np.float64,
+        "method": np.uint8,
+        "status": np.int16,
+        "call_id_hash": np.uint64,
+        "cseq": np.uint32,
+        "in_dialog": np.bool_,  # The To header has a tag
+    }
+    columns.update((name, np.int32) for name in STRING_COLUMNS)
+    return columns
+
+
+def call_id_hash(call_id: Optional[str]) -> int:
+    """ 64-bit hash of a Call-ID, the same in every process (unlike hash()). 0 if missing """
+    if not call_id:
+        return 0
+
+    return int.from_bytes(hashlib.blake2b(call_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class StringDictionary:
+    """ Codes of the distinct strings of the string columns. -1 stands for a missing value
+    """
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+
+        return code
+
+    def decode(self, code: int) -> Optional[str]:
+        return self.values[code] if code >= 0 else None
+
+
+class ColumnChunk:
+    """ Up to chunk_size rows, as a dict of column name to array (columns[name]) """
+
+    def __init__(self, columns: Dict[str, Any], dictionary: StringDictionary):
+        self.columns = columns
+        self.dictionary = dictionary
+
+    def __len__(self):
+        return len(self.columns["timestamp"])
+
+    def __getitem__(self, name: str):
+        return self.columns[name]
+
+    def decode(self, name: str) -> List[Optional[str]]:
+        """ The values of a string column """
+        return [self.dictionary.decode(code) for code in self.columns[name].tolist()]
+
+
+class ColumnarExporter:
+    """ Accumulates messages into ColumnChunk of chunk_size rows. add() returns a chunk
+        when it's full, flush() the rows left; export() wraps both over an iterable
+    """
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        _require_numpy()
+        self.chunk_size = chunk_size
+        self.dictionary = StringDictionary()
+        self.rows = 0
+        self._types = _column_types()
+        self._uris = LruCache(URI_CACHE_SIZE)
+        self._new_chunk()
+
+    def _new_chunk(self):
+        self._columns = {name: np.empty(self.chunk_size, dtype) for name, dtype in self._types.items()}
+        self._size = 0
+
+    def export(self, messages: Iterable[Any]) -> Iterator[ColumnChunk]:
+        """ Chunks of the messages, given as SipMessage, (timestamp, message) or objects
+            with timestamp and message attributes (e.g. sip_pcap.CapturedMessage)
+        """
+        for item in messages:
+            if isinstance(item, SipMessage):
+                chunk = self.add(item)
+            elif hasattr(item, "message"):
+                chunk = self.add(item.message, item.timestamp)
+            else:
+                chunk = self.add(item[1], item[0])
+
+            if chunk is not None:
+                yield chunk
+
+        chunk = self.flush()
+        if chunk is not None:
+            yield chunk
+
+    def add(self, message: SipMessage, timestamp: float = float("nan")) -> Optional[ColumnChunk]:
+        columns, row = self._columns, self._size
+        cseq = message.peek_header("cseq")
+        if message.type == SipMessage.TYPE_RESPONSE:
+            method = cseq["method"] if cseq is not None else ""
+            status = message.status
+        else:
+            method = message.method
+            status = 0
+
+        to_value = message.peek_header("to")
+        from_user, from_host = self._uri_parts(message.peek_header("from"))
+        to_user, to_host = self._uri_parts(to_value)
+        vias = message.peek_header("via")
+        code = self.dictionary.code
+
+        columns["timestamp"][row] = timestamp
+        columns["method"][row] = METHOD_CODES.get(method, METHOD_OTHER)
+        columns["status"][row] = status
+        columns["call_id_hash"][row] = call_id_hash(message.peek_header("call-id"))
+        columns["cseq"][row] = int(cseq["seq"]) if cseq is not None else 0
+        columns["in_dialog"][row] = self._has_tag(to_value)
+        columns["from_user"][row] = code(from_user)
+        columns["from_host"][row] = code(from_host)
+        columns["to_user"][row] = code(to_user)
+        columns["to_host"][row] = code(to_host)
+        columns["via_host"][row] = code(vias[0]["host"] if vias else None)
+
+        self._size += 1
+        self.rows += 1
+        if self._size == self.chunk_size:
+            chunk = ColumnChunk(self._columns, self.dictionary)
+            self._new_chunk()
+            return chunk
+
+        return None
+
+    def flush(self) -> Optional[ColumnChunk]:
+        """ The rows not handed out yet, if any """
+        if not self._size:
+            return None
+
+        chunk = ColumnChunk({name: column[: self._size] for name, column in self._columns.items()}, self.dictionary)
+        self._new_chunk()
+        return chunk
+
+    @staticmethod
+    def _has_tag(aor: Any) -> bool:
+        return aor is not None and bool((aor.get("params") or {}).get("tag"))
+
+    def _uri_parts(self, aor: Any) -> Tuple[Optional[str], Optional[str]]:
+        if aor is None:
+            return None, None
+
+        uri = aor["uri"]
+        if not isinstance(uri, str):
+            return uri["user"], uri["host"]
+
+        parts = self._uris.get(uri)
+        if parts is None:
+            try:
+                parsed = parse_uri(uri)
+                parts = (parsed["user"], parsed["host"])
+            except RuntimeError:
+                parts = (None, None)
+            self._uris.put(uri, parts)
+
+        return parts
+
+
+# Aggregations
+
+
+def status_histogram(chunk: ColumnChunk, method: Optional[str] = None):
+    """ Number of responses of each status code (the index), optionally for one method """
+    status = chunk["status"]
+    selected = status > 0
+    if method is not None:
+        selected &= chunk["method"] == METHOD_CODES.get(method, METHOD_OTHER)
+
+    return np.bincount(status[selected], minlength=MAX_STATUS)
+
+
+def value_counts(chunk: ColumnChunk, column: str, minlength: int = 0):
+    """ Number of rows of each code of a string column (e.g. messages per Via host), indexed
+        by code, missing values left out. Pass len(chunk.dictionary) as minlength to add up
+        the counts of several chunks
+    """
+    codes = chunk[column]
+    return np.bincount(codes[codes >= 0], minlength=minlength)
+
+
+def top_values(counts, dictionary: StringDictionary, n: int = 10) -> List[Tuple[str, int]]:
+    """ The n most frequent values of value_counts() """
+    order = np.argsort(counts)[::-1][:n]
+    return [(dictionary.decode(int(code)), int(counts[code])) for code in order if counts[code]]
+
+
+def _first_per_key(keys, *values):
+    """ The distinct keys (sorted) and the values of their first row """
+    unique, first = np.unique(keys, return_index=True)
+    return (unique,) + tuple(value[first] for value in values)
+
+
+def _lookup(sorted_keys, keys):
+    """ Positions of keys in sorted_keys and whether they were found """
+    if not len(sorted_keys):
+        return np.zeros(len(keys), np.intp), np.zeros(len(keys), bool)
+
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return positions, sorted_keys[positions] == keys
+
+
+class CallSetupStats:
+    """ Per-dialog call setup, from the initial INVITE (without To tag, so re-INVITEs are
+        left out) to its first final response: setup time
+        (answered calls), post-dial delay (to the first 18x, or the final response if none)
+        and the answer-seizure ratio. Chunks must be given in time order.
+
+        update() returns the calls that got their final response in the chunk as a dict of
+        arrays (call_id_hash, status, setup_time, post_dial_delay). Calls still waiting
+        are kept in sorted arrays, dropped after timeout seconds.
+
+        The INVITE rows need timestamps: chunks exported from bare SipMessage objects
+        (NaN timestamps) raise ValueError
+    """
+
+    def __init__(self, timeout: float = DEFAULT_SETUP_TIMEOUT):
+        _require_numpy()
+        self.timeout = timeout
+        self.attempts = 0
+        self.answered = 0
+        self.completed = 0
+        self.expired = 0
+        self.final_statuses = np.zeros(MAX_STATUS, np.int64)
+
+        self._hashes = np.empty(0, np.uint64)
+        self._invited = np.empty(0, np.float64)
+        self._alerted = np.empty(0, np.float64)
+
+    @property
+    def pending(self) -> int:
+        return len(self._hashes)
+
+    @property
+    def asr(self) -> float:
+        """ Answered calls over calls that got a final response """
+        return self.answered / self.completed if self.completed else 0.0
+
+    def update(self, chunk: ColumnChunk) -> Dict[str, Any]:
+        timestamps, status, hashes = chunk["timestamp"], chunk["status"], chunk["call_id_hash"]
+        invite = (chunk["method"] == METHOD_INVITE) & (hashes != 0)
+        if np.isnan(timestamps[invite]).any():
+            raise ValueError("Call setup stats need timestamps, export (timestamp, message) pairs")
+
+        initial = invite & (status == 0) & ~chunk["in_dialog"]
+        self._add_invites(*_first_per_key(hashes[initial], timestamps[initial]))
+
+        alerting = invite & (status >= 180) & (status < 200)
+        if alerting.any():
+            keys, times = _first_per_key(hashes[alerting], timestamps[alerting])
+            positions, found = _lookup(self._hashes, keys)
+            positions, times = positions[found], times[found]
+            first = np.isnan(self._alerted[positions])
+            self._alerted[positions[first]] = times[first]
+
+        final = invite & (status >= 200)
+        keys, times, statuses = _first_per_key(hashes[final], timestamps[final], status[final])
+        positions, found = _lookup(self._hashes, keys)
+        positions, keys, times, statuses = positions[found], keys[found], times[found], statuses[found]
+
+        invited = self._invited[positions]
+        alerted = self._alerted[positions]
+        setup_time = np.where((statuses >= 200) & (statuses < 300), times - invited, np.nan)
+        post_dial_delay = np.where(np.isnan(alerted), times, alerted) - invited
+
+        self.completed += len(keys)
+        self.answered += int(np.count_nonzero((statuses >= 200) & (statuses < 300)))
+        self.final_statuses += np.bincount(statuses, minlength=MAX_STATUS)[:MAX_STATUS]
+
+        keep = np.ones(len(self._hashes), bool)
+        keep[positions] = False
+        known_times = timestamps[~np.isnan(timestamps)]
+        if len(known_times):
+            expired = keep & (self._invited < known_times.max() - self.timeout)
+            self.expired += int(np.count_nonzero(expired))
+            keep &= ~expired
+        self._hashes, self._invited, self._alerted = self._hashes[keep], self._invited[keep], self._alerted[keep]
+
+        return {
+            "call_id_hash": keys,
+            "status": statuses,
+            "setup_time": setup_time,
+            "post_dial_delay": post_dial_delay,
+        }
+
+    def _add_invites(self, keys, times):
+        _, known = _lookup(self._hashes, keys)
+        keys, times = keys[~known], times[~known]  # Retransmissions
+        if not len(keys):
+            return
+
+        self.attempts += len(keys)
+        hashes = np.concatenate([self._hashes, keys])
+        order = np.argsort(hashes, kind="stable")
+        self._hashes = hashes[order]
+        self._invited = np.concatenate([self._invited, times])[order]
+        self._alerted = np.concatenate([self._alerted, np.full(len(keys), np.nan)])[order]
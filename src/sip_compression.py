@@ -0,0 +1,76 @@
+"""
+Static-dictionary deflate compression of SIP messages, to keep large requests (e.g. INVITEs
+with SDP) within the UDP MTU.
+
+In the spirit of SigComp's static dictionary (RFC 3320/3485), but it's not SigComp: there's
+no UDVM and no state, a compressed message is MAGIC followed by a raw deflate stream primed
+with DICTIONARY. Both peers must use this module. MAGIC starts with a byte that can't start
+a SIP message, so SipMessage.from_bytes tells compressed messages apart and inflates them.
+"""
+import zlib
+
+from exceptions import SipParserError
+
+MAGIC = b"\xfbSZ1"
+
+# Bound on the inflated size, against decompression bombs
+MAX_DECOMPRESSED_SIZE = 256 * 1024
+
+# Frequent SIP/SDP strings. Deflate encodes matches closer to the end of the dictionary
+# with fewer bits, so the most common ones come last
+DICTIONARY = "".join(
+    [
+        "Privacy: none\r\nP-Asserted-Identity: <sip:P-Preferred-Identity: ",
+        "Authorization: Digest username=\"Proxy-Authorization: Digest ",
+        "WWW-Authenticate: Digest realm=\"Proxy-Authenticate: Digest ",
+        "\", nonce=\"\", uri=\"\", response=\"\", algorithm=MD5, qop=auth, nc=00000001, cnonce=\"",
+        "Session-Expires: 1800;refresher=uacMin-SE: 90\r\nRequire: timer\r\n",
+        "Accept: application/sdp\r\nAllow-Events: talk, hold, refer\r\n",
+        "Allow: INVITE, ACK, CANCEL, BYE, OPTIONS, PRACK, UPDATE, INFO, REFER, NOTIFY, MESSAGE\r\n",
+        "Supported: replaces, timer, 100rel, path\r\nUser-Agent: Server: Expires: 3600\r\n",
+        "Record-Route: <sip:;lr>\r\nRoute: <sip:;lr;transport=tcp;transport=udp",
+        "REGISTER sip:SUBSCRIBE sip:NOTIFY sip:OPTIONS sip:CANCEL sip:BYE sip:ACK sip:",
+        "SIP/2.0 100 Trying\r\nSIP/2.0 180 Ringing\r\nSIP/2.0 183 Session Progress\r\n",
+        "SIP/2.0 401 Unauthorized\r\nSIP/2.0 407 Proxy Authentication Required\r\n",
+        "SIP/2.0 486 Busy Here\r\nSIP/2.0 487 Request Terminated\r\nSIP/2.0 200 OK\r\n",
+        "a=rtpmap:18 G729/8000\r\na=fmtp:18 annexb=no\r\na=rtpmap:9 G722/8000\r\n",
+        "a=rtpmap:101 telephone-event/8000\r\na=fmtp:101 0-16\r\na=ptime:20\r\na=sendrecv\r\n",
+        "v=0\r\no=- IN IP4 s=-\r\nc=IN IP4 t=0 0\r\nm=audio RTP/AVP 0 8 101\r\n",
+        "a=rtpmap:0 PCMU/8000\r\na=rtpmap:8 PCMA/8000\r\n",
+        "Content-Type: application/sdp\r\nc: application/sdp\r\n",
+        "Max-Forwards: 70\r\nContent-Length: 0\r\n\r\nl: 0\r\n\r\n",
+        "Contact: <sip:m: <sip:From: <sip:f: <sip:To: <sip:t: <sip:;tag=",
+        "Call-ID: i: CSeq: 1 INVITE\r\nCSeq: 1 ACK\r\nCSeq: 1 BYE\r\nCSeq: 2 ",
+        "Via: SIP/2.0/TCP v: SIP/2.0/TCP Via: SIP/2.0/UDP v: SIP/2.0/UDP ;rport;received=",
+        ";branch=z9hG4bK\r\nINVITE sip: SIP/2.0\r\n",
+    ]
+).encode("utf-8")
+
+
+def is_compressed(data) -> bool:
+    return data[: len(MAGIC)] == MAGIC
+
+
+def compress(data: bytes, level: int = 9) -> bytes:
+    """ Compresses a serialized SIP message """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=DICTIONARY)
+    return MAGIC + compressor.compress(data) + compressor.flush()
+
+
+def decompress(data) -> bytes:
+    """ Inflates a compressed message. Raises SipParserError if it's invalid or too big """
+    if not is_compressed(data):
+        raise SipParserError("Not a compressed SIP message")
+
+    decompressor = zlib.decompressobj(-15, zdict=DICTIONARY)
+    try:
+        inflated = decompressor.decompress(memoryview(data)[len(MAGIC) :], MAX_DECOMPRESSED_SIZE)
+    except zlib.error as e:
+        raise SipParserError(f"Invalid compressed SIP message: {e}")
+
+    if decompressor.unconsumed_tail:
+        raise SipParserError(f"Compressed SIP message inflates beyond {MAX_DECOMPRESSED_SIZE} bytes")
+    if not decompressor.eof:
+        raise SipParserError("Truncated compressed SIP message")
+
+    return inflated
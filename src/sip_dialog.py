@@ -0,0 +1,110 @@
+"""
+Dialog lookup by SipMessage.dialog_key.
+
+A dialog is identified by its Call-ID and the tags of both ends (RFC 3261 12), but which
+tag is in From and which in To depends on who sent the message. The table stores
+confirmed dialogs under both orientations, so finding the dialog of any message of
+either side is a single dict lookup.
+"""
+from typing import Any, Dict, Iterator, Optional, Union
+
+from sip_message import SipMessage, DialogKey
+
+
+def _key_of(message_or_key: Union[SipMessage, DialogKey, None]) -> Optional[DialogKey]:
+    if isinstance(message_or_key, SipMessage):
+        return message_or_key.dialog_key
+
+    return message_or_key
+
+
+class DialogTable:
+    """ Maps dialog keys to any dialog object (B2BUA call leg, state, ...).
+
+        Dialogs added with a key without To tag are early (the request that creates the
+        dialog was seen but not a response with a To tag yet); they match messages of
+        either side with that Call-ID and tag until confirm() gives them their full key
+    """
+
+    def __init__(self):
+        self._dialogs: Dict[DialogKey, Any] = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, message_or_key: Union[SipMessage, DialogKey]):
+        return self.get(message_or_key) is not None
+
+    def __iter__(self) -> Iterator[DialogKey]:
+        """ The key of each dialog, in the orientation it was added """
+        mirrors = set()
+        for key in self._dialogs:
+            if key in mirrors:
+                continue
+
+            call_id, local_tag, remote_tag = key
+            if remote_tag is not None:
+                mirrors.add((call_id, remote_tag, local_tag))
+            yield key
+
+    def add(self, message_or_key: Union[SipMessage, DialogKey], dialog: Any):
+        key = _key_of(message_or_key)
+        if key is None:
+            raise ValueError("Can't add a dialog without Call-ID")
+
+        # Only the exact key (or its mirror) is the same dialog, an early one matching it
+        # through get() stays a dialog of its own (e.g. the forks of a call)
+        if key not in self._dialogs:
+            self._count += 1
+
+        self._dialogs[key] = dialog
+        call_id, local_tag, remote_tag = key
+        if remote_tag is not None:
+            self._dialogs[(call_id, remote_tag, local_tag)] = dialog
+
+    def get(self, message_or_key: Union[SipMessage, DialogKey, None], default: Any = None) -> Any:
+        """ The dialog a message (or dialog key) belongs to, from either side """
+        key = _key_of(message_or_key)
+        if key is None:
+            return default
+
+        dialog = self._dialogs.get(key)
+        if dialog is not None:
+            return dialog
+
+        # Early dialogs, known by a single tag
+        call_id, from_tag, to_tag = key
+        if to_tag is not None:
+            dialog = self._dialogs.get((call_id, from_tag, None))
+            if dialog is None:
+                dialog = self._dialogs.get((call_id, to_tag, None))
+
+        return default if dialog is None else dialog
+
+    def confirm(self, early_key: DialogKey, message_or_key: Union[SipMessage, DialogKey]):
+        """ Moves an early dialog to its full key (e.g. from the dialog_key of its 2xx) """
+        dialog = self.remove(early_key)
+        if dialog is not None:
+            self.add(message_or_key, dialog)
+
+    def remove(self, message_or_key: Union[SipMessage, DialogKey]) -> Any:
+        """ Removes the dialog under both orientations. Returns it (None if not found) """
+        key = _key_of(message_or_key)
+        if key is None:
+            return None
+
+        call_id, from_tag, to_tag = key
+        dialog = self._dialogs.pop(key, None)
+        if to_tag is not None:
+            reverse = self._dialogs.pop((call_id, to_tag, from_tag), None)
+            dialog = dialog if dialog is not None else reverse
+
+        if dialog is not None:
+            self._count -= 1
+
+        return dialog
+
+    def clear(self):
+        self._dialogs.clear()
+        self._count = 0
@@ -0,0 +1,279 @@
+"""
+Digest authentication (RFC 2617, RFC 7616, RFC 3261 section 22.4): challenges and
+verification of Authorization / Proxy-Authorization credentials, with MD5 and SHA-256
+(and their -sess variants) and qop auth / auth-int.
+
+Nonces are stateless: a timestamp and a random part signed with an HMAC of a server
+secret, so a challenge stores nothing and any process sharing the secret can verify it.
+HA1 = H(username:realm:password) is cached per (username, realm, algorithm) in a bounded
+LRU, the password store is only asked on misses. The highest nonce count seen per nonce
+is kept in another LRU from the nonce's first use, to reject replays while it's there;
+nonces expire after nonce_lifetime anyway.
+
+The RFC 7616 userhash and username* parameters aren't supported.
+"""
+import collections
+import hashlib
+import hmac
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from lru_cache import LruCache
+from sip_fields import AuthCredentials
+from sip_message import SipMessage
+from sip_stringify import stringify_uri
+from sip_transaction import build_response
+
+DEFAULT_NONCE_LIFETIME = 300.0
+DEFAULT_HA1_CACHE_SIZE = 100000
+DEFAULT_NONCE_CACHE_SIZE = 100000
+CLOCK_SKEW = 5.0
+
+HASHES: Dict[str, Callable] = {
+    "MD5": hashlib.md5,
+    "MD5-SESS": hashlib.md5,
+    "SHA-256": hashlib.sha256,
+    "SHA-256-SESS": hashlib.sha256,
+}
+
+DigestResult = collections.namedtuple("DigestResult", "ok username stale reason")
+
+PasswordLookup = Callable[[str, str], Optional[str]]
+Ha1Lookup = Callable[[str, str, str], Optional[str]]
+
+
+def _hash(algorithm: str, data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return HASHES[algorithm.upper()](data).hexdigest()
+
+
+def compute_ha1(username: str, realm: str, password: str, algorithm: str = "MD5") -> str:
+    """ H(username:realm:password), before the -sess step """
+    return _hash(algorithm, f"{username}:{realm}:{password}")
+
+
+def compute_response(
+    ha1: str,
+    algorithm: str,
+    method: str,
+    uri: str,
+    nonce: str,
+    qop: Optional[str] = None,
+    nc: Optional[str] = None,
+    cnonce: Optional[str] = None,
+    body: bytes = b"",
+) -> str:
+    """ The expected response parameter. ha1 is H(username:realm:password) """
+    if algorithm.upper().endswith("-SESS"):
+        ha1 = _hash(algorithm, f"{ha1}:{nonce}:{cnonce}")
+
+    if qop == "auth-int":
+        ha2 = _hash(algorithm, f"{method}:{uri}:{_hash(algorithm, body)}")
+    else:
+        ha2 = _hash(algorithm, f"{method}:{uri}")
+
+    if qop:
+        return _hash(algorithm, f"{ha1}:{nonce}:{nc}:{cnonce}:{qop}:{ha2}")
+
+    return _hash(algorithm, f"{ha1}:{nonce}:{ha2}")
+
+
+class DigestAuthenticator:
+    """ Challenges requests and verifies their credentials for a realm.
+
+        Passwords come from get_password(username, realm), or HA1 values straight from
+        get_ha1(username, realm, algorithm) for stores that only keep those; None means an
+        unknown user. Processes verifying each other's nonces (e.g. sip_server workers)
+        must share the secret
+    """
+
+    def __init__(
+        self,
+        realm: str,
+        get_password: Optional[PasswordLookup] = None,
+        get_ha1: Optional[Ha1Lookup] = None,
+        secret: Optional[bytes] = None,
+        algorithms: Sequence[str] = ("SHA-256", "MD5"),
+        qop: Sequence[str] = ("auth", "auth-int"),
+        require_qop: bool = True,
+        nonce_lifetime: float = DEFAULT_NONCE_LIFETIME,
+        ha1_cache_size: int = DEFAULT_HA1_CACHE_SIZE,
+        nonce_cache_size: int = DEFAULT_NONCE_CACHE_SIZE,
+        clock: Callable[[], float] = time.time,
+    ):
+        if get_password is None and get_ha1 is None:
+            raise ValueError("Either get_password or get_ha1 is needed")
+
+        for algorithm in algorithms:
+            if algorithm.upper() not in HASHES:
+                raise ValueError(f"Unsupported digest algorithm: {algorithm}")
+
+        self.realm = realm
+        self.get_password = get_password
+        self.get_ha1 = get_ha1
+        self.secret = secret if secret is not None else os.urandom(32)
+        self.algorithms = tuple(algorithms)
+        self.qop = tuple(qop)
+        self.require_qop = require_qop
+        self.nonce_lifetime = nonce_lifetime
+        self.clock = clock
+        self.ha1_cache = LruCache(ha1_cache_size)
+        self.nonce_counts = LruCache(nonce_cache_size)
+
+    # Nonces
+
+    def _sign(self, value: str) -> str:
+        return hmac.new(self.secret, f"{value}:{self.realm}".encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+    def make_nonce(self) -> str:
+        """ A new nonce: timestamp and random part, hex, followed by their signature """
+        value = f"{int(self.clock()):08x}{os.urandom(8).hex()}"
+        return value + self._sign(value)
+
+    def check_nonce(self, nonce: str) -> Optional[bool]:
+        """ None if the nonce wasn't issued here, False if it's expired, True if valid """
+        value, signature = nonce[:24], nonce[24:]
+        if len(nonce) != 56 or not hmac.compare_digest(signature, self._sign(value)):
+            return None
+
+        try:
+            issued = int(value[:8], 16)
+        except ValueError:
+            return None
+
+        age = self.clock() - issued
+        if age < -CLOCK_SKEW:
+            return None
+
+        return age <= self.nonce_lifetime
+
+    # Challenges
+
+    def challenge(self, stale: bool = False) -> List[AuthCredentials]:
+        """ WWW-Authenticate / Proxy-Authenticate values, one per algorithm in order of
+            preference. Values are quoted as they're serialized as is
+        """
+        nonce = self.make_nonce()
+        challenges = []
+        for algorithm in self.algorithms:
+            params = {"realm": f'"{self.realm}"', "nonce": f'"{nonce}"', "algorithm": algorithm}
+            if self.qop:
+                params["qop"] = '"%s"' % ",".join(self.qop)
+            if stale:
+                params["stale"] = "true"
+            challenges.append(AuthCredentials("Digest", params))
+
+        return challenges
+
+    def build_challenge(self, request: SipMessage, proxy: bool = False, stale: bool = False) -> SipMessage:
+        """ The 401 (or 407 for a proxy) response challenging a request """
+        if proxy:
+            response = build_response(request, 407, "Proxy Authentication Required")
+            response.headers["proxy-authenticate"] = self.challenge(stale)
+        else:
+            response = build_response(request, 401, "Unauthorized")
+            response.headers["www-authenticate"] = self.challenge(stale)
+
+        return response
+
+    # Verification
+
+    def verify(self, request: SipMessage, proxy: bool = False) -> DigestResult:
+        """ Verifies the request's credentials for this realm. When the result is not ok,
+            the request should be challenged again (with stale=result.stale)
+        """
+        credentials = request.peek_header("proxy-authorization" if proxy else "authorization") or ()
+        for cred in credentials:
+            scheme = cred.scheme or ""
+            if scheme.lower() == "digest" and cred.params.get("realm") == self.realm:
+                return self.verify_credentials(cred, request.method, stringify_uri(request.uri), request.body)
+
+        return DigestResult(False, None, False, "no credentials for the realm")
+
+    def verify_credentials(
+        self, cred: AuthCredentials, method: str, request_uri: Optional[str] = None, body: bytes = b""
+    ) -> DigestResult:
+        """ Verifies Digest credentials of a request. request_uri, if given, must be the
+            digest uri
+        """
+        params = cred.params
+        username = params.get("username")
+        nonce = params.get("nonce")
+        uri = params.get("uri")
+        response = params.get("response")
+        if not (username and nonce and uri and response):
+            return DigestResult(False, username, False, "incomplete credentials")
+
+        algorithm = params.get("algorithm", "MD5")
+        if algorithm.upper() not in HASHES or algorithm.upper() not in map(str.upper, self.algorithms):
+            return DigestResult(False, username, False, "unsupported algorithm")
+
+        if request_uri is not None and uri != request_uri:
+            return DigestResult(False, username, False, "uri mismatch")
+
+        qop = params.get("qop")
+        nc = params.get("nc")
+        cnonce = params.get("cnonce")
+        if qop is None:
+            if self.require_qop:
+                return DigestResult(False, username, False, "qop required")
+        elif qop not in self.qop or not nc or not cnonce:
+            return DigestResult(False, username, False, "invalid qop")
+
+        fresh = self.check_nonce(nonce)
+        if fresh is None:
+            return DigestResult(False, username, False, "invalid nonce")
+
+        ha1 = self._ha1(username, algorithm)
+        if ha1 is None:
+            return DigestResult(False, username, False, "unknown user")
+
+        expected = compute_response(ha1, algorithm, method, uri, nonce, qop, nc, cnonce, body)
+        if not hmac.compare_digest(expected, response.lower()):
+            return DigestResult(False, username, False, "wrong response")
+
+        # The digest is right: an old nonce only needs a new challenge
+        if not fresh:
+            return DigestResult(False, username, True, "stale nonce")
+
+        return self._check_count(username, nonce, nc)
+
+    def _check_count(self, username: str, nonce: str, nc: Optional[str]) -> DigestResult:
+        try:
+            count = int(nc, 16) if nc is not None else 0
+        except ValueError:
+            return DigestResult(False, username, False, "invalid nonce count")
+
+        # Nonces are only tracked from their first use
+        last = self.nonce_counts.get(nonce)
+        if last is not None and count <= last:
+            return DigestResult(False, username, False, "replayed nonce count")
+
+        self.nonce_counts.put(nonce, count)
+        return DigestResult(True, username, False, None)
+
+    def _ha1(self, username: str, algorithm: str) -> Optional[str]:
+        base = algorithm.upper().replace("-SESS", "")
+        key: Tuple[str, str, str] = (username, self.realm, base)
+        ha1 = self.ha1_cache.get(key)
+        if ha1 is None:
+            if self.get_ha1 is not None:
+                ha1 = self.get_ha1(username, self.realm, base)
+                ha1 = ha1.lower() if ha1 is not None else None
+            else:
+                password = self.get_password(username, self.realm)
+                ha1 = compute_ha1(username, self.realm, password, base) if password is not None else None
+
+            if ha1 is None:
+                return None  # Unknown users aren't cached, they may be provisioned later
+            self.ha1_cache.put(key, ha1)
+
+        return ha1
+
+    def forget_user(self, username: str):
+        """ Drops the cached HA1 of a user, e.g. after a password change """
+        for algorithm in HASHES:
+            key = (username, self.realm, algorithm)
+            self.ha1_cache.pop(key)
@@ -0,0 +1,200 @@
+"""
+Fast-path editing of raw SIP messages for proxies.
+
+The message is indexed once into line segments of the original buffer and the usual
+proxy operations (Via push/pop, Max-Forwards, Record-Route, Route pop) splice header
+lines by offset, only parsing the header values they need
+"""
+from typing import Callable, List, Optional, Union
+
+from sip_parser import (
+    MULTI_HEADER_SEP_RE,
+    scan_via,
+    scan_aor_with_uri,
+)
+from sip_fields import NameAddr, SipUri, Via
+from sip_message import HEAD_END_RE, LINE_END_RE, HEADER_NAME_RE, LEADING_WS_RE, normalize_header_name
+from exceptions import SipParserError
+
+DEFAULT_MAX_FORWARDS = 70
+
+
+class HeaderLine:
+    """ A header line of the message: its name (as normalized by SipMessage), the line itself
+        including the trailing CRLF and where the value starts within it
+    """
+
+    __slots__ = ("name", "line", "value_start")
+
+    def __init__(self, name: str, line: Union[memoryview, bytes], value_start: int):
+        self.name = name
+        self.line = line
+        self.value_start = value_start
+
+    @classmethod
+    def build(cls, pretty_name: str, value: str) -> "HeaderLine":
+        prefix = f"{pretty_name}: ".encode()
+        return cls(normalize_header_name(pretty_name), prefix + value.encode() + b"\r\n", len(prefix))
+
+    @property
+    def value(self) -> str:
+        return str(self.line[self.value_start : len(self.line) - 2], "utf-8")
+
+    def with_value(self, value: str) -> "HeaderLine":
+        """ Same header (keeping the name as written) with a different value """
+        prefix = bytes(self.line[: self.value_start])
+        return HeaderLine(self.name, prefix + value.encode() + b"\r\n", self.value_start)
+
+
+class SipMessageEditor:
+    """ Editable view of a raw SIP message. Unedited parts are never copied until
+        to_bytes() joins the segments back together.
+    """
+
+    def __init__(self, raw_message: Union[bytes, bytearray, memoryview]):
+        buf = memoryview(raw_message)
+        if buf.format != "B" or buf.ndim != 1:
+            buf = buf.cast("B")
+
+        start = LEADING_WS_RE.match(buf).end()
+        head_end = HEAD_END_RE.search(buf, start)
+        if not head_end:
+            raise SipParserError(
+                "Invalid SIP message format, couldn't find header/body division as header must be followed by 2 linebreaks"
+            )
+
+        # Every segment keeps its CRLF, the tail is the empty line plus the body
+        end = head_end.start()
+        line_starts = [start] + [m.end() for m in LINE_END_RE.finditer(buf, start, end)]
+        line_ends = line_starts[1:] + [end + 2]
+
+        self.start_line = buf[line_starts[0] : line_ends[0]]
+        self.headers: List[HeaderLine] = []
+        for line_start, line_end in zip(line_starts[1:], line_ends[1:]):
+            header_match = HEADER_NAME_RE.match(buf, line_start, line_end - 2)
+            if not header_match:
+                line = str(buf[line_start : line_end - 2], "utf-8", "replace")
+                raise SipParserError("Invalid SIP header detected. Parsing line: %s" % line)
+
+            name = normalize_header_name(str(header_match.group(1), "utf-8"))
+            line = buf[line_start:line_end]
+            self.headers.append(HeaderLine(name, line, header_match.end() - line_start))
+
+        self.tail = buf[end + 2 :]
+
+    @property
+    def is_response(self) -> bool:
+        return bytes(self.start_line[:4]) == b"SIP/"
+
+    def _find(self, name: str) -> Optional[int]:
+        """ Index of the first line of the header (any case, compact or full name) """
+        name = normalize_header_name(name)
+        for i, header in enumerate(self.headers):
+            if header.name == name:
+                return i
+
+        return None
+
+    def header_value(self, name: str) -> Optional[str]:
+        """ Raw value of the first line of the header, if present """
+        i = self._find(name)
+        return self.headers[i].value if i is not None else None
+
+    def _scan_first_value(self, name: str, scan_fn: Callable):
+        """ Parses the first of the comma-separated values of a header. Returns the line
+            index, the parsed value and where it ended, or None if there's no such header
+        """
+        i = self._find(name)
+        if i is None:
+            return None
+
+        parsed, pos = scan_fn(self.headers[i].value, 0)
+        return i, parsed, pos
+
+    def _remove_first_value(self, i: int, pos: int):
+        """ Removes the value ending at pos from the line i, or the whole line if it was
+            its only value
+        """
+        value = self.headers[i].value
+        sep = MULTI_HEADER_SEP_RE.match(value, pos)
+        if sep and sep.end() < len(value):
+            self.headers[i] = self.headers[i].with_value(value[sep.end() :])
+        else:
+            del self.headers[i]
+
+    def _pop_first_value(self, name: str, scan_fn: Callable):
+        """ Removes the first of the comma-separated values of a header, returning it
+            parsed (None if there's no such header)
+        """
+        found = self._scan_first_value(name, scan_fn)
+        if found is None:
+            return None
+
+        i, parsed, pos = found
+        self._remove_first_value(i, pos)
+        return parsed
+
+    def _peek_first_value(self, name: str, scan_fn: Callable):
+        found = self._scan_first_value(name, scan_fn)
+        return found[1] if found is not None else None
+
+    def top_via(self) -> Optional[Via]:
+        return self._peek_first_value("via", scan_via)
+
+    def push_via(self, via: str):
+        """ Adds a Via value (e.g. "SIP/2.0/UDP proxy.example.com;branch=z9hG4bK...") on top """
+        i = self._find("via")
+        self.headers.insert(i if i is not None else 0, HeaderLine.build("Via", via))
+
+    def pop_via(self) -> Optional[Via]:
+        """ Removes the top Via value (responses going back upstream) and returns it """
+        return self._pop_first_value("via", scan_via)
+
+    def decrement_max_forwards(self) -> int:
+        """ Decrements Max-Forwards (adding it if missing, RFC 3261 16.6) and returns the
+            value it had. When it's already 0 the message is left untouched, as it must not
+            be forwarded (the caller answers 483 Too Many Hops)
+        """
+        i = self._find("max-forwards")
+        if i is None:
+            self.headers.append(HeaderLine.build("Max-Forwards", str(DEFAULT_MAX_FORWARDS - 1)))
+            return DEFAULT_MAX_FORWARDS
+
+        try:
+            max_forwards = int(self.headers[i].value)
+        except ValueError:
+            raise SipParserError("Invalid Max-Forwards header value")
+
+        if max_forwards > 0:
+            self.headers[i] = self.headers[i].with_value(str(max_forwards - 1))
+
+        return max_forwards
+
+    def insert_record_route(self, record_route: str):
+        """ Adds a Record-Route value (e.g. "<sip:proxy.example.com;lr>") on top """
+        i = self._find("record-route")
+        line = HeaderLine.build("Record-Route", record_route)
+        if i is None:
+            self.headers.append(line)
+        else:
+            self.headers.insert(i, line)
+
+    def top_route(self) -> Optional[NameAddr]:
+        return self._peek_first_value("route", scan_aor_with_uri)
+
+    def pop_route_if(self, points_at_us: Callable[[SipUri], bool]) -> Optional[NameAddr]:
+        """ Removes the top Route value if points_at_us(its URI) is true, returning it
+        """
+        found = self._scan_first_value("route", scan_aor_with_uri)
+        if found is None:
+            return None
+
+        i, route, pos = found
+        if not points_at_us(route.uri):
+            return None
+
+        self._remove_first_value(i, pos)
+        return route
+
+    def to_bytes(self) -> bytes:
+        return b"".join([self.start_line, *(header.line for header in self.headers), self.tail])
@@ -0,0 +1,318 @@
+"""
+Typed values of parsed SIP headers.
+
+They use __slots__ to keep parsed messages small (no per-value dict) and still behave as
+the dicts the parser used to return (value["host"], value.get("params"), dict(value),
+comparisons with dicts, ...). to_dict() converts a value and its nested values into
+plain dicts, e.g. json.dumps(msg.headers, default=to_builtin)
+"""
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+
+class HeaderField(MutableMapping):
+    """ Base class of the header values, providing a dict-compatible view over the fields
+    """
+
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._fields:
+            raise KeyError(key)
+
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in self._fields:
+            raise KeyError(key)
+
+        setattr(self, key, value)
+
+    def __delitem__(self, key: str):
+        raise TypeError(f"Can't remove fields from a {type(self).__name__} header value")
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._fields
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in self.items())
+        return f"{type(self).__name__}({fields})"
+
+    def __reduce__(self):
+        return (type(self), self._values())
+
+    def _values(self) -> Tuple[Any, ...]:
+        """ The constructor arguments """
+        return tuple(getattr(self, name) for name in self._fields)
+
+    def copy(self):
+        """ Copy that shares nothing mutable with this value """
+        return type(self)(*(_copy_value(value) for value in self._values()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ Plain dict of the fields, converting nested values too """
+        return {name: to_builtin(value) for name, value in self.items()}
+
+
+class SipUri(HeaderField):
+    __slots__ = _fields = ("schema", "user", "password", "host", "port", "params", "headers")
+
+    def __init__(
+        self,
+        schema: str,
+        user: Optional[str],
+        password: Optional[str],
+        host: str,
+        port: Optional[int],
+        params: Dict[str, Optional[str]],
+        headers: Dict[str, str],
+    ):
+        self.schema = schema
+        self.user = user
+        self.password = password
+        self.host = host
+        self.port = port
+        self.params = params
+        self.headers = headers
+
+
+class NameAddr(HeaderField):
+    """ Address of record: display name, URI (raw or parsed) and header parameters """
+
+    __slots__ = _fields = ("name", "uri", "params")
+
+    def __init__(self, name: Optional[str], uri: Union[str, SipUri], params: Dict[str, Optional[str]]):
+        self.name = name
+        self.uri = uri
+        self.params = params
+
+
+class Via(HeaderField):
+    __slots__ = _fields = ("version", "protocol", "host", "port", "params")
+
+    def __init__(
+        self,
+        version: str,
+        protocol: str,
+        host: str,
+        port: Union[int, str, None],
+        params: Dict[str, Optional[str]],
+    ):
+        self.version = version
+        self.protocol = protocol
+        self.host = host
+        self.port = port
+        self.params = params
+
+
+class CSeq(HeaderField):
+    __slots__ = _fields = ("seq", "method")
+
+    def __init__(self, seq: int, method: str):
+        self.seq = seq
+        self.method = method
+
+
+class AuthCredentials(HeaderField):
+    """ Authentication header (Authorization, WWW-Authenticate, ...) value.
+
+        Its dict view lists the auth parameters followed by "scheme", when there's one
+    """
+
+    __slots__ = _fields = ("scheme", "params")
+
+    def __init__(self, scheme: Optional[str], params: Dict[str, str]):
+        self.scheme = scheme
+        self.params = params
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "scheme" and self.scheme is not None:
+            return self.scheme
+
+        return self.params[key]
+
+    def __setitem__(self, key: str, value: Any):
+        if key == "scheme":
+            self.scheme = value
+        else:
+            self.params[key] = value
+
+    def __delitem__(self, key: str):
+        if key == "scheme" and self.scheme is not None:
+            self.scheme = None
+        else:
+            del self.params[key]
+
+    def __contains__(self, key: Any) -> bool:
+        return (key == "scheme" and self.scheme is not None) or key in self.params
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.params
+        if self.scheme is not None:
+            yield "scheme"
+
+    def __len__(self) -> int:
+        return len(self.params) + (self.scheme is not None)
+
+
+class FrozenDict(dict):
+    """ Read-only dict, the params/headers of frozen values """
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Shared header value, copy() it before changing it")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    update = setdefault = pop = popitem = clear = _read_only
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def copy(self) -> Dict[str, Any]:
+        return dict(self)
+
+
+class FrozenField:
+    """ Mixin of the read-only versions of the typed values, see freeze() """
+
+    __slots__ = ()
+    _thawed: type
+
+    def _read_only(self, *args):
+        raise TypeError("Shared header value, copy() it before changing it")
+
+    __setattr__ = __setitem__ = __delitem__ = _read_only
+
+    def __reduce__(self):
+        return (freeze, (self.copy(),))
+
+    def copy(self):
+        """ Mutable copy, sharing nothing with this value """
+        return self._thawed(*(_copy_value(value) for value in self._values()))
+
+
+class FrozenSipUri(FrozenField, SipUri):
+    __slots__ = ()
+    _thawed = SipUri
+
+
+class FrozenNameAddr(FrozenField, NameAddr):
+    __slots__ = ()
+    _thawed = NameAddr
+
+
+FROZEN_TYPES = {SipUri: FrozenSipUri, NameAddr: FrozenNameAddr}
+
+
+def freeze(value: Union[SipUri, NameAddr]) -> Union[SipUri, NameAddr]:
+    """ Read-only version of a SipUri or NameAddr (nested values included), which can be
+        shared, e.g. by a parse cache. Changing it raises TypeError, copy() gives a
+        mutable version
+    """
+    if isinstance(value, FrozenField):
+        return value
+
+    frozen_type = FROZEN_TYPES[type(value)]
+    frozen = frozen_type.__new__(frozen_type)
+    for name in value._fields:
+        object.__setattr__(frozen, name, _freeze_value(getattr(value, name)))
+
+    return frozen
+
+
+def thaw(value: Any) -> Any:
+    """ The value, or a list of them, with any frozen part replaced by a mutable copy.
+        Lists and mutable typed values are updated in place
+    """
+    if isinstance(value, FrozenField):
+        return value.copy()
+
+    if isinstance(value, HeaderField):
+        for name in value._fields:
+            field = getattr(value, name)
+            if isinstance(field, (FrozenField, FrozenDict)):
+                setattr(value, name, thaw(field))
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            if isinstance(item, HeaderField):
+                value[index] = thaw(item)
+    elif isinstance(value, FrozenDict):
+        return dict(value)
+
+    return value
+
+
+# Type codes used by pack_header_value, which must stay stable
+FIELD_TYPES = {0: SipUri, 1: NameAddr, 2: Via, 3: CSeq, 4: AuthCredentials}
+FIELD_TYPE_CODES = {field_type: code for code, field_type in FIELD_TYPES.items()}
+FIELD_TYPE_CODES.update({FrozenSipUri: 0, FrozenNameAddr: 1})
+
+
+def pack_header_value(value: Any) -> Any:
+    """ Converts a parsed header value into builtins only (marshal-able), turning
+        each typed value into a (type code, *fields) tuple
+    """
+    if isinstance(value, HeaderField):
+        fields = (pack_header_value(field) for field in value._values())
+        return (FIELD_TYPE_CODES[type(value)], *fields)
+
+    if isinstance(value, list):
+        return [pack_header_value(item) for item in value]
+
+    if isinstance(value, FrozenDict):
+        return dict(value)
+
+    return value
+
+
+def unpack_header_value(value: Any) -> Any:
+    """ Reverses pack_header_value """
+    if isinstance(value, tuple):
+        return FIELD_TYPES[value[0]](*(unpack_header_value(field) for field in value[1:]))
+
+    if isinstance(value, list):
+        return [unpack_header_value(item) for item in value]
+
+    return value
+
+
+def to_builtin(value: Any) -> Any:
+    """ The value with typed values (nested or in lists) turned into plain dicts """
+    if isinstance(value, HeaderField):
+        return value.to_dict()
+
+    if isinstance(value, list):
+        return [to_builtin(item) for item in value]
+
+    if isinstance(value, FrozenDict):
+        return dict(value)
+
+    return value
+
+
+def _copy_value(value: Any) -> Any:
+    if isinstance(value, HeaderField):
+        return value.copy()
+
+    if isinstance(value, dict):
+        return dict(value)
+
+    return value
+
+
+def _freeze_value(value: Any) -> Any:
+    if isinstance(value, HeaderField):
+        return freeze(value)
+
+    if isinstance(value, dict):
+        return FrozenDict(value)
+
+    return value
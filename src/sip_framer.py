@@ -0,0 +1,139 @@
+"""
+Incremental framing of SIP messages over stream transports (TCP/TLS)
+"""
+import re
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from sip_parser import COMPACT_HEADERS
+from exceptions import SipParserError
+
+# Long and compact (l:) names of the Content-Length header
+CONTENT_LENGTH_NAMES = ["content-length"] + [
+    short for short, name in COMPACT_HEADERS.items() if name == "content-length"
+]
+
+HEAD_END_RE = re.compile(rb"\r\n\r\n")
+CONTENT_LENGTH_RE = re.compile(
+    rb"\r\n(?:%s)[ \t]*:[ \t]*(\d+)" % b"|".join(n.encode() for n in CONTENT_LENGTH_NAMES),
+    re.IGNORECASE,
+)
+
+KEEPALIVE_PING = b"\r\n\r\n"
+KEEPALIVE_PONG = b"\r\n"
+
+DEFAULT_MAX_MESSAGE_SIZE = 1024 * 1024
+
+
+class SipStreamFramer:
+    """ Stateful framer that turns arbitrary chunks of a byte stream into complete SIP messages.
+
+        The end of the headers is searched only in data that wasn't looked at before and the
+        body is delimited by Content-Length, so the work done is linear in the stream size.
+        A message without Content-Length is taken to have an empty body.
+
+        CRLF keepalives (RFC 5626) between messages are consumed and reported to on_keepalive
+        with either KEEPALIVE_PING (double CRLF) or KEEPALIVE_PONG (single CRLF). Keepalive
+        bytes at the end of the data fed so far are held back until the next chunk, as they
+        may be the start of a ping split across chunks.
+
+        A SipParserError means the stream can't be framed anymore and should be closed.
+    """
+
+    def __init__(
+        self,
+        on_keepalive: Optional[Callable[[bytes], None]] = None,
+        max_message_size: int = DEFAULT_MAX_MESSAGE_SIZE,
+    ):
+        self.on_keepalive = on_keepalive
+        self.max_message_size = max_message_size
+
+        self._buffer = bytearray()
+        self._start = 0  # Start of the message being framed
+        self._scan = 0  # Where to resume looking for the end of the headers
+        self._message_end: Optional[int] = None  # Known once the headers are complete
+
+    @property
+    def pending(self) -> int:
+        """ Number of buffered bytes that aren't part of a complete message yet """
+        return len(self._buffer) - self._start
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """ Adds a chunk of the stream and returns the messages completed by it """
+        self._buffer += data
+
+        messages = []
+        while True:
+            message = self._next_message()
+            if message is None:
+                break
+
+            messages.append(message)
+
+        self._compact()
+        return messages
+
+    def _skip_keepalives(self):
+        buf = self._buffer
+        while buf.startswith(KEEPALIVE_PONG, self._start):
+            if buf.startswith(KEEPALIVE_PING, self._start):
+                keepalive = KEEPALIVE_PING
+            elif KEEPALIVE_PING.startswith(buf[self._start : self._start + len(KEEPALIVE_PING)]):
+                break  # Wait for the rest of what may be a ping
+            else:
+                keepalive = KEEPALIVE_PONG
+
+            self._start += len(keepalive)
+            if self.on_keepalive:
+                self.on_keepalive(keepalive)
+
+        self._scan = max(self._scan, self._start)
+
+    def _next_message(self) -> Optional[bytes]:
+        buf = self._buffer
+        if self._message_end is None:
+            self._skip_keepalives()
+
+            head_end = HEAD_END_RE.search(buf, self._scan)
+            if not head_end:
+                if len(buf) - self._start > self.max_message_size:
+                    raise SipParserError("SIP message headers exceed the maximum message size")
+
+                # The next search only needs to cover a header end split across chunks
+                self._scan = max(self._start, len(buf) - len(KEEPALIVE_PING) + 1)
+                return None
+
+            # Content-Length is looked up on its own line, after the start line
+            cl_match = CONTENT_LENGTH_RE.search(buf, self._start, head_end.start() + 2)
+            content_length = int(cl_match.group(1)) if cl_match else 0
+
+            self._message_end = head_end.end() + content_length
+            if self._message_end - self._start > self.max_message_size:
+                raise SipParserError("SIP message exceeds the maximum message size")
+
+        if len(buf) < self._message_end:
+            return None
+
+        message = bytes(buf[self._start : self._message_end])
+        self._start = self._scan = self._message_end
+        self._message_end = None
+        return message
+
+    def _compact(self):
+        # Drop consumed data once it outweighs what's left, keeping the cost amortized linear
+        if self._start == 0 or self._start < len(self._buffer) - self._start:
+            return
+
+        del self._buffer[: self._start]
+        self._scan -= self._start
+        if self._message_end is not None:
+            self._message_end -= self._start
+
+        self._start = 0
+
+
+def frame_stream(chunks: Iterable[bytes], **kwargs) -> Iterator[bytes]:
+    """ Yields the complete SIP messages found in an iterable of stream chunks
+    """
+    framer = SipStreamFramer(**kwargs)
+    for chunk in chunks:
+        yield from framer.feed(chunk)
@@ -0,0 +1,386 @@
+"""
+SIP load generator: a UAC running REGISTER, OPTIONS or INVITE/ACK/BYE scenarios at a target
+rate, and a UAS answering them, both on sip_transport UDP endpoints and the transaction
+layer (so lost messages are retransmitted and counted).
+
+The UAC renders its requests from sip_template templates and sends the rendered bytes as
+they are (the transaction layer only indexes them, for the Via and CSeq of its key). The
+UAS builds its responses from the request's own Via, From, To, Call-ID and CSeq lines,
+copied as received. See benchmarks/loadgen.py for the command line runner.
+"""
+import asyncio
+import collections
+import itertools
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sip_message import SipMessage, LazyHeaders
+from sip_stringify import stringify_header
+from sip_template import MessageTemplate, Slot
+from sip_transaction import TransactionManager, ServerTransaction, ClientTransaction
+from sip_transport import Address, SipDatagramProtocol, create_udp_endpoint
+
+SCENARIOS = ("register", "options", "invite")
+
+DEFAULT_MAX_INFLIGHT = 10000
+DEFAULT_DRAIN_TIMEOUT = 5.0
+QUEUE_SIZE = 65536
+
+# How often the UAC starts the scenarios that are due
+PACING_INTERVAL = 0.005
+
+# Headers a response copies from its request (RFC 3261 8.2.6.2)
+RESPONSE_HEADERS = ("via", "from", "to", "call-id", "cseq")
+
+SDP = (
+    "v=0\r\n"
+    "o=- 1 1 IN IP4 {host}\r\n"
+    "s=-\r\n"
+    "c=IN IP4 {host}\r\n"
+    "t=0 0\r\n"
+    "m=audio 4000 RTP/AVP 0 8 101\r\n"
+    "a=rtpmap:0 PCMU/8000\r\n"
+    "a=rtpmap:8 PCMA/8000\r\n"
+    "a=rtpmap:101 telephone-event/8000\r\n"
+    "a=sendrecv\r\n"
+)
+
+
+def _request_data(method: str, uri: str, local: Address, headers: Dict[str, Any], content: str = "") -> Dict[str, Any]:
+    host, port = local[0], local[1]
+    data_headers = {
+        "via": [{"version": "2.0", "protocol": "UDP", "host": host, "port": port,
+                 "params": {"branch": Slot("branch")}}],
+        "max-forwards": 70,
+        "from": {"uri": f"sip:loadgen@{host}", "params": {"tag": Slot("from_tag")}},
+        "to": {"uri": uri, "params": {}},
+        "call-id": Slot("call_id"),
+        "cseq": {"seq": 1, "method": method},
+    }
+    data_headers.update(headers)
+    return {"method": method, "uri": uri, "version": "2.0", "headers": data_headers, "content": content}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class MethodStats:
+    """ Transactions of one request method: final response times (in seconds), statuses
+        and timeouts
+    """
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Dict[int, int] = collections.Counter()
+        self.timeouts = 0
+
+    def report(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "responses": len(latencies),
+            "timeouts": self.timeouts,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p90_ms": percentile(latencies, 90) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+            "statuses": dict(self.statuses),
+        }
+
+
+class LoadStats:
+    """ Outcome of a UAC run, with the statistics of each request method. The response
+        times and statuses of the report are those of the method defining the scenario
+        (INVITE for calls, not their BYE), the others are under "methods".
+        Scenarios still running after the drain timeout are unfinished
+    """
+
+    def __init__(self, method: str):
+        self.method = method
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.retransmissions = 0
+        self.elapsed = 0.0
+        self.methods: Dict[str, MethodStats] = collections.defaultdict(MethodStats)
+
+    @property
+    def cps(self) -> float:
+        """ Scenarios completed per second """
+        return self.completed / self.elapsed if self.elapsed else 0.0
+
+    def report(self) -> Dict[str, Any]:
+        main = self.methods[self.method].report()
+        del main["responses"], main["timeouts"]
+        return {
+            "method": self.method,
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "unfinished": self.started - self.completed - self.failed,
+            "retransmissions": self.retransmissions,
+            "elapsed": self.elapsed,
+            "cps": self.cps,
+            **main,
+            "methods": {method: stats.report() for method, stats in self.methods.items()},
+        }
+
+
+class _Call:
+    __slots__ = ("values",)
+
+    def __init__(self, values: Dict[str, Any]):
+        self.values = values
+
+
+class LoadUac:
+    """ Runs a scenario against target at `rate` per second for `duration` seconds, with at
+        most max_inflight scenarios running at once
+    """
+
+    def __init__(
+        self,
+        scenario: str,
+        target: Address,
+        rate: float,
+        duration: float,
+        max_inflight: int = DEFAULT_MAX_INFLIGHT,
+        drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,
+    ):
+        if scenario not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {scenario}, expected one of {', '.join(SCENARIOS)}")
+
+        self.scenario = scenario
+        self.target = target
+        self.rate = rate
+        self.duration = duration
+        self.max_inflight = max_inflight
+        self.drain_timeout = drain_timeout
+        self.stats = LoadStats(scenario.upper())
+
+        self.endpoint: Optional[SipDatagramProtocol] = None
+        self.manager: Optional[TransactionManager] = None
+        self.templates: Dict[str, MessageTemplate] = {}
+        self._inflight = 0
+        self._ids = itertools.count(1)
+        self._run_id = os.urandom(4).hex()
+        self._host = ""
+
+    def _compile(self, local: Address):
+        target_uri = f"sip:uas@{self.target[0]}:{self.target[1]}"
+        contact = {"contact": [{"uri": f"sip:loadgen@{local[0]}:{local[1]}", "params": {}}]}
+        dialog = {"to": {"uri": target_uri, "params": {"tag": Slot("to_tag")}}}
+        self.templates = {
+            "register": MessageTemplate(_request_data(
+                "REGISTER", f"sip:{self.target[0]}", local,
+                dict(contact, to={"uri": f"sip:loadgen@{local[0]}", "params": {}}, expires=3600),
+            )),
+            "options": MessageTemplate(_request_data(
+                "OPTIONS", target_uri, local, {"accept": "application/sdp"}
+            )),
+            "invite": MessageTemplate(_request_data(
+                "INVITE", target_uri, local, dict(contact, **{"content-type": "application/sdp"}),
+                SDP.format(host=local[0]),
+            )),
+            "ack": MessageTemplate(_request_data("ACK", target_uri, local, dialog)),
+            "bye": MessageTemplate(_request_data(
+                "BYE", target_uri, local, dict(dialog, cseq={"seq": 2, "method": "BYE"})
+            )),
+        }
+
+    async def run(self, host: str = "127.0.0.1", port: int = 0) -> LoadStats:
+        loop = asyncio.get_running_loop()
+        self.endpoint = await create_udp_endpoint(self._receive, host, port, queue_size=QUEUE_SIZE)
+        local = self.endpoint.transport.get_extra_info("sockname")
+        self._host = local[0]
+        self._compile(local)
+        self.manager = TransactionManager(self.endpoint.send)
+        self.manager.wheel.attach(loop)
+
+        try:
+            start = loop.time()
+            end = start + self.duration
+            while loop.time() < end:
+                due = int((loop.time() - start) * self.rate) - self.stats.started
+                for _ in range(min(due, self.max_inflight - self._inflight)):
+                    self._start()
+                await asyncio.sleep(PACING_INTERVAL)
+
+            deadline = loop.time() + self.drain_timeout
+            while self._inflight and loop.time() < deadline:
+                await asyncio.sleep(PACING_INTERVAL)
+
+            self.stats.elapsed = loop.time() - start
+            self.stats.retransmissions = self.manager.retransmissions
+        finally:
+            self.manager.wheel.detach()
+            self.endpoint.close()
+
+        return self.stats
+
+    async def _receive(self, message: SipMessage, addr: Address, endpoint: SipDatagramProtocol):
+        self.manager.receive(message, addr)
+
+    def _start(self):
+        index = next(self._ids)
+        call = _Call({
+            "call_id": f"{index:x}-{self._run_id}@{self._host}",
+            "from_tag": f"{index:x}",
+            "branch": self._branch(),
+        })
+        self.stats.started += 1
+        self._inflight += 1
+        on_final = self._invite_answered if self.scenario == "invite" else self._done
+        self._send(self.templates[self.scenario], call, on_final)
+
+    def _branch(self) -> str:
+        return f"z9hG4bK{self._run_id}{next(self._ids):x}"
+
+    def _send(self, template: MessageTemplate, call: _Call, on_final: Callable[[_Call, SipMessage], Any]):
+        data = template.render(**call.values)
+        request = SipMessage.from_bytes(data)
+        stats = self.stats.methods[request.method]
+        sent = time.monotonic()
+
+        def on_response(transaction: ClientTransaction, response: SipMessage):
+            if response.status >= 200:
+                stats.latencies.append(time.monotonic() - sent)
+                stats.statuses[response.status] += 1
+                on_final(call, response)
+
+        def on_timeout(transaction: ClientTransaction):
+            stats.timeouts += 1
+            self.stats.timeouts += 1
+            self._finish(False)
+
+        self.manager.send_request(request, self.target, on_response=on_response, on_timeout=on_timeout, data=data)
+
+    def _done(self, call: _Call, response: SipMessage):
+        self._finish(response.status < 300)
+
+    def _invite_answered(self, call: _Call, response: SipMessage):
+        if response.status >= 300:
+            self._finish(False)  # The transaction acknowledges it
+            return
+
+        to_value = response.peek_header("to") or {}
+        call.values["to_tag"] = (to_value.get("params") or {}).get("tag", "")
+        call.values["branch"] = self._branch()
+        self.endpoint.send(self.templates["ack"].render(**call.values), self.target)
+
+        call.values["branch"] = self._branch()
+        self._send(self.templates["bye"], call, self._done)
+
+    def _finish(self, success: bool):
+        self._inflight -= 1
+        if success:
+            self.stats.completed += 1
+        else:
+            self.stats.failed += 1
+
+
+class LoadUas:
+    """ Answers the load generator: 200 to REGISTER, OPTIONS and BYE, 180 then 200 with SDP
+        to INVITE (2xx aren't retransmitted until the ACK, so a lost 200 shows up as a UAC
+        timeout), 501 to anything else
+    """
+
+    def __init__(self, ringing: bool = True):
+        self.ringing = ringing
+        self.endpoint: Optional[SipDatagramProtocol] = None
+        self.manager: Optional[TransactionManager] = None
+        self.requests: Dict[str, int] = collections.Counter()
+        self._tags = itertools.count(1)
+        self._contact = ""
+        self._sdp = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 5060) -> SipDatagramProtocol:
+        self.endpoint = await create_udp_endpoint(self._receive, host, port, queue_size=QUEUE_SIZE)
+        local = self.endpoint.transport.get_extra_info("sockname")
+        self._contact = f"Contact: <sip:uas@{local[0]}:{local[1]}>\r\n"
+        self._sdp = SDP.format(host=local[0])
+        self.manager = TransactionManager(self.endpoint.send, on_request=self._on_request)
+        self.manager.wheel.attach(asyncio.get_running_loop())
+        return self.endpoint
+
+    def close(self):
+        if self.manager is not None:
+            self.manager.wheel.detach()
+        if self.endpoint is not None:
+            self.endpoint.close()
+
+    @property
+    def retransmissions(self) -> int:
+        return self.manager.retransmissions if self.manager is not None else 0
+
+    async def _receive(self, message: SipMessage, addr: Address, endpoint: SipDatagramProtocol):
+        self.manager.receive(message, addr)
+
+    def _on_request(self, transaction: Optional[ServerTransaction], request: SipMessage):
+        self.requests[request.method] += 1
+        if transaction is None:
+            return  # ACK of a 2xx
+
+        method = request.method
+        if method == "INVITE":
+            to_tag = f"{next(self._tags):x}"
+            if self.ringing:
+                self._respond(transaction, 180, "Ringing", to_tag)
+
+            headers = self._contact + "Content-Type: application/sdp\r\n"
+            self._respond(transaction, 200, "OK", to_tag, headers, self._sdp)
+        elif method == "REGISTER":
+            contact = _raw_lines(request, "contact") or self._contact
+            self._respond(transaction, 200, "OK", headers=contact + "Expires: 3600\r\n")
+        elif method in ("OPTIONS", "BYE"):
+            self._respond(transaction, 200, "OK")
+        else:
+            self._respond(transaction, 501, "Not Implemented")
+
+    def _respond(
+        self,
+        transaction: ServerTransaction,
+        status: int,
+        reason: str,
+        to_tag: Optional[str] = None,
+        headers: str = "",
+        content: str = "",
+    ):
+        """ Sends a response with the request's RESPONSE_HEADERS lines, then `headers`
+            (CRLF terminated lines) and content. to_tag is added to the To header if it
+            doesn't have a tag yet
+        """
+        request = transaction.request
+        lines = [f"SIP/{request.version} {status} {reason}\r\n"]
+        for name in RESPONSE_HEADERS:
+            raw = _raw_lines(request, name)
+            if raw and name == "to" and to_tag:
+                to_value = request.peek_header("to") or {}
+                if not (to_value.get("params") or {}).get("tag"):
+                    raw = raw[:-2] + f";tag={to_tag}\r\n"
+            lines.append(raw)
+
+        body = content.encode("utf-8")
+        lines.append(f"{headers}Content-Length: {len(body)}\r\n\r\n")
+        data = "".join(lines).encode("utf-8") + body
+        transaction.send_response(SipMessage.from_bytes(data), data)
+
+
+def _raw_lines(request: SipMessage, name: str) -> str:
+    """ The request's lines of a header as received, serialized if they aren't available
+        (the request wasn't parsed from the wire), or "" if it doesn't have the header
+    """
+    if isinstance(request.headers, LazyHeaders):
+        raw = request.headers.raw_lines(name)
+        if raw is not None:
+            return raw
+
+    value = request.peek_header(name)
+    return "" if value is None else stringify_header(name, value) + "\r\n"
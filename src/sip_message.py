@@ -1,6 +1,6 @@
 import urllib
 import re
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Tuple, Union
 from sip_parser import (
     COMPACT_HEADERS,
     parse_params,
@@ -16,9 +16,12 @@ from sip_parser import (
     parse_request,
 )
 from sip_stringify import (
+    compact_header_lines,
     stringify_header,
     stringify_uri,
 )
+from sip_fields import thaw
+from sip_compression import compress, decompress, is_compressed
 from exceptions import SipParserError, SipBuilderError
 
 # These headers appear multiple times in a single message
@@ -37,6 +40,276 @@ MULTI_INSTANCE_HEADER_NAMES = (
     "proxy-authorization",
 )
 
+# "Name: value" header line, the value may span folded lines
+HEADER_LINE_RE = re.compile(r"^([\S]*?)\s*:\s*([\s\S]*)$")
+
+# Byte patterns used to index messages parsed with SipMessage.from_bytes
+LEADING_WS_RE = re.compile(rb"\s*")
+HEAD_END_RE = re.compile(rb"\r\n\r\n")
+LINE_END_RE = re.compile(rb"\r\n(?![ \t])")
+HEADER_NAME_RE = re.compile(rb"([\S]*?)\s*:\s*")
+
+# Placeholder for headers whose raw value hasn't been parsed yet
+_UNPARSED = object()
+
+# Via branches starting with it follow RFC 3261 (and identify the transaction)
+MAGIC_COOKIE = "z9hG4bK"
+
+TransactionKey = Tuple
+DialogKey = Tuple[str, Optional[str], Optional[str]]
+
+
+def add_multi_header_from_str(headers: Dict[str, Any], name: str, raw_val: str):
+    """ Parses a multi-instance header value and adds it to the given headers
+    """
+    values: Union[str, List]
+    if name == "contact":
+        if raw_val == "*":
+            values = "*"
+        else:
+            values, data = parse_multi_header(parse_aor, raw_val)
+    elif name in ("route", "record-route", "path"):
+        values, data = parse_multi_header(parse_aor_with_uri, raw_val)
+    elif name == "via":
+        values, data = parse_multi_header(parse_via, raw_val)
+    elif name in (
+        "www-authenticate",
+        "proxy-authenticate",
+        "authorization",
+        "proxy-authorization",
+    ):
+        values, data = parse_multi_header(parse_auth_header_with_scheme, raw_val)
+    else:
+        raise SipParserError(f"Don't know how to process header {name} as a multi-header")
+
+    # Make sure there's no leftover data after parsing (either we parsed wrong or the header is invalid, either way - bad)
+    if data:
+        raise SipParserError(f"Leftover data found after processing {name} header")
+
+    # If we hadn't found this header before, create it. Otherwise, append to it
+    if name not in headers:
+        headers[name] = []
+
+    headers[name].extend(values)
+
+
+def normalize_header_name(name: str) -> str:
+    """ The name headers are stored under: unquoted, lowercase and in full form """
+    name = urllib.parse.unquote(name).lower()
+    return COMPACT_HEADERS.get(name, name)
+
+
+def _tag(value: Any) -> Optional[str]:
+    params = value.get("params") if value else None
+    return params.get("tag") if params else None
+
+
+def _first_call_id(value: Optional[str]) -> Optional[str]:
+    # Repeated Call-ID headers are joined with commas, which Call-IDs can't contain
+    if not value:
+        return None
+
+    return value.split(",", 1)[0].strip()
+
+
+def add_header_from_str(headers: Dict[str, Any], name: str, data: str):
+    """ Parses a header value and adds it to the given headers
+    """
+    if name in MULTI_INSTANCE_HEADER_NAMES:
+        add_multi_header_from_str(headers, name, data)
+    elif name in ("to", "from", "refer-to"):
+        val, _ = parse_aor(data)
+        headers[name] = val
+    elif name == "cseq":
+        headers["cseq"] = parse_cseq(data)
+    elif name in ("content-length", "max-forwards"):
+        headers[name] = int(data)
+    elif name == "authentication-info":
+        # Directly parse auth header, without scheme
+        val, _ = parse_auth_header(data)
+        headers[name] = val
+    else:
+        # Generic header parsing (just key -> value)
+        if name in headers:  # Header existed, append
+            headers[name] += "," + data
+        else:
+            headers[name] = data
+
+
+class LazyHeaders(dict):
+    """ Headers dictionary of a message parsed from the wire. It keeps the raw value of
+        every header, only parsing it the first time it's read (caching the result), and
+        the original header lines so unmodified headers can be serialized verbatim.
+
+        Parse errors of a header are raised when the header is first read.
+
+        A header counts as modified once it's assigned or deleted, or once a mutable value
+        (list, typed value) of it is handed out, as the caller may change it in place
+        (values shared by the parse cache are copied then). Use peek() to read a header
+        without that.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._raw: Dict[str, List[Any]] = {}
+        self._lines: Dict[str, List[Any]] = {}
+
+    def add_raw(self, name: str, data: Any, line: Any = None):
+        """ Records the raw value of a header (and its whole line) without parsing it """
+        raw = self._raw.get(name)
+        if raw is not None:
+            raw.append(data)
+            if name in self._lines:
+                self._lines[name].append(line)
+        elif dict.__contains__(self, name):
+            # Already parsed, so there's nothing to defer
+            add_header_from_str(self, name, self._decode(data))
+        else:
+            self._raw[name] = [data]
+            if line is not None:
+                self._lines[name] = [line]
+            dict.__setitem__(self, name, _UNPARSED)
+
+    def is_parsed(self, name: str) -> bool:
+        return dict.__contains__(self, name) and name not in self._raw
+
+    def resolve_all(self):
+        """ Parses every header that hasn't been parsed yet """
+        for name in list(self._raw):
+            self._resolve(name)
+
+    def raw_lines(self, name: str) -> Optional[str]:
+        """ The original text of the header lines (CRLF terminated), or None if the
+            header didn't come from the wire or may have been modified
+        """
+        lines = self._lines.get(name)
+        if lines is None:
+            return None
+
+        return "".join(self._decode(line) + "\r\n" for line in lines)
+
+    def peek(self, name: str, default: Any = None):
+        """ Reads a header without counting it as modified. The value must not be changed
+        """
+        value = dict.get(self, name, default)
+        if value is _UNPARSED:
+            value = self._resolve(name)
+
+        return value
+
+    def _decode(self, data: Any) -> str:
+        return data
+
+    def _resolve(self, name: str):
+        parsed: Dict[str, Any] = {}
+        for data in self._raw[name]:
+            add_header_from_str(parsed, name, self._decode(data))
+
+        del self._raw[name]
+        dict.__setitem__(self, name, parsed[name])
+        return parsed[name]
+
+    def _peek_all(self) -> Dict[str, Any]:
+        return {name: self.peek(name) for name in self}
+
+    def __getitem__(self, name: str):
+        value = dict.__getitem__(self, name)
+        if value is _UNPARSED:
+            value = self._resolve(name)
+
+        if not isinstance(value, (str, int)):
+            self._lines.pop(name, None)
+            # Values shared by the parse cache are copied before the caller can change them
+            mutable = thaw(value)
+            if mutable is not value:
+                dict.__setitem__(self, name, mutable)
+                value = mutable
+
+        return value
+
+    def __setitem__(self, name: str, value: Any):
+        self._raw.pop(name, None)
+        self._lines.pop(name, None)
+        dict.__setitem__(self, name, value)
+
+    def __delitem__(self, name: str):
+        self._raw.pop(name, None)
+        self._lines.pop(name, None)
+        dict.__delitem__(self, name)
+
+    def __iter__(self):
+        # Overriding this makes dict(headers)/{**headers} go through __getitem__
+        return dict.__iter__(self)
+
+    def __eq__(self, other):
+        return self._peek_all() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(self._peek_all())
+
+    def __reduce__(self):
+        return (dict, (self._peek_all(),))
+
+    def get(self, name: str, default: Any = None):
+        if dict.__contains__(self, name):
+            return self[name]
+
+        return default
+
+    def items(self):
+        return [(name, self[name]) for name in self]
+
+    def values(self):
+        return [self[name] for name in self]
+
+    def pop(self, name: str, *default):
+        if not dict.__contains__(self, name):
+            return dict.pop(self, name, *default)
+
+        value = self.peek(name)
+        del self[name]
+        return value
+
+    def popitem(self):
+        name = next(reversed(self.keys()))
+        return name, self.pop(name)
+
+    def setdefault(self, name: str, default: Any = None):
+        if dict.__contains__(self, name):
+            return self[name]
+
+        self[name] = default
+        return default
+
+    def update(self, *args, **kwargs):
+        for name, value in dict(*args, **kwargs).items():
+            self[name] = value
+
+    def clear(self):
+        self._raw.clear()
+        self._lines.clear()
+        dict.clear(self)
+
+    def copy(self) -> Dict[str, Any]:
+        """ Returns a plain dict with every header parsed """
+        return {name: self[name] for name in self}
+
+
+class BufferHeaders(LazyHeaders):
+    """ Lazy headers whose raw values and lines are (start, end) offsets into the buffer
+        the message was parsed from. They're only decoded when read.
+    """
+
+    def __init__(self, buffer: memoryview):
+        super().__init__()
+        self._buffer = buffer
+
+    def _decode(self, data: Tuple[int, int]) -> str:
+        return str(self._buffer[data[0] : data[1]], "utf-8")
+
 
 class SipMessage:
     TYPE_REQUEST = 0
@@ -49,11 +322,109 @@ class SipMessage:
         self.reason: Optional[str]  # Response
         self.method: Optional[str]  # Request
         self.uri: Optional[str]  # Request
-        self.content: str
+        self._content: Optional[str] = None
+        self._body: Optional[memoryview] = None
+        self._transaction_key: Optional[Tuple] = None  # (top Via, CSeq, key)
+        self._dialog_key: Optional[Tuple] = None  # (Call-ID, From, To, key)
 
         # other headers
         self.headers: Dict[str, Any] = {}
 
+    @property
+    def content(self) -> Optional[str]:
+        """ The message body as text. Bytes that aren't UTF-8 (binary parts of parsed
+            messages) are kept as surrogates, so encoding it back gives them unchanged
+        """
+        if self._content is None and self._body is not None:
+            self._content = str(self._body, "utf-8", "surrogateescape")
+
+        return self._content
+
+    @content.setter
+    def content(self, value: str):
+        self._content = value
+        self._body = None
+
+    @property
+    def body(self) -> Union[memoryview, bytes]:
+        """ The message body as bytes, never decoded. For messages parsed with from_bytes
+            this is a zero-copy view into the original buffer
+        """
+        if self._body is not None:
+            return self._body
+
+        return (self._content or "").encode("utf-8", "surrogateescape")
+
+    def peek_header(self, name: str, default: Any = None):
+        """ Reads a header without counting it as modified (see LazyHeaders.peek).
+            The value must not be changed
+        """
+        headers = self.headers
+        if isinstance(headers, LazyHeaders):
+            return headers.peek(name, default)
+
+        return headers.get(name, default)
+
+    @property
+    def transaction_key(self) -> Optional[TransactionKey]:
+        """ Hashable key matching the message to its transaction (RFC 3261 17.1.3/17.2.3),
+            ACKs matching their INVITE. None without Via or CSeq.
+
+            With a RFC 3261 branch it's (branch, sent-by, method) of the top Via. Older
+            branches fall back to the RFC 2543 identification: Request-URI, From tag,
+            Call-ID, CSeq number, method and the top Via
+
+            It's computed once, and again only if the top Via or the CSeq is replaced
+        """
+        vias = self.peek_header("via")
+        cseq = self.peek_header("cseq")
+        if not vias or not cseq:
+            return None
+
+        via = vias[0]
+        cached = self._transaction_key
+        if cached is not None and cached[0] is via and cached[1] is cseq:
+            return cached[2]
+
+        method = cseq["method"]
+        if method == "ACK":
+            method = "INVITE"
+
+        sent_by = (via["host"].lower(), str(via["port"] or ""))
+        branch = via["params"].get("branch") if via["params"] else None
+        if branch and branch.startswith(MAGIC_COOKIE):
+            key: TransactionKey = (branch, sent_by, method)
+        else:
+            uri = self.uri if self.type == self.TYPE_REQUEST else None
+            call_id = _first_call_id(self.peek_header("call-id"))
+            from_tag = _tag(self.peek_header("from"))
+            key = (uri, from_tag, call_id, cseq["seq"], method, sent_by, branch)
+
+        self._transaction_key = (via, cseq, key)
+        return key
+
+    @property
+    def dialog_key(self) -> Optional[DialogKey]:
+        """ Hashable (Call-ID, From tag, To tag) key of the dialog the message belongs to,
+            as seen by its sender (see DialogTable for matching either side). The To tag is
+            None outside of a dialog. None without Call-ID.
+
+            It's computed once, and again only if Call-ID, From or To are replaced
+        """
+        call_id = self.peek_header("call-id")
+        from_value = self.peek_header("from")
+        to_value = self.peek_header("to")
+        if not call_id:
+            return None
+
+        cached = self._dialog_key
+        if cached is not None and cached[0] is call_id and cached[1] is from_value and cached[2] is to_value:
+            return cached[3]
+
+        key = (_first_call_id(call_id), _tag(from_value), _tag(to_value))
+        self._dialog_key = (call_id, from_value, to_value, key)
+        return key
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]):
         """ Creates an instance of the class based off the given data """
@@ -104,12 +475,16 @@ class SipMessage:
         return message
 
     @classmethod
-    def from_string(cls, raw_message: str):
+    def from_string(cls, raw_message: str, lazy: bool = False):
         """ Parses a message contained in raw_message and produces
             a class instance with values based off of it
+
+            With lazy=True, header values are kept raw and each header is only
+            parsed when it's first read from message.headers
         """
 
         message = cls()
+        message.headers = headers = LazyHeaders()
 
         # Split header/content (header > 2 linebreaks > content)
         parts = re.match(r"^\s*([\S\s]*?)\r\n\r\n([\S\s]*)$", raw_message)
@@ -146,91 +521,155 @@ class SipMessage:
 
         # Parse the headers
         for line in lines[1:]:
-            header_match = re.match(r"^([\S]*?)\s*:\s*([\s\S]*)$", line)
+            header_match = HEADER_LINE_RE.match(line)
             if not header_match:
                 raise SipParserError("Invalid SIP header detected. Parsing line: %s" % line)
 
-            name = urllib.parse.unquote(header_match.group(1)).lower()
-            if name in COMPACT_HEADERS:
-                name = COMPACT_HEADERS[name]  # Uncompress shorteners
+            name = normalize_header_name(header_match.group(1))
+            headers.add_raw(name, header_match.group(2), line)
 
-            message.add_header_from_str(name, header_match.group(2))
+        if not lazy:
+            headers.resolve_all()
 
         return message
 
-    def add_multi_header_from_str(self, name: str, raw_val: str):
-        values: Union[str, List]
-        if name == "contact":
-            if raw_val == "*":
-                values = "*"
-            else:
-                values, data = parse_multi_header(parse_aor, raw_val)
-        elif name in ("route", "record-route", "path"):
-            values, data = parse_multi_header(parse_aor_with_uri, raw_val)
-        elif name == "via":
-            values, data = parse_multi_header(parse_via, raw_val)
-        elif name in (
-            "www-authenticate",
-            "proxy-authenticate",
-            "authorization",
-            "proxy-authorization",
-        ):
-            values, data = parse_multi_header(parse_auth_header_with_scheme, raw_val)
+    @classmethod
+    def from_bytes(cls, raw_message: Union[bytes, bytearray, memoryview]):
+        """ Parses a message straight from a bytes-like buffer without decoding it
+            as a whole. Header values and the body are kept as offsets into the
+            buffer and only decoded when read, so the buffer must not be modified
+            while the message is in use. Compressed messages (sip_compression) are
+            inflated first
+        """
+
+        if is_compressed(raw_message):
+            raw_message = decompress(raw_message)
+
+        buf = memoryview(raw_message)
+        if buf.format != "B" or buf.ndim != 1:
+            buf = buf.cast("B")
+
+        message = cls()
+        message.headers = headers = BufferHeaders(buf)
+
+        # Split header/content (header > 2 linebreaks > content)
+        start = LEADING_WS_RE.match(buf).end()
+        head_end = HEAD_END_RE.search(buf, start)
+        if not head_end:
+            raise SipParserError(
+                "Invalid SIP message format, couldn't find header/body division as header must be followed by 2 linebreaks"
+            )
+
+        message._body = buf[head_end.end() :]
+
+        # Header lines are split on linebreaks that aren't followed by a folded line
+        end = head_end.start()
+        line_starts = [start]
+        line_ends = []
+        for m in LINE_END_RE.finditer(buf, start, end):
+            line_ends.append(m.start())
+            line_starts.append(m.end())
+        line_ends.append(end)
+
+        # Is it a response?
+        first_line = [str(buf[start : line_ends[0]], "utf-8")]
+        response_parsed = parse_response(first_line)
+        if response_parsed:
+            message.type = message.TYPE_RESPONSE
+            message.version = response_parsed["version"]
+            message.status = response_parsed["status"]
+            message.reason = response_parsed["reason"]
         else:
-            raise SipParserError(f"Don't know how to process header {name} as a multi-header")
+            request_parsed = parse_request(first_line)
+            if not request_parsed:
+                raise SipParserError(
+                    "Invalid SIP message to parse, neither a response nor a request!"
+                )
+
+            message.type = message.TYPE_REQUEST
+            message.version = request_parsed["version"]
+            message.method = request_parsed["method"]
+            message.uri = request_parsed["uri"]
+
+        # Index the headers, leaving their values undecoded
+        for line_start, line_end in zip(line_starts[1:], line_ends[1:]):
+            header_match = HEADER_NAME_RE.match(buf, line_start, line_end)
+            if not header_match:
+                line = str(buf[line_start:line_end], "utf-8", "replace")
+                raise SipParserError("Invalid SIP header detected. Parsing line: %s" % line)
 
-        # Make sure there's no leftover data after parsing (either we parsed wrong or the header is invalid, either way - bad)
-        if data:
-            raise SipParserError(f"Leftover data found after processing {name} header")
+            name = normalize_header_name(str(header_match.group(1), "utf-8"))
+            headers.add_raw(name, (header_match.end(), line_end), (line_start, line_end))
 
-        # If we hadn't found this header before, create it. Otherwise, append to it
-        if name not in self.headers:
-            self.headers[name] = []
+        return message
 
-        self.headers[name].extend(values)
+    def add_multi_header_from_str(self, name: str, raw_val: str):
+        add_multi_header_from_str(self.headers, name, raw_val)
+        self._thaw_header(name)
 
     def add_header_from_str(self, name: str, data: str):
-        if name in MULTI_INSTANCE_HEADER_NAMES:
-            self.add_multi_header_from_str(name, data)
-        elif name in ("to", "from", "refer-to"):
-            val, _ = parse_aor(data)
-            self.headers[name] = val
-        elif name == "cseq":
-            self.headers["cseq"] = parse_cseq(data)
-        elif name in ("content-length", "max-forwards"):
-            self.headers[name] = int(data)
-        elif name == "authentication-info":
-            # Directly parse auth header, without scheme
-            val, _ = parse_auth_header(data)
-            self.headers[name] = val
-        else:
-            # Generic header parsing (just key -> value)
-            if name in self.headers:  # Header existed, append
-                self.headers[name] += "," + data
-            else:
-                self.headers[name] = data
+        add_header_from_str(self.headers, name, data)
+        self._thaw_header(name)
+
+    def _thaw_header(self, name: str):
+        # Plain header dicts hand out their values as is, they can't keep shared ones
+        headers = self.headers
+        if not isinstance(headers, LazyHeaders) and name in headers:
+            headers[name] = thaw(headers[name])
+
+    def stringify(self, compact: bool = False):
+        """ Serializes the message. Headers parsed from the wire that haven't been
+            modified are copied verbatim from their original lines. With compact, headers
+            that have a compact form (Via, Call-ID, From, ...) are written with it
+        """
+        return self._stringify_head(compact, len(self.body)) + (self.content or "")
+
+    def to_bytes(self, compact: bool = False, compressed: bool = False) -> bytes:
+        """ Serializes the message for the wire, optionally with compact header names
+            and/or compressed (see sip_compression). The body of a message parsed with
+            from_bytes is copied as is, without decoding it
+        """
+        body = self.body
+        data = self._stringify_head(compact, len(body)).encode("utf-8") + body
+        return compress(data) if compressed else data
 
-    def stringify(self):
+    def _stringify_head(self, compact: bool, content_length: int) -> str:
+        """ The start line and headers, followed by the empty line. content_length is
+            the body size in bytes
+        """
         ver = self.version if self.version else "2.0"
         if self.type == self.TYPE_RESPONSE:
-            msg_str = f"SIP/{ver} {self.status} {self.reason}\r\n"
+            parts = [f"SIP/{ver} {self.status} {self.reason}\r\n"]
         else:
             uri = stringify_uri(self.uri)
-            msg_str = f"{self.method} {uri} SIP/{ver}\r\n"
+            parts = [f"{self.method} {uri} SIP/{ver}\r\n"]
 
-        self.headers["content-length"] = len(self.content) or 0
-        for header_name, header_data in self.headers.items():
-            if header_data is None:
-                continue
+        headers = self.headers
+        if headers.get("content-length") != content_length:
+            headers["content-length"] = content_length
 
-            msg_str += stringify_header(header_name, header_data) + "\r\n"
+        from_wire = isinstance(headers, LazyHeaders)
+        for header_name in headers:
+            if from_wire:
+                raw_lines = headers.raw_lines(header_name)
+                if raw_lines is not None:
+                    parts.append(compact_header_lines(header_name, raw_lines) if compact else raw_lines)
+                    continue
 
-        msg_str += "\r\n"
+                header_data = headers.peek(header_name)
+            else:
+                header_data = headers[header_name]
+
+            if header_data is None:
+                continue
 
-        if self.content:
-            msg_str += self.content
+            lines = stringify_header(header_name, header_data)
+            if compact:
+                lines = compact_header_lines(header_name, lines)
+            parts.append(lines + "\r\n")
 
-        return msg_str
+        parts.append("\r\n")
+        return "".join(parts)
 
     def debug_print(self):
         import pprint
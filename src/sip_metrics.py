@@ -0,0 +1,347 @@
+"""
+Opt-in instrumentation of parsing and serialization.
+
+enable() wraps the parse/serialize entry points (SipMessage.from_string/from_bytes/
+stringify, header parsing and SdpMessage.from_string) with timing and counting code
+and disable() puts the originals back, so there's no overhead at all while disabled.
+
+Collected metrics are available with snapshot() or in the Prometheus text format with
+prometheus_text(), which serve_prometheus() exposes over HTTP for scraping.
+"""
+import bisect
+import functools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import sip_message
+from sip_message import SipMessage
+from sdp_message import SdpMessage
+
+# Upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+)
+
+MAX_CAUSE_LENGTH = 80
+
+# Label values are limited to these (anything else counts as OTHER), so peers can't grow
+# the metrics and the number of Prometheus series with made up methods or headers
+OTHER = "other"
+KNOWN_METHODS = frozenset((
+    "INVITE", "ACK", "BYE", "CANCEL", "REGISTER", "OPTIONS", "PRACK", "UPDATE",
+    "INFO", "SUBSCRIBE", "NOTIFY", "REFER", "MESSAGE", "PUBLISH",
+))
+# Headers with a dedicated parser (see sip_message.add_header_from_str)
+PARSED_HEADERS = frozenset(sip_message.MULTI_INSTANCE_HEADER_NAMES) | {
+    "to", "from", "refer-to", "cseq", "content-length", "max-forwards", "authentication-info",
+}
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative, total = {}, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            cumulative[bound] = total
+
+        return {"count": self.count, "sum": self.sum, "buckets": cumulative}
+
+
+class Metrics:
+    """ The collected metrics. Updates happen under a lock, so it can be shared by threads
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.parse_seconds = Histogram()
+        self.serialize_seconds = Histogram()
+        self.sdp_parse_seconds = Histogram()
+        self.header_parse: Dict[str, List] = {}  # name -> [count, seconds]
+        self.requests: Dict[str, int] = {}  # method -> count
+        self.responses: Dict[Any, int] = {}  # status -> count
+        self.errors: Dict[Tuple[str, str], int] = {}  # (error type, cause) -> count
+
+    def count_message(self, message: SipMessage):
+        with self.lock:
+            if message.type == SipMessage.TYPE_RESPONSE:
+                status = message.status if 100 <= message.status <= 699 else OTHER
+                self.responses[status] = self.responses.get(status, 0) + 1
+            else:
+                method = message.method if message.method in KNOWN_METHODS else OTHER
+                self.requests[method] = self.requests.get(method, 0) + 1
+
+    def count_error(self, error: Exception, cause: Optional[str] = None):
+        # Header errors propagate through the message parse, count them once
+        if getattr(error, "_metrics_counted", False):
+            return
+
+        error._metrics_counted = True  # type: ignore[attr-defined]
+        key = (type(error).__name__, cause or _cause(error))
+        with self.lock:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def observe(self, histogram: Histogram, seconds: float):
+        with self.lock:
+            histogram.observe(seconds)
+
+    def observe_header(self, name: str, seconds: float):
+        name = _header_label(name)
+        with self.lock:
+            stats = self.header_parse.get(name)
+            if stats is None:
+                stats = self.header_parse[name] = [0, 0.0]
+
+            stats[0] += 1
+            stats[1] += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "parse_seconds": self.parse_seconds.snapshot(),
+                "serialize_seconds": self.serialize_seconds.snapshot(),
+                "sdp_parse_seconds": self.sdp_parse_seconds.snapshot(),
+                "header_parse": {
+                    name: {"count": count, "seconds": seconds}
+                    for name, (count, seconds) in self.header_parse.items()
+                },
+                "requests": dict(self.requests),
+                "responses": dict(self.responses),
+                "errors": [
+                    {"type": error_type, "cause": cause, "count": count}
+                    for (error_type, cause), count in self.errors.items()
+                ],
+            }
+
+
+_metrics: Optional[Metrics] = None
+_originals: Dict[str, Any] = {}
+
+
+def _cause(error: Exception) -> str:
+    """ Groups errors by the fixed part of their message, before the specific details
+    """
+    text = str(error)
+    for sep in (":", '"', "."):
+        text = text.split(sep, 1)[0]
+
+    return text.strip()[:MAX_CAUSE_LENGTH]
+
+
+def _header_label(name: str) -> str:
+    return name if name in PARSED_HEADERS else OTHER
+
+
+def _timed_parse(fn: Callable, metrics: Metrics) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(cls, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            message = fn(cls, *args, **kwargs)
+        except Exception as e:
+            metrics.count_error(e)
+            raise
+
+        metrics.observe(metrics.parse_seconds, time.perf_counter() - start)
+        if message is not None:
+            metrics.count_message(message)
+
+        return message
+
+    return wrapper
+
+
+def _timed_stringify(fn: Callable, metrics: Metrics) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(self, *args, **kwargs)
+        metrics.observe(metrics.serialize_seconds, time.perf_counter() - start)
+        return result
+
+    return wrapper
+
+
+def _timed_header(fn: Callable, metrics: Metrics) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(headers, name, data):
+        start = time.perf_counter()
+        try:
+            fn(headers, name, data)
+        except Exception as e:
+            metrics.count_error(e, f"{_header_label(name)} header")
+            raise
+
+        metrics.observe_header(name, time.perf_counter() - start)
+
+    return wrapper
+
+
+def _timed_sdp_parse(fn: Callable, metrics: Metrics) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            message = fn(*args, **kwargs)
+        except Exception as e:
+            metrics.count_error(e)
+            raise
+
+        metrics.observe(metrics.sdp_parse_seconds, time.perf_counter() - start)
+        return message
+
+    return wrapper
+
+
+def enable() -> Metrics:
+    """ Starts collecting metrics (with fresh counters). Returns the collector """
+    global _metrics
+    if _metrics is not None:
+        disable()
+
+    metrics = _metrics = Metrics()
+    _originals.update(
+        from_string=SipMessage.__dict__["from_string"],
+        from_bytes=SipMessage.__dict__["from_bytes"],
+        stringify=SipMessage.__dict__["stringify"],
+        add_header_from_str=sip_message.add_header_from_str,
+        sdp_from_string=SdpMessage.__dict__["from_string"],
+    )
+
+    SipMessage.from_string = classmethod(_timed_parse(_originals["from_string"].__func__, metrics))
+    SipMessage.from_bytes = classmethod(_timed_parse(_originals["from_bytes"].__func__, metrics))
+    SipMessage.stringify = _timed_stringify(_originals["stringify"], metrics)
+    sip_message.add_header_from_str = _timed_header(_originals["add_header_from_str"], metrics)
+    SdpMessage.from_string = staticmethod(
+        _timed_sdp_parse(_originals["sdp_from_string"].__func__, metrics)
+    )
+    return metrics
+
+
+def disable():
+    """ Stops collecting metrics, removing all the instrumentation """
+    global _metrics
+    if _metrics is None:
+        return
+
+    SipMessage.from_string = _originals["from_string"]
+    SipMessage.from_bytes = _originals["from_bytes"]
+    SipMessage.stringify = _originals["stringify"]
+    sip_message.add_header_from_str = _originals["add_header_from_str"]
+    SdpMessage.from_string = _originals["sdp_from_string"]
+    _originals.clear()
+    _metrics = None
+
+
+def is_enabled() -> bool:
+    return _metrics is not None
+
+
+def snapshot() -> Dict[str, Any]:
+    """ Current values of the metrics (empty if disabled) """
+    return _metrics.snapshot() if _metrics is not None else {}
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, help_text: str, data: Dict[str, Any]) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for bound, count in data["buckets"].items():
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        lines.append(f'{name}_bucket{{le="{le}"}} {count}')
+
+    lines += [f"{name}_sum {data['sum']!r}", f"{name}_count {data['count']}"]
+    return lines
+
+
+def prometheus_text() -> str:
+    """ The metrics in the Prometheus text exposition format """
+    data = snapshot()
+    if not data:
+        return ""
+
+    lines = _histogram_lines("sip_parse_seconds", "SIP message parse latency", data["parse_seconds"])
+    lines += _histogram_lines(
+        "sip_serialize_seconds", "SIP message serialization latency", data["serialize_seconds"]
+    )
+    lines += _histogram_lines(
+        "sdp_parse_seconds", "SDP message parse latency", data["sdp_parse_seconds"]
+    )
+
+    lines += [
+        "# HELP sip_header_parse_seconds Time spent parsing each header type",
+        "# TYPE sip_header_parse_seconds summary",
+    ]
+    for name, stats in data["header_parse"].items():
+        labels = _format_labels({"header": name})
+        lines.append(f"sip_header_parse_seconds_sum{labels} {stats['seconds']!r}")
+        lines.append(f"sip_header_parse_seconds_count{labels} {stats['count']}")
+
+    lines += [
+        "# HELP sip_messages_parsed_total Parsed SIP messages by method or status",
+        "# TYPE sip_messages_parsed_total counter",
+    ]
+    for method, count in data["requests"].items():
+        labels = _format_labels({"type": "request", "method": method})
+        lines.append(f"sip_messages_parsed_total{labels} {count}")
+    for status, count in data["responses"].items():
+        labels = _format_labels({"type": "response", "status": status})
+        lines.append(f"sip_messages_parsed_total{labels} {count}")
+
+    lines += [
+        "# HELP sip_parse_errors_total Parse errors by error type and cause",
+        "# TYPE sip_parse_errors_total counter",
+    ]
+    for error in data["errors"]:
+        labels = _format_labels({"error": error["type"], "cause": error["cause"]})
+        lines.append(f"sip_parse_errors_total{labels} {error['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_prometheus(port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """ Serves the metrics at http://host:port/metrics from a background thread.
+        Call shutdown() on the returned server to stop it
+    """
+    server = ThreadingHTTPServer((host, port), _PrometheusHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,161 @@
+"""
+Lazy parsing of multipart message bodies (RFC 2046), e.g. SDP plus ISUP (SIP-I) or 3GPP XML.
+
+The part boundaries are indexed in a single pass over the body; each part's headers are
+only parsed when read and its body is a zero-copy view into the message buffer (for
+messages parsed with SipMessage.from_bytes), so a binary ISUP part is never copied unless
+it's used. The SDP part is only parsed on request.
+"""
+import re
+from typing import Dict, List, Optional, Union
+
+from sip_message import SipMessage, HEAD_END_RE, LINE_END_RE
+from sdp_message import SdpMessage
+from exceptions import SipParserError
+
+BOUNDARY_PARAM_RE = re.compile(r';\s*boundary\s*=\s*(?:"([^"]+)"|([^;\s]+))', re.IGNORECASE)
+PART_HEADER_RE = re.compile(r"([^:\s]+)\s*:\s*(.*)", re.DOTALL)
+FOLDING_RE = re.compile(r"\r\n[ \t]+")
+
+DEFAULT_CONTENT_TYPE = "text/plain"
+
+
+def _media_type(content_type: str) -> str:
+    return content_type.split(";", 1)[0].strip().lower()
+
+
+def _boundary(content_type: Optional[str]) -> Optional[str]:
+    if not content_type or not _media_type(content_type).startswith("multipart/"):
+        return None
+
+    m = BOUNDARY_PARAM_RE.search(content_type)
+    if not m:
+        raise SipParserError(f"Multipart body without boundary: {content_type}")
+
+    return m.group(1) or m.group(2)
+
+
+class BodyPart:
+    """ A part of a multipart body: its headers (parsed when first read) and its body as a
+        view into the message buffer
+    """
+
+    __slots__ = ("_buffer", "_start", "_body_start", "_end", "_headers")
+
+    def __init__(self, buffer: memoryview, start: int, end: int):
+        self._buffer = buffer
+        self._start = start
+        self._end = end
+        self._headers: Optional[Dict[str, str]] = None
+
+        # A part may have no headers at all, then it starts with the blank line
+        if buffer[start:start + 2] == b"\r\n":
+            self._body_start = start + 2
+        else:
+            head_end = HEAD_END_RE.search(buffer, start, end)
+            self._body_start = head_end.end() if head_end else end
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """ The part's headers, by lowercase name """
+        if self._headers is None:
+            self._headers = {}
+            head_end = max(self._start, self._body_start - 4)
+            for line in LINE_END_RE.split(self._buffer[self._start:head_end].tobytes()):
+                m = PART_HEADER_RE.match(str(line, "utf-8", "replace"))
+                if m:
+                    self._headers[m.group(1).lower()] = FOLDING_RE.sub(" ", m.group(2).strip())
+
+        return self._headers
+
+    @property
+    def content_type(self) -> str:
+        """ Media type of the part, without parameters ("application/sdp") """
+        return _media_type(self.headers.get("content-type", DEFAULT_CONTENT_TYPE))
+
+    @property
+    def body(self) -> memoryview:
+        return self._buffer[self._body_start:self._end]
+
+    def text(self, encoding: str = "utf-8") -> str:
+        return str(self.body, encoding)
+
+    def sdp(self, lazy: bool = False) -> SdpMessage:
+        """ Parses the part as SDP """
+        return SdpMessage.from_string(self.text(), lazy=lazy)
+
+    def multipart(self) -> Optional["MultipartBody"]:
+        """ The nested parts, if this part is itself multipart """
+        boundary = _boundary(self.headers.get("content-type"))
+        if boundary is None:
+            return None
+
+        return MultipartBody(self.body, boundary)
+
+    def __repr__(self):
+        return f"<BodyPart {self.content_type} {self._end - self._body_start} bytes>"
+
+
+class MultipartBody:
+    """ The parts of a multipart body, a sequence of BodyPart built when accessed """
+
+    def __init__(self, body: Union[bytes, bytearray, memoryview], boundary: str):
+        buffer = memoryview(body)
+        if buffer.format != "B" or buffer.ndim != 1:
+            buffer = buffer.cast("B")
+
+        self.boundary = boundary
+        self._buffer = buffer
+        self._spans: List[tuple] = []
+
+        # Delimiters start a line: "--boundary", the last one being "--boundary--"
+        delimiter = re.compile(
+            rb"(?:\A|\r\n)--" + re.escape(boundary.encode("utf-8")) + rb"(--)?[ \t]*(?:\r\n|\Z)"
+        )
+        start = None
+        for m in delimiter.finditer(buffer):
+            if start is not None:
+                self._spans.append((start, m.start()))
+            if m.group(1):
+                break
+
+            start = m.end()
+
+        self._parts: List[Optional[BodyPart]] = [None] * len(self._spans)
+
+    @classmethod
+    def from_message(cls, message: SipMessage) -> Optional["MultipartBody"]:
+        """ The parts of a message's body, None if its Content-Type isn't multipart """
+        boundary = _boundary(message.peek_header("content-type"))
+        if boundary is None:
+            return None
+
+        return cls(message.body, boundary)
+
+    def __len__(self):
+        return len(self._spans)
+
+    def __getitem__(self, index: int) -> BodyPart:
+        part = self._parts[index]
+        if part is None:
+            part = self._parts[index] = BodyPart(self._buffer, *self._spans[index])
+
+        return part
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def find(self, content_type: str) -> Optional[BodyPart]:
+        """ The first part with the given media type """
+        content_type = content_type.lower()
+        for part in self:
+            if part.content_type == content_type:
+                return part
+
+        return None
+
+    def sdp(self, lazy: bool = False) -> Optional[SdpMessage]:
+        """ The parsed SDP part, None if there isn't one """
+        part = self.find("application/sdp")
+        return part.sdp(lazy=lazy) if part is not None else None
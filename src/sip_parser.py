@@ -5,6 +5,9 @@ import urllib.parse
 import re
 from typing import List, Dict, Any, Callable, Tuple, Union, Optional
 
+from lru_cache import LruCache, CacheInfo
+from sip_fields import SipUri, NameAddr, Via, CSeq, AuthCredentials, freeze
+
 
 # Headers that can be shortened to a single letter
 COMPACT_HEADERS = {
@@ -21,125 +24,249 @@ COMPACT_HEADERS = {
 }
 
 
-def parse_multi_header(parse_fn: Callable, data: str) -> Tuple[List, str]:
-    """ Parse a header that can have multiple values in comma-separated times within the same header line.
+# Precompiled patterns. Header values are scanned by position (pos) instead of
+# re-slicing the remaining data after every token
+MULTI_HEADER_SEP_RE = re.compile(r"\s*,\s*")
+WHITESPACE_RE = re.compile(r"\s*")
+PARAM_RE = re.compile(
+    r'\s*;\s*([\w\-.!%*_+`\'~]+)(?:\s*=\s*([\w\-.!%*_+`\'~]+|"[^"\\]*(\\.[^"\\]*)*"))?'
+)
+VIA_RE = re.compile(r"SIP\s*\/\s*(\d+\.\d+)\s*\/\s*([\S]+)\s*([^\s;]+)(?:\s*:\s*(\d+))?")
+VIA_HOST_PORT_RE = re.compile(r"\[([^\s\]]+)\][:]?(\d{1,5})?|([^\s:\[\]]+)[:]?(\d{1,5})?")
+CSEQ_RE = re.compile(r"(\d+)\s*([\S]+)")
+AUTH_SCHEME_RE = re.compile(r"([^\s]*)\s+")
+AUTH_PARAM_RE = re.compile(r'([^\s,"=]*)\s*=\s*([^\s,"]+|"[^"\\]*(?:\\.[^"\\]*)*")\s*')
+AOR_RE = re.compile(
+    r'((?:[\w\-.!%*_+`\'~]+)(?:\s+[\w\-.!%*_+`\'~]+)*|"[^"\\]*(?:\\.[^"\\]*)*")?\s*\<\s*([^>]*)\s*\>|((?:[^\s@"<]@)?[^\s;]+)'
+)
+URI_RE = re.compile(
+    r"^(sips?):(?:([^\s>:@]+)(?::([^\s@>]+))?@)?(([\w\-\.]+)|\[([\w\:]+)\])(?::(\d+))?((?:;[^\s=\?>;]+(?:=[^\s?\;]+)?)*)(?:\?(([^\s&=>]+=[^\s&=>]+)(&[^\s&=>]+=[^\s&=>]+)*))?$"
+)
+URI_PARAM_RE = re.compile(r"([^;=]+)(=([^;=]+))?")
+URI_HEADER_RE = re.compile(r"([^&=]+)=([^&=]+)")
+REQUEST_LINE_RE = re.compile(r"^([\w\-.!%*_+`'~]+)\s([^\s]+)\sSIP\s*\/\s*(\d+\.\d+)")
+RESPONSE_LINE_RE = re.compile(r"^SIP\/(\d+\.\d+)\s+(\d+)\s*(.*)\s*$")
+
+# Opt-in caches of parsed URIs and AORs keyed on the raw value, see enable_parse_cache()
+DEFAULT_PARSE_CACHE_SIZE = 4096
+MAX_CACHED_VALUE_LENGTH = 512
+_uri_cache: Optional[LruCache] = None
+_aor_cache: Optional[LruCache] = None
+
+
+def enable_parse_cache(maxsize: int = DEFAULT_PARSE_CACHE_SIZE):
+    """ Caches the results of parse_uri, parse_aor and parse_aor_with_uri (also when
+        parsing Contact/Route/Record-Route/Path values), keeping up to maxsize entries each.
+
+        Cached values are shared between callers, so they're frozen (sip_fields.freeze):
+        changing one raises TypeError, copy() it first. SipMessage headers are only
+        copied when handed out by msg.headers[name], peek_header() returns them shared
+    """
+    global _uri_cache, _aor_cache
+    _uri_cache = LruCache(maxsize)
+    _aor_cache = LruCache(maxsize)
+
+
+def disable_parse_cache():
+    global _uri_cache, _aor_cache
+    _uri_cache = _aor_cache = None
+
+
+def parse_cache_info() -> Dict[str, CacheInfo]:
+    """ Hit/miss counters and sizes of the parse caches (empty if they're disabled)
+    """
+    caches = {"uri": _uri_cache, "aor": _aor_cache}
+    return {name: cache.info() for name, cache in caches.items() if cache is not None}
+
+
+def _cached(cache: LruCache, key: Any, raw: str, parse_fn: Callable):
+    if len(raw) > MAX_CACHED_VALUE_LENGTH:
+        return parse_fn()
+
+    value = cache.get(key)
+    if value is None:
+        value = parse_fn()
+        cache.put(key, value)
+
+    return value
+
+
+def _frozen_result(result: Tuple[Any, str]) -> Tuple[Any, str]:
+    return freeze(result[0]), result[1]
+
+
+def scan_multi_header(scan_fn: Callable, data: str, pos: int = 0) -> Tuple[List, int]:
+    """ Scan a header that can have multiple comma-separated values, starting at pos.
+        Returns the values and the position where scanning stopped
     """
     values = []
-    header, data = parse_fn(data)
+    header, pos = scan_fn(data, pos)
     values.append(header)
 
-    if data:
-        while True:
-            m = re.match(r"^\s*,\s*", data)
-            if not m:
-                break
+    while pos < len(data):
+        m = MULTI_HEADER_SEP_RE.match(data, pos)
+        if not m:
+            break
 
-            header, data = parse_fn(data[m.end() :])
-            values.append(header)
+        header, pos = scan_fn(data, m.end())
+        values.append(header)
 
-    return values, data
+    return values, pos
 
 
-def parse_params(data):
-    """ Parse the parameters of the header separated by semicolons (;) 
+def parse_multi_header(parse_fn: Callable, data: str) -> Tuple[List, str]:
+    """ Parse a header that can have multiple values in comma-separated times within the same header line.
     """
-    params = {}
-
-    while True:
-        m = re.match(
-            r'\s*;\s*([\w\-.!%*_+`\'~]+)(?:\s*=\s*([\w\-.!%*_+`\'~]+|"[^"\\]*(\\.[^"\\]*)*"))?',
+    if _aor_cache is not None and (parse_fn is parse_aor or parse_fn is parse_aor_with_uri):
+        values, data = _cached(
+            _aor_cache,
+            ("multi", parse_fn, data),
             data,
+            lambda: _parse_multi_header_frozen(parse_fn, data),
         )
+        return list(values), data
+
+    return _parse_multi_header(parse_fn, data)
+
+
+def _parse_multi_header_frozen(parse_fn: Callable, data: str) -> Tuple[Tuple, str]:
+    values, data = _parse_multi_header(parse_fn, data)
+    return tuple(freeze(value) for value in values), data
+
+
+def _parse_multi_header(parse_fn: Callable, data: str) -> Tuple[List, str]:
+    scan_fn = SCANNERS.get(parse_fn)
+    if scan_fn is None:
+        # Not one of ours: adapt it by slicing, using the leftover data to find the position
+        scan_fn = lambda data, pos: _scan_with_parser(parse_fn, data, pos)
+
+    values, pos = scan_multi_header(scan_fn, data)
+    return values, data[pos:]
+
+
+def _scan_with_parser(parse_fn: Callable, data: str, pos: int) -> Tuple[Any, int]:
+    value, leftover = parse_fn(data[pos:])
+    return value, len(data) - len(leftover)
+
+
+def scan_params(data: str, pos: int = 0) -> Tuple[Dict[str, Optional[str]], int]:
+    """ Scan the parameters of the header separated by semicolons (;), starting at pos
+    """
+    params = {}
 
+    while True:
+        m = PARAM_RE.match(data, pos)
         if not m:
             break
 
-        params[m.group(1).lower()] = m.group(2).replace('"','') if m.group(2) else None
-        data = data[m.end() :]
+        params[m.group(1).lower()] = m.group(2).replace('"', "") if m.group(2) else None
+        pos = m.end()
 
-    return params, data
+    return params, pos
 
 
-def parse_via(data: str):
-    """ Parse VIA header includes IPv6 and IPv4
+def parse_params(data):
+    """ Parse the parameters of the header separated by semicolons (;) 
     """
-    m = re.match(r"SIP\s*\/\s*(\d+\.\d+)\s*\/\s*([\S]+)\s*([^\s;]+)(?:\s*:\s*(\d+))?", data)
-    hp = re.match(r"\[([^\s\]]+)\][:]?(\d{1,5})?|([^\s:\[\]]+)[:]?(\d{1,5})?", m.group(3))
+    params, pos = scan_params(data)
+    return params, data[pos:]
+
+
+def scan_via(data: str, pos: int = 0):
+    """ Scan a VIA header value (IPv6 and IPv4) starting at pos
+    """
+    m = VIA_RE.match(data, pos)
+    hp = VIA_HOST_PORT_RE.match(m.group(3)) if m else None
 
     if not m or not hp:
         raise RuntimeError("Could not parse Via header!")
 
-    params, data = parse_params(data[m.end() :])
-    val = {
-        "version": m.group(1),
-        "protocol": m.group(2),
-        "host": hp.group(1) if hp.group(1) else hp.group(3),
-        "port": int(hp.group(2)) if hp.group(2) else hp.group(4),
-        "params": params,
-    }
+    params, pos = scan_params(data, m.end())
+    val = Via(
+        version=m.group(1),
+        protocol=m.group(2),
+        host=hp.group(1) if hp.group(1) else hp.group(3),
+        port=int(hp.group(2)) if hp.group(2) else hp.group(4),
+        params=params,
+    )
 
-    return val, data
+    return val, pos
 
 
-def parse_cseq(data: str) -> Dict[str, Any]:
+def parse_via(data: str):
+    """ Parse VIA header includes IPv6 and IPv4
+    """
+    val, pos = scan_via(data)
+    return val, data[pos:]
+
+
+def parse_cseq(data: str) -> CSeq:
     """ Parses a CSeq header value
     """
-    m = re.match(r"(\d+)\s*([\S]+)", data)
+    m = CSEQ_RE.match(data)
     if not m:
         raise RuntimeError("Could not parse CSeq header!")
 
-    return {"seq": int(m.group(1)), "method": urllib.parse.unquote(m.group(2))}
+    return CSeq(seq=int(m.group(1)), method=urllib.parse.unquote(m.group(2)))
 
 
-def parse_auth_header_with_scheme(data: str):
-    """ Parse an auth header that begins with a scheme 
+def scan_auth_header_with_scheme(data: str, pos: int = 0):
+    """ Scan an auth header that begins with a scheme, starting at pos
     """
-    sch_match = re.match(r"([^\s]*)\s+", data)
+    sch_match = AUTH_SCHEME_RE.match(data, pos)
 
     if not sch_match:
         raise RuntimeError("Could not extract scheme from authentication header")
 
-    val, data = parse_auth_header(data[sch_match.end() :])
-    val["scheme"] = sch_match.group(1)
+    val, pos = scan_auth_header(data, sch_match.end())
+    val.scheme = sch_match.group(1)
 
-    return val, data
+    return val, pos
 
 
-def parse_auth_header(data: str):
-    """ Parse an auth header (without a prefix scheme) 
+def parse_auth_header_with_scheme(data: str):
+    """ Parse an auth header that begins with a scheme 
+    """
+    val, pos = scan_auth_header_with_scheme(data)
+    return val, data[pos:]
+
+
+def scan_auth_header(data: str, pos: int = 0):
+    """ Scan an auth header (without a prefix scheme), starting at pos
     """
-    val = {}
+    val = AuthCredentials(scheme=None, params={})
 
     while True:
-        m = re.match(r'([^\s,"=]*)\s*=\s*([^\s,"]+|"[^"\\]*(?:\\.[^"\\]*)*")\s*', data)
+        m = AUTH_PARAM_RE.match(data, pos)
 
         if not m:
             break
 
-        val[m.group(1)] = m.group(2).replace('"', '')
-        data = data[m.end() :]
+        val.params[m.group(1)] = m.group(2).replace('"', "")
+        pos = m.end()
 
         # There must be a comma now or done
-        if not data or data[0] != ",":
+        if pos >= len(data) or data[pos] != ",":
             break
 
-        data = data[
-            1:
-        ].lstrip()
+        pos = WHITESPACE_RE.match(data, pos + 1).end()
 
-    return val, data
+    return val, pos
 
 
-def parse_aor(data: str):
-    """ Parses an Address Of Record 
+def parse_auth_header(data: str):
+    """ Parse an auth header (without a prefix scheme) 
     """
+    val, pos = scan_auth_header(data)
+    return val, data[pos:]
 
-    aor_match = re.match(
-        r'((?:[\w\-.!%*_+`\'~]+)(?:\s+[\w\-.!%*_+`\'~]+)*|"[^"\\]*(?:\\.[^"\\]*)*")?\s*\<\s*([^>]*)\s*\>|((?:[^\s@"<]@)?[^\s;]+)',
-        data,
-    )
+
+def scan_aor(data: str, pos: int = 0):
+    """ Scans an Address Of Record starting at pos
+    """
+    aor_match = AOR_RE.match(data, pos)
     if not aor_match:
-        raise RuntimeError('Invalid AOR found: "%s"' % data)
+        raise RuntimeError('Invalid AOR found: "%s"' % data[pos:])
 
     name = aor_match.group(1)
     uri = ""
@@ -148,20 +275,40 @@ def parse_aor(data: str):
     elif aor_match.group(3):
         uri = aor_match.group(3)
 
-    params, data = parse_params(data[aor_match.end() :])
-    props = {"name": name, "uri": uri, "params": params}
+    params, pos = scan_params(data, aor_match.end())
+    props = NameAddr(name=name, uri=uri, params=params)
+
+    # Return the extracted header and where it ended
+    return props, pos
+
+
+def parse_aor(data: str):
+    """ Parses an Address Of Record 
+    """
+    if _aor_cache is not None:
+        return _cached(_aor_cache, (parse_aor, data), data, lambda: _frozen_result(_parse_aor(data)))
+
+    return _parse_aor(data)
+
+
+def _parse_aor(data: str):
+    props, pos = scan_aor(data)
 
     # Return the extracted header and leftover data
-    return props, data
+    return props, data[pos:]
 
 
 def parse_uri(uri: str):
     """ Breaks down a URI into its different components 
     """
-    m = re.match(
-        r"^(sips?):(?:([^\s>:@]+)(?::([^\s@>]+))?@)?(([\w\-\.]+)|\[([\w\:]+)\])(?::(\d+))?((?:;[^\s=\?>;]+(?:=[^\s?\;]+)?)*)(?:\?(([^\s&=>]+=[^\s&=>]+)(&[^\s&=>]+=[^\s&=>]+)*))?$",
-        uri,
-    )
+    if _uri_cache is not None:
+        return _cached(_uri_cache, uri, uri, lambda: freeze(_parse_uri(uri)))
+
+    return _parse_uri(uri)
+
+
+def _parse_uri(uri: str):
+    m = URI_RE.match(uri)
     if not m:
         raise RuntimeError('Could not parse URI: "%s"' % uri)
 
@@ -174,7 +321,7 @@ def parse_uri(uri: str):
     # Extract params
     params: Dict[str, Optional[str]] = {}
     if m.group(8):
-        for param_m in re.finditer(r"([^;=]+)(=([^;=]+))?", m.group(8)):
+        for param_m in URI_PARAM_RE.finditer(m.group(8)):
             if m.group(2):
                 params[param_m.group(1)] = param_m.group(2)
             else:
@@ -184,7 +331,7 @@ def parse_uri(uri: str):
     # Extract headers
     headers: Dict[str, str] = {}
     if m.group(9):
-        for header_m in re.finditer(r"([^&=]+)=([^&=]+)", m.group(9)):
+        for header_m in URI_HEADER_RE.finditer(m.group(9)):
             headers[header_m.group(1)] = header_m.group(2)
 
     if m.group(7):
@@ -195,32 +342,48 @@ def parse_uri(uri: str):
     else:
         port = None
 
-    return {
-        "schema": m.group(1),
-        "user": m.group(2),
-        "password": m.group(3),
-        "host": host_addr,
-        "port": port,
-        "params": params,
-        "headers": headers,
-    }
+    return SipUri(
+        schema=m.group(1),
+        user=m.group(2),
+        password=m.group(3),
+        host=host_addr,
+        port=port,
+        params=params,
+        headers=headers,
+    )
 
 
-def parse_aor_with_uri(data: str) -> Tuple[Dict, str]:
-    """ Parses AOR and then parses the URI that we extracted 
+def scan_aor_with_uri(data: str, pos: int = 0) -> Tuple[NameAddr, int]:
+    """ Scans AOR starting at pos and then parses the URI that we extracted
     """
-    props, data = parse_aor(data)
-    if not props["uri"]:
+    props, pos = scan_aor(data, pos)
+    if not props.uri:
         raise RuntimeError("There's no URI to parse when trying to parse AOR with URI")
 
-    props["uri"] = parse_uri(props["uri"])
-    return props, data
+    props.uri = parse_uri(props.uri)
+    return props, pos
+
+
+def parse_aor_with_uri(data: str) -> Tuple[NameAddr, str]:
+    """ Parses AOR and then parses the URI that we extracted 
+    """
+    if _aor_cache is not None:
+        return _cached(
+            _aor_cache, (parse_aor_with_uri, data), data, lambda: _frozen_result(_parse_aor_with_uri(data))
+        )
+
+    return _parse_aor_with_uri(data)
+
+
+def _parse_aor_with_uri(data: str) -> Tuple[NameAddr, str]:
+    props, pos = scan_aor_with_uri(data)
+    return props, data[pos:]
 
 
 def parse_request(lines: List[str]) -> Optional[Dict[str, Any]]:
     """ Parse request main params
     """
-    req_match = re.match(r"^([\w\-.!%*_+`'~]+)\s([^\s]+)\sSIP\s*\/\s*(\d+\.\d+)", lines[0])
+    req_match = REQUEST_LINE_RE.match(lines[0])
 
     if not req_match:
         return None
@@ -234,7 +397,7 @@ def parse_request(lines: List[str]) -> Optional[Dict[str, Any]]:
 def parse_response(lines: List[str]) -> Optional[Dict[str, Any]]:
     """ Parse response main params
     """
-    res_match = re.match(r"^SIP\/(\d+\.\d+)\s+(\d+)\s*(.*)\s*$", lines[0])
+    res_match = RESPONSE_LINE_RE.match(lines[0])
 
     if not res_match:
         return None
@@ -244,3 +407,14 @@ def parse_response(lines: List[str]) -> Optional[Dict[str, Any]]:
         "status": int(res_match.group(2)),
         "reason": res_match.group(3),
     }
+
+
+# Position-based scanners backing each of the string parsers
+SCANNERS: Dict[Callable, Callable] = {
+    parse_params: scan_params,
+    parse_via: scan_via,
+    parse_auth_header_with_scheme: scan_auth_header_with_scheme,
+    parse_auth_header: scan_auth_header,
+    parse_aor: scan_aor,
+    parse_aor_with_uri: scan_aor_with_uri,
+}
@@ -0,0 +1,440 @@
+"""
+Reads SIP messages out of packet captures (pcap and pcapng) for offline analysis.
+
+The capture is memory-mapped and decoded packet by packet (Ethernet, Linux cooked SLL/SLL2,
+raw IP or BSD loopback; IPv4/IPv6; UDP/TCP), yielding the messages parsed with
+SipMessage.from_bytes as it goes. TCP streams are reassembled by sequence number into a
+SipStreamFramer per flow. Memory stays bounded on captures of any size: the flow table,
+out of order data per flow and message size are capped, the data buffered by all the
+flows together too (the least recently active flows are dropped beyond max_buffered), and
+only the payload of each message is copied out of the mapping.
+
+IP fragments aren't reassembled (SIP over UDP is expected to fit in a packet), they're
+counted as skipped.
+"""
+import collections
+import mmap
+import socket
+import struct
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sip_framer import SipStreamFramer, DEFAULT_MAX_MESSAGE_SIZE
+from sip_message import SipMessage
+from exceptions import SipParserError
+
+CapturedMessage = collections.namedtuple("CapturedMessage", "timestamp src dst transport message")
+
+DEFAULT_MAX_FLOWS = 65536
+DEFAULT_MAX_OUT_OF_ORDER = 256 * 1024  # Bytes held per TCP flow while waiting for a gap
+DEFAULT_MAX_BUFFERED = 64 * 1024 * 1024  # Bytes held by all the TCP flows together
+
+# The pages of the mapping already read are dropped every RELEASE_SIZE bytes, so the
+# resident memory doesn't grow with the capture size
+RELEASE_SIZE = 64 * 1024 * 1024
+
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_IDB = 1
+PCAPNG_SPB = 3
+PCAPNG_EPB = 6
+PCAPNG_OPTION_TSRESOL = 9
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+LINKTYPE_LOOP = 108
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPV6_EXTENSION_HEADERS = (0, 43, 60, 51)  # Hop-by-hop, routing, destination options, AH
+IPV6_FRAGMENT = 44
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+SEQ_MASK = 0xFFFFFFFF
+SEQ_HALF = 0x80000000
+
+# A SIP message starts with a method or "SIP/2.0", in uppercase letters
+SIP_FIRST_BYTES = frozenset(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+
+FlowKey = Tuple[bytes, int, bytes, int]
+
+
+def _ip_str(packed: bytes) -> str:
+    return socket.inet_ntop(socket.AF_INET if len(packed) == 4 else socket.AF_INET6, packed)
+
+
+class _TcpFlow:
+    __slots__ = ("next_seq", "framer", "pending", "pending_bytes", "buffered")
+
+    def __init__(self, next_seq: int, max_message_size: int):
+        self.next_seq = next_seq
+        self.framer = SipStreamFramer(max_message_size=max_message_size)
+        self.pending: Dict[int, bytes] = {}
+        self.pending_bytes = 0
+        self.buffered = 0  # Out of order and framer bytes, as counted in the reader's total
+
+
+class PcapReader:
+    """ Iterates over the SIP messages of a capture file as CapturedMessage(timestamp, src,
+        dst, transport, message), src and dst being (ip, port). Use as a context manager or
+        call close(). ports restricts the decoding to packets from or to those ports.
+
+        The counters (packets, bytes, messages, errors, skipped, and evicted for the TCP
+        flows dropped to stay within max_flows / max_buffered) are updated while iterating
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ports: Optional[Tuple[int, ...]] = None,
+        max_flows: int = DEFAULT_MAX_FLOWS,
+        max_out_of_order: int = DEFAULT_MAX_OUT_OF_ORDER,
+        max_message_size: int = DEFAULT_MAX_MESSAGE_SIZE,
+        max_buffered: int = DEFAULT_MAX_BUFFERED,
+    ):
+        self.path = path
+        self.ports = frozenset(ports) if ports else None
+        self.max_flows = max_flows
+        self.max_out_of_order = max_out_of_order
+        self.max_message_size = max_message_size
+        self.max_buffered = max_buffered
+
+        self.packets = 0
+        self.bytes = 0
+        self.messages = 0
+        self.errors = 0
+        self.skipped = 0
+        self.evicted = 0
+
+        self._buffered = 0
+        self._flows: "collections.OrderedDict[FlowKey, _TcpFlow]" = collections.OrderedDict()
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty file
+            self._file.close()
+            raise SipParserError(f"Empty capture file: {path}")
+
+        if hasattr(self._map, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self._map.madvise(mmap.MADV_SEQUENTIAL)
+        self._released = 0
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # A generator that wasn't exhausted still holds frames: unmapped when collected
+        self._file.close()
+
+    def __enter__(self) -> "PcapReader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self) -> Iterator[CapturedMessage]:
+        for timestamp, linktype, frame in self.iter_frames():
+            self.packets += 1
+            self.bytes += len(frame)
+            yield from self._decode(timestamp, linktype, frame)
+
+    # Capture file formats
+
+    def iter_frames(self) -> Iterator[Tuple[float, int, memoryview]]:
+        """ The captured frames as (timestamp, link type, data) """
+        buf = memoryview(self._map)
+        if len(buf) < 4:
+            raise SipParserError("Truncated capture file")
+
+        magic = buf[:4].tobytes()
+        if struct.unpack("<I", magic)[0] == PCAPNG_SHB:
+            return self._pcapng_frames(buf)
+
+        for order in ("<", ">"):
+            value = struct.unpack(order + "I", magic)[0]
+            if value in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+                return self._pcap_frames(buf, order, 1e-9 if value == PCAP_MAGIC_NS else 1e-6)
+
+        raise SipParserError("Not a pcap or pcapng file")
+
+    def _pcap_frames(self, buf: memoryview, order: str, resolution: float) -> Iterator[Tuple[float, int, memoryview]]:
+        linktype = struct.unpack_from(order + "I", buf, 20)[0] & 0x0FFFFFFF
+        record = struct.Struct(order + "IIII")
+        offset, end = 24, len(buf)
+        while offset + 16 <= end:
+            seconds, fraction, captured, _ = record.unpack_from(buf, offset)
+            offset += 16
+            if offset + captured > end:
+                break  # Truncated capture
+
+            yield seconds + fraction * resolution, linktype, buf[offset : offset + captured]
+            offset += captured
+            if offset - self._released >= RELEASE_SIZE:
+                self._release(offset)
+
+    def _pcapng_frames(self, buf: memoryview) -> Iterator[Tuple[float, int, memoryview]]:
+        order = "<"
+        interfaces: List[Tuple[int, float]] = []  # (link type, timestamp resolution)
+        offset, end = 0, len(buf)
+        while offset + 12 <= end:
+            block_type = struct.unpack_from(order + "I", buf, offset)[0]
+            if block_type == PCAPNG_SHB:
+                # The byte order can change with each section
+                bom = struct.unpack_from("<I", buf, offset + 8)[0]
+                order = "<" if bom == PCAPNG_BYTE_ORDER_MAGIC else ">"
+                interfaces = []
+
+            length = struct.unpack_from(order + "I", buf, offset + 4)[0]
+            if length < 12 or offset + length > end:
+                break  # Truncated or corrupt
+
+            body = offset + 8
+            if block_type == PCAPNG_EPB:
+                interface, high, low, captured = struct.unpack_from(order + "IIII", buf, body)
+                if interface < len(interfaces):
+                    linktype, resolution = interfaces[interface]
+                    data = body + 20
+                    yield ((high << 32) | low) * resolution, linktype, buf[data : data + captured]
+            elif block_type == PCAPNG_SPB:
+                if interfaces:
+                    captured = min(struct.unpack_from(order + "I", buf, body)[0], length - 16)
+                    yield 0.0, interfaces[0][0], buf[body + 4 : body + 4 + captured]
+            elif block_type == PCAPNG_IDB:
+                linktype = struct.unpack_from(order + "H", buf, body)[0]
+                interfaces.append((linktype, self._tsresol(buf, order, body + 8, offset + length - 4)))
+
+            offset += length
+            if offset - self._released >= RELEASE_SIZE:
+                self._release(offset)
+
+    def _release(self, offset: int):
+        """ Drops the resident pages before offset (they're reread from the file if needed) """
+        end = offset - offset % mmap.PAGESIZE
+        if hasattr(self._map, "madvise") and hasattr(mmap, "MADV_DONTNEED") and end > self._released:
+            self._map.madvise(mmap.MADV_DONTNEED, self._released, end - self._released)
+        self._released = end
+
+    @staticmethod
+    def _tsresol(buf: memoryview, order: str, offset: int, end: int) -> float:
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(order + "HH", buf, offset)
+            if code == 0:
+                break
+            if code == PCAPNG_OPTION_TSRESOL and length >= 1:
+                value = buf[offset + 4]
+                return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+
+            offset += 4 + ((length + 3) & ~3)
+
+        return 1e-6
+
+    # Protocol layers
+
+    def _decode(self, timestamp: float, linktype: int, frame: memoryview) -> Iterator[CapturedMessage]:
+        if linktype == LINKTYPE_ETHERNET:
+            ethertype = (frame[12] << 8 | frame[13]) if len(frame) >= 14 else 0
+            offset = 14
+            while ethertype in ETHERTYPE_VLAN and len(frame) >= offset + 4:
+                ethertype = frame[offset + 2] << 8 | frame[offset + 3]
+                offset += 4
+        elif linktype == LINKTYPE_LINUX_SLL:
+            ethertype = (frame[14] << 8 | frame[15]) if len(frame) >= 16 else 0
+            offset = 16
+        elif linktype == LINKTYPE_LINUX_SLL2:
+            ethertype = (frame[0] << 8 | frame[1]) if len(frame) >= 20 else 0
+            offset = 20
+        elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+            version = frame[0] >> 4 if len(frame) else 0
+            ethertype = ETHERTYPE_IPV4 if version == 4 else ETHERTYPE_IPV6 if version == 6 else 0
+            offset = 0
+        elif linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+            # Address family, in host byte order of the capturing machine (or network for LOOP)
+            family = frame[0] | frame[3] if len(frame) >= 4 else 0
+            ethertype = ETHERTYPE_IPV4 if family == 2 else ETHERTYPE_IPV6 if family in (10, 24, 28, 30) else 0
+            offset = 4
+        else:
+            ethertype = offset = 0
+
+        if ethertype == ETHERTYPE_IPV4:
+            return self._ipv4(timestamp, frame[offset:])
+        if ethertype == ETHERTYPE_IPV6:
+            return self._ipv6(timestamp, frame[offset:])
+
+        self.skipped += 1
+        return iter(())
+
+    def _ipv4(self, timestamp: float, packet: memoryview) -> Iterator[CapturedMessage]:
+        if len(packet) < 20:
+            self.skipped += 1
+            return iter(())
+
+        header_length = (packet[0] & 0x0F) * 4
+        total_length = packet[2] << 8 | packet[3]
+        fragment = (packet[6] << 8 | packet[7]) & 0x3FFF  # More fragments flag and offset
+        if fragment:
+            self.skipped += 1
+            return iter(())
+
+        # The total length trims the Ethernet padding
+        payload = packet[header_length : total_length or len(packet)]
+        return self._transport(timestamp, packet[9], packet[12:16].tobytes(), packet[16:20].tobytes(), payload)
+
+    def _ipv6(self, timestamp: float, packet: memoryview) -> Iterator[CapturedMessage]:
+        if len(packet) < 40:
+            self.skipped += 1
+            return iter(())
+
+        payload_length = packet[4] << 8 | packet[5]
+        next_header = packet[6]
+        payload = packet[40 : 40 + payload_length] if payload_length else packet[40:]
+        while next_header in IPV6_EXTENSION_HEADERS and len(payload) >= 8:
+            if next_header == 51:
+                length = (payload[1] + 2) * 4
+            else:
+                length = (payload[1] + 1) * 8
+            next_header = payload[0]
+            payload = payload[length:]
+
+        if next_header == IPV6_FRAGMENT:
+            self.skipped += 1
+            return iter(())
+
+        return self._transport(timestamp, next_header, packet[8:24].tobytes(), packet[24:40].tobytes(), payload)
+
+    def _transport(self, timestamp: float, protocol: int, src: bytes, dst: bytes,
+                   segment: memoryview) -> Iterator[CapturedMessage]:
+        if protocol not in (IPPROTO_UDP, IPPROTO_TCP) or len(segment) < 8:
+            self.skipped += 1
+            return
+
+        sport = segment[0] << 8 | segment[1]
+        dport = segment[2] << 8 | segment[3]
+        if self.ports is not None and sport not in self.ports and dport not in self.ports:
+            self.skipped += 1
+            return
+
+        if protocol == IPPROTO_UDP:
+            payloads = [segment[8:]]
+            transport = "UDP"
+        elif len(segment) >= 20:
+            seq = struct.unpack_from("!I", segment, 4)[0]
+            payloads = self._tcp((src, sport, dst, dport), seq, segment[13], segment[(segment[12] >> 4) * 4 :])
+            transport = "TCP"
+        else:
+            self.skipped += 1
+            return
+
+        for payload in payloads:
+            message = self._parse(payload)
+            if message is not None:
+                self.messages += 1
+                yield CapturedMessage(timestamp, (_ip_str(src), sport), (_ip_str(dst), dport), transport, message)
+
+    def _parse(self, payload) -> Optional[SipMessage]:
+        if not payload or payload[0] not in SIP_FIRST_BYTES:
+            return None  # Not SIP (RTP, keepalives, ...)
+
+        try:
+            # Copied out of the mapping, so messages can outlive the reader
+            return SipMessage.from_bytes(bytes(payload))
+        except (SipParserError, ValueError, UnicodeDecodeError):
+            self.errors += 1
+            return None
+
+    # TCP reassembly
+
+    def _tcp(self, key: FlowKey, seq: int, flags: int, payload: memoryview) -> List[bytes]:
+        flows = self._flows
+        flow = flows.get(key)
+        if flags & TCP_SYN:
+            if flow is not None:
+                self._buffered -= flow.buffered
+            flows[key] = _TcpFlow((seq + 1) & SEQ_MASK, self.max_message_size)
+            flows.move_to_end(key)
+            self._evict()
+            return []
+
+        if flow is None:
+            if not payload:
+                return []
+            flow = flows[key] = _TcpFlow(seq, self.max_message_size)  # Capture started mid-stream
+            self._evict()
+        else:
+            flows.move_to_end(key)
+
+        messages: List[bytes] = []
+        if payload:
+            ahead = (seq - flow.next_seq) & SEQ_MASK
+            if ahead == 0 or ahead >= SEQ_HALF:
+                self._feed(flow, seq, payload, messages)
+            elif flow.pending_bytes + len(payload) <= self.max_out_of_order:
+                if seq not in flow.pending:
+                    flow.pending[seq] = bytes(payload)
+                    flow.pending_bytes += len(payload)
+            else:
+                # The gap was never captured: resynchronize on this segment
+                self.errors += 1
+                flow.pending.clear()
+                flow.pending_bytes = 0
+                flow.framer = SipStreamFramer(max_message_size=self.max_message_size)
+                flow.next_seq = seq
+                self._feed(flow, seq, payload, messages)
+
+        if flags & (TCP_FIN | TCP_RST):
+            del flows[key]
+            self._buffered -= flow.buffered
+        else:
+            buffered = flow.pending_bytes + flow.framer.pending
+            self._buffered += buffered - flow.buffered
+            flow.buffered = buffered
+            if self._buffered > self.max_buffered:
+                self._evict()
+
+        return messages
+
+    def _feed(self, flow: _TcpFlow, seq: int, data, messages: List[bytes]):
+        """ Feeds in-order (possibly overlapping) data, then the pending segments it reaches """
+        while True:
+            overlap = (flow.next_seq - seq) & SEQ_MASK
+            if overlap < len(data):
+                try:
+                    messages.extend(flow.framer.feed(bytes(data[overlap:])))
+                except SipParserError:
+                    self.errors += 1
+                    flow.framer = SipStreamFramer(max_message_size=self.max_message_size)
+                flow.next_seq = (seq + len(data)) & SEQ_MASK
+
+            seq = next(
+                (s for s in flow.pending if (flow.next_seq - s) & SEQ_MASK < SEQ_HALF), None
+            )
+            if seq is None:
+                return
+
+            data = flow.pending.pop(seq)
+            flow.pending_bytes -= len(data)
+
+    def _evict(self):
+        """ Drops the least recently active flows beyond max_flows or max_buffered """
+        flows = self._flows
+        while flows and (len(flows) > self.max_flows or self._buffered > self.max_buffered):
+            _, flow = flows.popitem(last=False)
+            self._buffered -= flow.buffered
+            self.evicted += 1
+
+
+def read_capture(path: str, **kwargs) -> Iterator[CapturedMessage]:
+    """ The SIP messages of a capture file, see PcapReader """
+    with PcapReader(path, **kwargs) as reader:
+        yield from reader
@@ -0,0 +1,102 @@
+"""
+Reads the few fields needed to route a SIP message (e.g. to shard it in a load balancer)
+without parsing it: method or status, Call-ID, CSeq and the top Via branch.
+
+The message head is scanned once and the scan stops as soon as the fields are found.
+Works on str and bytes; values are returned as str.
+"""
+import re
+from collections import namedtuple
+from typing import Dict, Pattern, Tuple, Union
+
+from sip_parser import COMPACT_HEADERS
+from exceptions import SipParserError
+
+PeekResult = namedtuple("PeekResult", "method status call_id cseq cseq_method branch")
+
+PEEKED_HEADERS = ("call-id", "cseq", "via")
+
+
+def _header_pattern(names: Tuple[str, ...]) -> str:
+    # Full and compact names, then the value, which may span folded lines
+    alternatives = list(names) + [short for short, name in COMPACT_HEADERS.items() if name in names]
+    return r"\r\n(%s)[ \t]*:[ \t]*([^\r\n]*(?:\r\n[ \t][^\r\n]*)*)" % "|".join(map(re.escape, alternatives))
+
+
+HEADER_RE = re.compile(_header_pattern(PEEKED_HEADERS), re.IGNORECASE)
+HEADER_BYTES_RE = re.compile(_header_pattern(PEEKED_HEADERS).encode(), re.IGNORECASE)
+BRANCH_RE = re.compile(r";[ \t\r\n]*branch[ \t]*=[ \t]*([^;,\s]+)", re.IGNORECASE)
+CSEQ_VALUE_RE = re.compile(r"\s*(\d+)\s+(\S+)")
+LEADING_WS_RE = re.compile(r"\s*")
+LEADING_WS_BYTES_RE = re.compile(rb"\s*")
+
+_NAMES: Dict[str, str] = {name: name for name in PEEKED_HEADERS}
+_NAMES.update((short, name) for short, name in COMPACT_HEADERS.items() if name in PEEKED_HEADERS)
+
+
+def peek(raw: Union[str, bytes, bytearray, memoryview]) -> PeekResult:
+    """ Peeks at a raw message. Fields not found are None. Raises SipParserError if there's
+        no valid start line
+    """
+    if isinstance(raw, str):
+        pattern: Pattern = HEADER_RE
+        start = LEADING_WS_RE.match(raw).end()
+        head_end = raw.find("\r\n\r\n", start)
+        line_end = raw.find("\r\n", start) % (len(raw) + 1)
+        start_line = raw[start:line_end]
+    else:
+        if isinstance(raw, memoryview):
+            raw = raw.tobytes()
+        pattern = HEADER_BYTES_RE
+        start = LEADING_WS_BYTES_RE.match(raw).end()
+        head_end = raw.find(b"\r\n\r\n", start)
+        line_end = raw.find(b"\r\n", start) % (len(raw) + 1)
+        start_line = str(raw[start:line_end], "utf-8", "replace")
+
+    if head_end < 0:
+        head_end = len(raw)
+
+    method = status = None
+    parts = start_line.split(None, 2)
+    if len(parts) < 2:
+        raise SipParserError("Invalid SIP message to peek at, no start line: %s" % start_line)
+
+    if parts[0].startswith("SIP/"):
+        if not parts[1].isdigit():
+            raise SipParserError("Invalid SIP response status: %s" % parts[1])
+        status = int(parts[1])
+    else:
+        method = parts[0]
+
+    found: Dict[str, str] = {}
+    for m in pattern.finditer(raw, max(line_end, 0), head_end):
+        name = m.group(1)
+        if not isinstance(name, str):
+            name = str(name, "ascii")
+
+        name = _NAMES[name.lower()]
+        if name in found:
+            continue  # Only the first Call-ID, CSeq and Via count
+
+        value = m.group(2)
+        found[name] = value if isinstance(value, str) else str(value, "utf-8", "replace")
+        if len(found) == len(PEEKED_HEADERS):
+            break
+
+    call_id = found.get("call-id")
+    if call_id is not None:
+        call_id = call_id.split(",", 1)[0].strip()
+
+    cseq = cseq_method = None
+    cseq_match = CSEQ_VALUE_RE.match(found.get("cseq", ""))
+    if cseq_match:
+        cseq, cseq_method = int(cseq_match.group(1)), cseq_match.group(2)
+
+    branch = None
+    via = found.get("via")
+    if via is not None:
+        branch_match = BRANCH_RE.search(via.split(",", 1)[0])
+        if branch_match:
+            branch = branch_match.group(1)
+
+    return PeekResult(method, status, call_id, cseq, cseq_method, branch)
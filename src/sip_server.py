@@ -0,0 +1,207 @@
+"""
+Multi-process SIP server: N worker processes sharing the same UDP/TCP port with
+SO_REUSEPORT, each running the sip_transport endpoints on its own event loop.
+
+The kernel spreads datagrams over the workers by source address, so for dialog affinity
+each UDP datagram is peeked at (sip_peek) and its Call-ID hashed to the worker owning
+it. Datagrams for another worker are handed to it over a local unix datagram socket;
+the owner parses them, runs the handler and answers from the shared port itself.
+
+TCP messages stay on the worker that accepted the connection, as their responses must be
+written to it: the connection is the affinity unit.
+"""
+import asyncio
+import logging
+import marshal
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import zlib
+from typing import Any, List, Optional
+
+from sip_peek import peek
+from sip_transport import (
+    Address,
+    Handler,
+    SipDatagramProtocol,
+    start_tcp_server,
+    DEFAULT_QUEUE_SIZE,
+)
+from exceptions import SipParserError
+
+logger = logging.getLogger(__name__)
+
+READY_TIMEOUT = 10.0
+
+
+def worker_for(call_id: Optional[str], workers: int) -> Optional[int]:
+    """ The worker owning a Call-ID. The hash is the same in every process (unlike hash()) """
+    if not call_id:
+        return None
+
+    return zlib.crc32(call_id.encode("utf-8")) % workers
+
+
+class ShardedDatagramProtocol(SipDatagramProtocol):
+    """ UDP endpoint of a worker, passing the datagrams of the other workers' Call-IDs on
+    """
+
+    def __init__(self, handler: Handler, index: int, channels: List[str], **kwargs):
+        super().__init__(handler, **kwargs)
+        self.index = index
+        self.channels = channels
+        self.forwarded = 0
+        self.channel: Optional[socket.socket] = None
+
+    def _received(self, data: bytes, addr: Address):
+        try:
+            owner = worker_for(peek(data).call_id, len(self.channels))
+        except SipParserError:
+            owner = None
+
+        if owner is None or owner == self.index or self.channel is None:
+            super()._received(data, addr)
+            return
+
+        try:
+            self.channel.sendto(marshal.dumps((addr, data)), self.channels[owner])
+            self.forwarded += 1
+        except OSError as e:
+            logger.debug("Couldn't hand a datagram to worker %d, handling it here: %s", owner, e)
+            super()._received(data, addr)
+
+    def received_from_worker(self, payload: bytes):
+        addr, data = marshal.loads(payload)
+        super()._received(data, tuple(addr))
+
+
+class _ChannelProtocol(asyncio.DatagramProtocol):
+    def __init__(self, endpoint: ShardedDatagramProtocol):
+        self.endpoint = endpoint
+
+    def datagram_received(self, data: bytes, addr: Any):
+        self.endpoint.received_from_worker(data)
+
+
+async def _serve(
+    handler: Handler,
+    index: int,
+    channels: List[str],
+    host: str,
+    port: int,
+    udp: bool,
+    tcp: bool,
+    ready: Any,
+    endpoint_kwargs: dict,
+):
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+    loop.add_signal_handler(signal.SIGTERM, stopped.set)
+    loop.add_signal_handler(signal.SIGINT, stopped.set)
+
+    closing: List[Any] = []
+    if udp:
+        udp_transport, endpoint = await loop.create_datagram_endpoint(
+            lambda: ShardedDatagramProtocol(handler, index, channels, **endpoint_kwargs),
+            local_addr=(host, port),
+            reuse_port=True,
+        )
+        channel_transport, _ = await loop.create_datagram_endpoint(
+            lambda: _ChannelProtocol(endpoint), local_addr=channels[index], family=socket.AF_UNIX
+        )
+        endpoint.channel = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        endpoint.channel.setblocking(False)
+        closing += [udp_transport, channel_transport, endpoint.channel]
+
+    if tcp:
+        server = await start_tcp_server(handler, host, port, reuse_port=True, **endpoint_kwargs)
+        closing.append(server)
+
+    ready.set()
+    await stopped.wait()
+    for item in closing:
+        item.close()
+
+
+def _run_worker(handler: Handler, index: int, channels: List[str], host: str, port: int,
+                udp: bool, tcp: bool, ready: Any, endpoint_kwargs: dict):
+    asyncio.run(_serve(handler, index, channels, host, port, udp, tcp, ready, endpoint_kwargs))
+
+
+class SipServer:
+    """ Runs `workers` processes (default: one per CPU) serving SIP on host:port, calling
+        `await handler(message, addr, endpoint)` for each message like sip_transport.
+        The handler must be picklable (a module level function) for non-fork platforms.
+        endpoint_kwargs (queue_size, concurrency) are passed to the endpoints.
+
+        Use start()/stop() or as a context manager
+    """
+
+    def __init__(
+        self,
+        handler: Handler,
+        host: str = "127.0.0.1",
+        port: int = 5060,
+        workers: Optional[int] = None,
+        udp: bool = True,
+        tcp: bool = False,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        concurrency: int = 1,
+    ):
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise OSError("SO_REUSEPORT isn't available on this platform")
+
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.udp = udp
+        self.tcp = tcp
+        self.endpoint_kwargs = {"queue_size": queue_size, "concurrency": concurrency}
+        self.processes: List[multiprocessing.Process] = []
+        self._channel_dir: Optional[str] = None
+
+    def start(self):
+        self._channel_dir = tempfile.mkdtemp(prefix="sip-server-")
+        channels = [os.path.join(self._channel_dir, f"worker-{i}.sock") for i in range(self.workers)]
+        events = []
+        for index in range(self.workers):
+            ready = multiprocessing.Event()
+            process = multiprocessing.Process(
+                target=_run_worker,
+                args=(self.handler, index, channels, self.host, self.port,
+                      self.udp, self.tcp, ready, self.endpoint_kwargs),
+                name=f"sip-worker-{index}",
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+            events.append(ready)
+
+        for index, ready in enumerate(events):
+            if not ready.wait(READY_TIMEOUT):
+                self.stop()
+                raise RuntimeError(f"SIP worker {index} didn't start")
+
+    def stop(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+
+        for process in self.processes:
+            process.join()
+
+        self.processes = []
+        if self._channel_dir is not None:
+            shutil.rmtree(self._channel_dir, ignore_errors=True)
+            self._channel_dir = None
+
+    def __enter__(self) -> "SipServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -1,6 +1,14 @@
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Mapping, Union
 import re
 
+from sip_parser import COMPACT_HEADERS
+
+# Long header name -> compact form (RFC 3261 section 7.3.3)
+SHORT_HEADER_NAMES = {name: short for short, name in COMPACT_HEADERS.items()}
+
+# Header name at the start of each (non folded) line
+HEADER_NAME_PREFIX_RE = re.compile(r"^(?![ \t])[^:\r\n]*?[ \t]*:[ \t]*", re.MULTILINE)
+
 
 def stringify_params(params: List):
     params_str = ""
@@ -12,7 +20,7 @@ def stringify_params(params: List):
     return params_str
 
 
-def stringify_uri(uri: Union[str, Dict]):
+def stringify_uri(uri: Union[str, Mapping]):
     if isinstance(uri, str):
         return uri
 
@@ -42,7 +50,7 @@ def stringify_version(version: Any):
     return str(version) or "2.0"
 
 
-def stringify_aor(aor: Union[Dict, str]):
+def stringify_aor(aor: Union[Mapping, str]):
     if isinstance(aor, str):
         return aor
 
@@ -67,15 +75,15 @@ def stringify_via(all_via: List):
     return "\r\n".join(header_strs)
 
 
-def stringify_to(data: Dict):
+def stringify_to(data: Mapping):
     return f"To: {stringify_aor(data)}"
 
 
-def stringify_from(data: Dict):
+def stringify_from(data: Mapping):
     return f"From: {stringify_aor(data)}"
 
 
-def stringify_contact(data: List[Dict]):
+def stringify_contact(data: List[Mapping]):
     if data == "*" or not data:
         return f"Contact: *"
 
@@ -83,26 +91,26 @@ def stringify_contact(data: List[Dict]):
     return f"Contact: {contacts}"
 
 
-def stringify_route(data: List[Dict]):
+def stringify_route(data: List[Mapping]):
     routes = ", ".join([stringify_aor(aor) for aor in data])
     return f"Route: {routes}"
 
 
-def stringify_record_route(data: List[Dict]):
+def stringify_record_route(data: List[Mapping]):
     record_routes = ", ".join([stringify_aor(aor) for aor in data])
     return f"Record-Route: {record_routes}"
 
 
-def stringify_path(data: List[Dict]):
+def stringify_path(data: List[Mapping]):
     paths = ", ".join([stringify_aor(aor) for aor in data])
     return f"Path: {paths}"
 
 
-def stringify_cseq(data: Dict[str, Any]):
+def stringify_cseq(data: Mapping[str, Any]):
     return f'CSeq: {data["seq"]} {data["method"]}'
 
 
-def stringify_auth_header_one(name: str, data: Dict):
+def stringify_auth_header_one(name: str, data: Mapping):
     params = []
 
     for param in data:
@@ -116,15 +124,15 @@ def stringify_auth_header_one(name: str, data: Dict):
     return f"{name}: {params_str}"
 
 
-def stringify_auth_header_many(name: str, data_many: List[Dict]):
+def stringify_auth_header_many(name: str, data_many: List[Mapping]):
     stringified_headers = []
     for data_one in data_many:
         stringified_headers.append(stringify_auth_header_one(name, data_one))
 
-    return "".join(stringified_headers)
+    return "\r\n".join(stringified_headers)
 
 
-def stringify_refer_to(data: Dict):
+def stringify_refer_to(data: Mapping):
     return f"Refer-To: {stringify_aor(data)}"
 
 
@@ -135,6 +143,15 @@ def prettify_header_name(header_name: str):
     return re.sub(r"\b([a-z])", lambda m: m.group(0).upper(), header_name)
 
 
+def compact_header_lines(header_name: str, lines: str) -> str:
+    """ Rewrites the serialized lines of a header with its compact name, if it has one """
+    short = SHORT_HEADER_NAMES.get(header_name)
+    if short is None:
+        return lines
+
+    return HEADER_NAME_PREFIX_RE.sub(short + ": ", lines)
+
+
 def stringify_header(header_name, header_data):
     # First, see if we can transform the header in a simple way, or we
     # don't know what to do with it (has no stringifier)
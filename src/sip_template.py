@@ -0,0 +1,115 @@
+"""
+Precompiled message templates, for generating messages at a high rate (load generators,
+OPTIONS keepalives, NOTIFY fan-out).
+
+A template is written like SipMessage.from_dict data, with Slot("name") in place of the
+values that change per message (Call-ID, tags, CSeq, branch, ...). It's rendered through
+from_dict and stringify once, then split into fixed byte segments and slots, so each
+message only costs filling the slots:
+
+    template = MessageTemplate({
+        "method": "OPTIONS",
+        "uri": "sip:server@10.0.0.1",
+        "headers": {
+            "via": [{"version": "2.0", "protocol": "UDP", "host": "10.0.0.2",
+                     "params": {"branch": Slot("branch")}}],
+            "call-id": Slot("call_id"),
+            "cseq": {"seq": Slot("cseq"), "method": "OPTIONS"},
+            ...
+        },
+    })
+    data = template.render(branch="z9hG4bK1", call_id="abc", cseq=1)
+
+With content=Slot("body"), the body is given to render() and the Content-Length is
+computed from its encoded size.
+"""
+import re
+from typing import Any, Dict, List, Tuple, Union
+
+from sip_message import SipMessage
+from exceptions import SipBuilderError
+
+BODY_SLOT = "body"
+CONTENT_LENGTH_SLOT = "content_length"
+
+SLOT_RE = re.compile(r"\x00([A-Za-z_]\w*)\x00")
+CONTENT_LENGTH_RE = re.compile(r"^((?:content-length|l)[ \t]*:[ \t]*)\d+", re.IGNORECASE | re.MULTILINE)
+
+
+class Slot(str):
+    """ A placeholder for a per-message value. It's a str (a marker that can't appear in
+        SIP text) so the stringifiers render it in place like any value
+    """
+
+    def __new__(cls, name: str):
+        if not re.fullmatch(r"[A-Za-z_]\w*", name):
+            raise SipBuilderError(f"Invalid template slot name: {name}")
+
+        slot = super().__new__(cls, f"\x00{name}\x00")
+        slot.name = name
+        return slot
+
+
+def _encode(value: Union[str, bytes, int]) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode("utf-8")
+
+
+class MessageTemplate:
+    """ A message compiled from from_dict data with Slot values, see the module doc """
+
+    __slots__ = ("segments", "slots", "_positions", "_body")
+
+    def __init__(self, data: Dict[str, Any], compact: bool = False):
+        content = data.get("content", "")
+        self._body = isinstance(content, Slot)
+        if self._body and content.name != BODY_SLOT:
+            raise SipBuilderError(f"The body slot must be named {BODY_SLOT}")
+        if not self._body and SLOT_RE.search(content):
+            raise SipBuilderError(f"Slots in a fixed body, use content=Slot(\"{BODY_SLOT}\") instead")
+
+        # stringify() sets Content-Length from the content, so the body is left out of the
+        # rendering and the Content-Length value becomes a slot
+        message = SipMessage.from_dict(
+            dict(data, headers=dict(data.get("headers") or {}), content="" if self._body else content)
+        )
+        text = message.stringify(compact)
+        if self._body:
+            head = text[: -len("\r\n\r\n")] if text.endswith("\r\n\r\n") else text
+            head, found = CONTENT_LENGTH_RE.subn(r"\g<1>" + Slot(CONTENT_LENGTH_SLOT), head, 1)
+            if not found:
+                raise SipBuilderError("Template without Content-Length header")
+            text = head + "\r\n\r\n" + Slot(BODY_SLOT)
+
+        self.segments: List[bytes] = []
+        self._positions: List[Tuple[int, str]] = []
+        pieces = SLOT_RE.split(text)
+        for index, piece in enumerate(pieces):
+            if index % 2:
+                self._positions.append((len(self.segments), piece))
+                self.segments.append(b"")
+            elif piece:
+                self.segments.append(piece.encode("utf-8"))
+
+        self.slots = tuple(sorted({name for _, name in self._positions} - {CONTENT_LENGTH_SLOT}))
+
+    def render(self, **values: Union[str, bytes, int]) -> bytes:
+        """ The message with the slots filled in """
+        if self._body:
+            body = _encode(values.get(BODY_SLOT, b""))
+            values[BODY_SLOT] = body
+            values[CONTENT_LENGTH_SLOT] = len(body)
+
+        parts = self.segments.copy()
+        try:
+            for index, name in self._positions:
+                parts[index] = _encode(values[name])
+        except KeyError as e:
+            raise SipBuilderError(f"Missing value for template slot {e.args[0]}")
+
+        return b"".join(parts)
+
+    def render_message(self, **values: Union[str, bytes, int]) -> SipMessage:
+        """ The rendered message, parsed back """
+        return SipMessage.from_bytes(self.render(**values))
@@ -0,0 +1,478 @@
+"""
+RFC 3261 transaction layer (section 17).
+
+The TransactionManager matches messages to client and server transactions by top Via
+branch, sent-by and method (17.1.3 / 17.2.3) and runs their retransmission and timeout
+timers (A to K) in a single TimingWheel, so that a live transaction doesn't cost an
+asyncio handle or a thread.
+
+Messages are written through a send(data, addr) callable (e.g. the send method of a
+sip_transport endpoint) and incoming ones are given to receive(). The transaction user
+gets new requests through the manager's on_request callback and responses through the
+callbacks given to send_request(). Retransmissions only happen on unreliable transports.
+"""
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sip_message import SipMessage, TransactionKey
+from sip_fields import CSeq
+from timing_wheel import TimingWheel, Timer
+from exceptions import SipParserError, SipTransactionError
+
+logger = logging.getLogger(__name__)
+
+# Timer values (RFC 3261 17.1.1.1)
+T1 = 0.5
+T2 = 4.0
+T4 = 5.0
+
+# A server INVITE transaction answers 100 Trying if the TU hasn't answered within this delay
+TRYING_DELAY = 0.2
+
+# A client INVITE transaction in Proceeding times out when no final response comes within
+# this delay of the last provisional one (like a proxy's Timer C, RFC 3261 16.6, > 3 min)
+TIMER_C = 180.0
+
+CALLING = "calling"
+TRYING = "trying"
+PROCEEDING = "proceeding"
+COMPLETED = "completed"
+CONFIRMED = "confirmed"
+TERMINATED = "terminated"
+
+Address = Tuple[Any, ...]
+
+
+def build_response(
+    request: SipMessage, status: int, reason: str, to_tag: Optional[str] = None
+) -> SipMessage:
+    """ A response to the request (RFC 3261 8.2.6.2), without body. to_tag is added to the
+        To header if it doesn't have a tag yet
+    """
+    to_value = request.peek_header("to")
+    if to_tag and to_value is not None and not (to_value.get("params") or {}).get("tag"):
+        to_value = to_value.copy()
+        to_value["params"] = dict(to_value.get("params") or {}, tag=to_tag)
+
+    headers = {
+        "via": request.peek_header("via"),
+        "from": request.peek_header("from"),
+        "to": to_value,
+        "call-id": request.peek_header("call-id"),
+        "cseq": request.peek_header("cseq"),
+        "content-length": 0,
+    }
+    return SipMessage.from_dict(
+        {
+            "status": status,
+            "reason": reason,
+            "version": request.version,
+            "headers": {name: value for name, value in headers.items() if value is not None},
+        }
+    )
+
+
+def _encode(message: SipMessage) -> bytes:
+    return message.to_bytes()
+
+
+class Transaction:
+    """ State shared by all transactions. Retransmissions resend `data` to `addr`
+    """
+
+    __slots__ = (
+        "manager", "key", "request", "addr", "reliable", "state",
+        "data", "interval", "retransmit_timer", "timeout_timer",
+    )
+
+    def __init__(self, manager: "TransactionManager", key: TransactionKey, request: SipMessage,
+                 addr: Address, reliable: bool):
+        self.manager = manager
+        self.key = key
+        self.request = request
+        self.addr = addr
+        self.reliable = reliable
+        self.state = ""
+        self.data = b""
+        self.interval = T1
+        self.retransmit_timer: Optional[Timer] = None
+        self.timeout_timer: Optional[Timer] = None
+
+    def _send(self, data: bytes):
+        self.data = data
+        self.manager.send(data, self.addr)
+
+    def _retransmit(self):
+        self.manager.retransmissions += 1
+        self.manager.send(self.data, self.addr)
+
+    def _start_retransmit(self, interval: float, callback: Callable):
+        self._cancel_retransmit()
+        if not self.reliable:
+            self.interval = interval
+            self.retransmit_timer = self.manager.wheel.schedule(interval, callback)
+
+    def _cancel_retransmit(self):
+        if self.retransmit_timer is not None:
+            self.manager.wheel.cancel(self.retransmit_timer)
+            self.retransmit_timer = None
+
+    def _start_timeout(self, delay: float, callback: Callable):
+        """ Runs callback after delay (right away when there's no delay) """
+        self._cancel_timeout()
+        if delay > 0:
+            self.timeout_timer = self.manager.wheel.schedule(delay, callback)
+        else:
+            callback()
+
+    def _cancel_timeout(self):
+        if self.timeout_timer is not None:
+            self.manager.wheel.cancel(self.timeout_timer)
+            self.timeout_timer = None
+
+    def terminate(self):
+        """ Stops the transaction's timers and forgets it """
+        if self.state == TERMINATED:
+            return
+
+        self.state = TERMINATED
+        self._cancel_retransmit()
+        self._cancel_timeout()
+        self.manager._remove(self)
+
+
+class ClientTransaction(Transaction):
+    """ A request sent, waiting for its responses: INVITE (17.1.1) or non-INVITE (17.1.2)
+    """
+
+    __slots__ = ("on_response", "on_timeout", "ack")
+
+    def __init__(self, manager: "TransactionManager", key: TransactionKey, request: SipMessage,
+                 addr: Address, reliable: bool, on_response: Optional[Callable],
+                 on_timeout: Optional[Callable]):
+        super().__init__(manager, key, request, addr, reliable)
+        self.on_response = on_response
+        self.on_timeout = on_timeout
+        self.ack: Optional[bytes] = None
+
+    def start(self, data: Optional[bytes] = None):
+        self._send(data if data is not None else _encode(self.request))
+        if self.request.method == "INVITE":
+            self.state = CALLING
+            self._start_retransmit(T1, self._timer_a)
+            self._start_timeout(64 * T1, self._timer_b)
+        else:
+            self.state = TRYING
+            self._start_retransmit(T1, self._timer_e)
+            self._start_timeout(64 * T1, self._timer_f)
+
+    def receive_response(self, response: SipMessage):
+        status = response.status
+        if self.request.method == "INVITE":
+            self._invite_response(response, status)
+        else:
+            self._non_invite_response(response, status)
+
+    def _invite_response(self, response: SipMessage, status: int):
+        if self.state in (CALLING, PROCEEDING):
+            if status < 200:
+                self.state = PROCEEDING
+                self._cancel_retransmit()
+                if self.manager.proceeding_timeout:
+                    self._start_timeout(self.manager.proceeding_timeout, self._timer_c)
+                else:
+                    self._cancel_timeout()
+                self._pass_up(response)
+            elif status < 300:
+                self._pass_up(response)
+                self.terminate()  # The TU acknowledges 2xx itself
+            else:
+                self.state = COMPLETED
+                self._cancel_retransmit()
+                self.ack = _encode(self._build_ack(response))
+                self.manager.send(self.ack, self.addr)
+                self._pass_up(response)
+                self._start_timeout(0 if self.reliable else 32.0, self.terminate)  # Timer D
+        elif self.state == COMPLETED and status >= 300:
+            self.manager.send(self.ack, self.addr)  # Response retransmitted: ACK again
+
+    def _non_invite_response(self, response: SipMessage, status: int):
+        if self.state not in (TRYING, PROCEEDING):
+            return  # Retransmissions of the final response are absorbed
+
+        if status < 200:
+            self.state = PROCEEDING
+            self._pass_up(response)
+        else:
+            self.state = COMPLETED
+            self._cancel_retransmit()
+            self._pass_up(response)
+            self._start_timeout(0 if self.reliable else T4, self.terminate)  # Timer K
+
+    def _pass_up(self, response: SipMessage):
+        # 100 Trying is hop-by-hop, it only stops the retransmissions
+        if response.status == 100 and self.manager.absorb_trying:
+            return
+
+        if self.on_response is not None:
+            self.on_response(self, response)
+
+    def _build_ack(self, response: SipMessage) -> SipMessage:
+        """ ACK for a non-2xx final response (17.1.1.3) """
+        request = self.request
+        headers = {
+            "via": request.peek_header("via")[:1],
+            "max-forwards": 70,
+            "route": request.peek_header("route"),
+            "from": request.peek_header("from"),
+            "to": response.peek_header("to"),
+            "call-id": request.peek_header("call-id"),
+            "cseq": CSeq(request.peek_header("cseq")["seq"], "ACK"),
+            "content-length": 0,
+        }
+        return SipMessage.from_dict(
+            {
+                "method": "ACK",
+                "uri": request.uri,
+                "version": request.version,
+                "headers": {name: value for name, value in headers.items() if value is not None},
+            }
+        )
+
+    def _timer_a(self):
+        if self.state == CALLING:
+            self._retransmit()
+            self._start_retransmit(self.interval * 2, self._timer_a)
+
+    def _timer_b(self):
+        self.timeout_timer = None
+        if self.state == CALLING:
+            self._timed_out()
+
+    def _timer_c(self):
+        self.timeout_timer = None
+        if self.state == PROCEEDING:
+            self._timed_out()
+
+    def _timer_e(self):
+        if self.state in (TRYING, PROCEEDING):
+            self._retransmit()
+            interval = T2 if self.state == PROCEEDING else min(self.interval * 2, T2)
+            self._start_retransmit(interval, self._timer_e)
+
+    def _timer_f(self):
+        self.timeout_timer = None
+        if self.state in (TRYING, PROCEEDING):
+            self._timed_out()
+
+    def _timed_out(self):
+        self.manager.timeouts += 1
+        self.terminate()
+        if self.on_timeout is not None:
+            self.on_timeout(self)
+
+
+class ServerTransaction(Transaction):
+    """ A request received, answered by the TU with send_response(): INVITE (17.2.1) or
+        non-INVITE (17.2.2)
+    """
+
+    __slots__ = ("trying_timer",)
+
+    def __init__(self, manager: "TransactionManager", key: TransactionKey, request: SipMessage,
+                 addr: Address, reliable: bool):
+        super().__init__(manager, key, request, addr, reliable)
+        self.trying_timer: Optional[Timer] = None
+
+    @property
+    def is_invite(self) -> bool:
+        return self.request.method == "INVITE"
+
+    def start(self):
+        if self.is_invite:
+            self.state = PROCEEDING
+            self.trying_timer = self.manager.wheel.schedule(TRYING_DELAY, self._send_trying)
+        else:
+            self.state = TRYING
+
+    def _send_trying(self):
+        self.trying_timer = None
+        if self.state == PROCEEDING and not self.data:
+            self._send(_encode(build_response(self.request, 100, "Trying")))
+
+    def send_response(self, response: SipMessage, data: Optional[bytes] = None):
+        """ Sends a response from the TU and moves the transaction along. data is the
+            response already serialized, sent as is
+        """
+        if self.state in (COMPLETED, CONFIRMED, TERMINATED):
+            raise SipTransactionError("The transaction has already sent its final response")
+
+        if self.trying_timer is not None:
+            self.manager.wheel.cancel(self.trying_timer)
+            self.trying_timer = None
+
+        self._send(data if data is not None else _encode(response))
+        status = response.status
+        if status < 200:
+            self.state = PROCEEDING
+        elif self.is_invite and status < 300:
+            self.terminate()  # The TU retransmits 2xx until the ACK
+        elif self.is_invite:
+            self.state = COMPLETED
+            self._start_retransmit(T1, self._timer_g)
+            self._start_timeout(64 * T1, self._timer_h)
+        else:
+            self.state = COMPLETED
+            self._start_timeout(0 if self.reliable else 64 * T1, self.terminate)  # Timer J
+
+    def receive_request(self, request: SipMessage):
+        """ A retransmission of the request, or the ACK of an INVITE """
+        if request.method == "ACK":
+            if self.state == COMPLETED:
+                self.state = CONFIRMED
+                self._cancel_retransmit()
+                self._start_timeout(0 if self.reliable else T4, self.terminate)  # Timer I
+        elif self.state in (PROCEEDING, COMPLETED) and self.data:
+            self.manager.send(self.data, self.addr)  # Resend the last response
+
+    def _timer_g(self):
+        if self.state == COMPLETED:
+            self._retransmit()
+            self._start_retransmit(min(self.interval * 2, T2), self._timer_g)
+
+    def _timer_h(self):
+        self.timeout_timer = None
+        if self.state == COMPLETED:
+            self.manager.timeouts += 1
+            self.terminate()  # The ACK never came
+
+    def terminate(self):
+        if self.trying_timer is not None:
+            self.manager.wheel.cancel(self.trying_timer)
+            self.trying_timer = None
+
+        super().terminate()
+
+
+class TransactionManager:
+    """ Owns the live transactions and their timers.
+
+        send(data, addr) writes a message. on_request(transaction, request) is called for
+        each new request, with a ServerTransaction to answer through; ACKs of 2xx responses
+        don't belong to a transaction and are passed with None. on_stray_response(response,
+        addr) gets responses matching no transaction (e.g. for a stateless proxy).
+
+        A client INVITE transaction getting provisional responses but no final one times
+        out after proceeding_timeout seconds without a new provisional response (None
+        waits forever), reported to the TU through on_timeout like Timer B
+
+        The wheel must be advanced for the timers to fire, see TimingWheel.attach()
+    """
+
+    def __init__(
+        self,
+        send: Callable[[bytes, Address], Any],
+        on_request: Optional[Callable[[Optional[ServerTransaction], SipMessage], Any]] = None,
+        on_stray_response: Optional[Callable[[SipMessage, Address], Any]] = None,
+        wheel: Optional[TimingWheel] = None,
+        absorb_trying: bool = True,
+        proceeding_timeout: Optional[float] = TIMER_C,
+    ):
+        self.send = send
+        self.on_request = on_request
+        self.on_stray_response = on_stray_response
+        self.wheel = wheel if wheel is not None else TimingWheel()
+        self.absorb_trying = absorb_trying
+        self.proceeding_timeout = proceeding_timeout
+
+        self.client_transactions: Dict[TransactionKey, ClientTransaction] = {}
+        self.server_transactions: Dict[TransactionKey, ServerTransaction] = {}
+        self.retransmissions = 0
+        self.timeouts = 0
+
+    def __len__(self):
+        return len(self.client_transactions) + len(self.server_transactions)
+
+    def send_request(
+        self,
+        request: SipMessage,
+        addr: Address,
+        reliable: bool = False,
+        on_response: Optional[Callable[[ClientTransaction, SipMessage], Any]] = None,
+        on_timeout: Optional[Callable[[ClientTransaction], Any]] = None,
+        data: Optional[bytes] = None,
+    ) -> ClientTransaction:
+        """ Sends a request (not an ACK) in a new client transaction. Its top Via must carry
+            a unique RFC 3261 branch. data is the request already serialized (e.g. rendered
+            from a template), sent as is instead of serializing the message
+        """
+        if request.method == "ACK":
+            raise SipTransactionError("ACK requests are sent outside of transactions")
+
+        key = request.transaction_key
+        if key is None:
+            raise SipTransactionError("Requests need Via and CSeq headers to be sent in a transaction")
+
+        if key in self.client_transactions:
+            raise SipTransactionError("A client transaction with this branch already exists")
+
+        transaction = ClientTransaction(self, key, request, addr, reliable, on_response, on_timeout)
+        self.client_transactions[key] = transaction
+        transaction.start(data)
+        return transaction
+
+    def receive(self, message: SipMessage, addr: Address, reliable: bool = False):
+        """ Dispatches a message from the transport """
+        try:
+            key = message.transaction_key
+        except (SipParserError, RuntimeError, ValueError, KeyError, TypeError, IndexError) as e:
+            # sip_parser raises RuntimeError/ValueError for malformed values
+            logger.debug("Dropping SIP message with an unparsable Via or CSeq: %s", e)
+            return
+
+        if key is None:
+            logger.debug("Dropping SIP message without Via or CSeq")
+            return
+
+        if message.type == SipMessage.TYPE_RESPONSE:
+            client = self.client_transactions.get(key)
+            if client is not None:
+                client.receive_response(message)
+            elif self.on_stray_response is not None:
+                self.on_stray_response(message, addr)
+            return
+
+        server = self.server_transactions.get(key)
+        if server is not None:
+            server.receive_request(message)
+        elif message.method == "ACK":
+            if self.on_request is not None:
+                self.on_request(None, message)
+        else:
+            server = ServerTransaction(self, key, message, addr, reliable)
+            self.server_transactions[key] = server
+            server.start()
+            if self.on_request is not None:
+                self.on_request(server, message)
+
+    def find_invite(self, cancel: SipMessage) -> Optional[ServerTransaction]:
+        """ The server INVITE transaction a CANCEL request is for (RFC 3261 9.2) """
+        key = cancel.transaction_key
+        if key is None:
+            return None
+
+        if len(key) == 3:
+            key = key[:2] + ("INVITE",)
+        else:
+            key = key[:4] + ("INVITE",) + key[5:]
+
+        return self.server_transactions.get(key)
+
+    def _remove(self, transaction: Transaction):
+        if isinstance(transaction, ClientTransaction):
+            table: Dict[TransactionKey, Any] = self.client_transactions
+        else:
+            table = self.server_transactions
+
+        if table.get(transaction.key) is transaction:
+            del table[transaction.key]
@@ -0,0 +1,262 @@
+"""
+asyncio UDP and TCP transports for SIP.
+
+Incoming data is framed (TCP), parsed with SipMessage.from_bytes and queued for an async
+handler, called as `await handler(message, addr, endpoint)`; it can answer through
+endpoint.send(). Outgoing messages are buffered and written once per event loop iteration.
+
+When the handler falls behind and the queue fills up, TCP connections stop reading from
+the socket until it drains, while UDP datagrams are dropped (and counted), as there's
+no way to push back on the sender.
+"""
+import abc
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple, Union
+
+from sip_framer import SipStreamFramer, KEEPALIVE_PING, KEEPALIVE_PONG
+from sip_message import SipMessage
+from exceptions import SipParserError
+
+logger = logging.getLogger(__name__)
+
+Address = Tuple[Any, ...]
+Handler = Callable[[SipMessage, Address, "SipEndpoint"], Awaitable[None]]
+
+DEFAULT_QUEUE_SIZE = 1024
+
+
+def _to_bytes(message: Union[SipMessage, bytes, str]) -> bytes:
+    if isinstance(message, SipMessage):
+        return message.to_bytes()
+
+    if isinstance(message, str):
+        message = message.encode("utf-8")
+
+    return message
+
+
+class SipEndpoint(abc.ABC):
+    """ Common part of the transports: the queue of received messages, the tasks running the
+        handler on them, and the batching of outgoing messages
+    """
+
+    def __init__(self, handler: Handler, queue_size: int = DEFAULT_QUEUE_SIZE, concurrency: int = 1):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.transport: Optional[asyncio.BaseTransport] = None
+        self.received = 0
+        self.dropped = 0
+        self.parse_errors = 0
+
+        self._workers: List[asyncio.Task] = []
+        self._outgoing: List[Tuple[bytes, Optional[Address]]] = []
+        self._flush_scheduled = False
+
+    def _start(self, transport: asyncio.BaseTransport):
+        self.transport = transport
+        self._workers = [asyncio.ensure_future(self._work()) for _ in range(self.concurrency)]
+
+    def _stop(self):
+        for worker in self._workers:
+            worker.cancel()
+
+        self._workers = []
+
+    def _parse(self, data: bytes) -> Optional[SipMessage]:
+        try:
+            return SipMessage.from_bytes(data)
+        except (SipParserError, ValueError, RuntimeError) as e:
+            self.parse_errors += 1
+            logger.debug("Dropping unparsable SIP message: %s", e)
+            return None
+
+    async def _work(self):
+        while True:
+            message, addr = await self.queue.get()
+            try:
+                await self.handler(message, addr, self)
+            except Exception:
+                logger.exception("SIP message handler failed")
+            finally:
+                self.queue.task_done()
+                self._dequeued()
+
+    def _dequeued(self):
+        pass
+
+    def send(self, message: Union[SipMessage, bytes, str], addr: Optional[Address] = None):
+        """ Queues a message to be written at the end of the current loop iteration """
+        self._outgoing.append((_to_bytes(message), addr))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        outgoing, self._outgoing = self._outgoing, []
+        if self.transport is None or self.transport.is_closing():
+            return
+
+        self._write(outgoing)
+
+    @abc.abstractmethod
+    def _write(self, outgoing: List[Tuple[bytes, Optional[Address]]]):
+        """ Writes the messages queued during a loop iteration to the transport """
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+class SipDatagramProtocol(SipEndpoint, asyncio.DatagramProtocol):
+    """ SIP over UDP: each datagram is a message. Messages sent need an addr """
+
+    def connection_made(self, transport: asyncio.BaseTransport):
+        self._start(transport)
+
+    def connection_lost(self, exc: Optional[Exception]):
+        self._stop()
+
+    def datagram_received(self, data: bytes, addr: Address):
+        if not data.strip():
+            return  # CRLF keepalive
+
+        self._received(data, addr)
+
+    def _received(self, data: bytes, addr: Address):
+        message = self._parse(data)
+        if message is None:
+            return
+
+        self.received += 1
+        try:
+            self.queue.put_nowait((message, addr))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def error_received(self, exc: Exception):
+        logger.debug("UDP error: %s", exc)
+
+    def _write(self, outgoing: List[Tuple[bytes, Optional[Address]]]):
+        sendto = self.transport.sendto  # type: ignore[union-attr]
+        for data, addr in outgoing:
+            sendto(data, addr)
+
+
+class SipStreamProtocol(SipEndpoint, asyncio.Protocol):
+    """ SIP over TCP (or TLS) for one connection. Messages are sent back on the connection
+        (addr is ignored) and CRLF keepalive pings are answered with pongs
+    """
+
+    def __init__(self, handler: Handler, queue_size: int = DEFAULT_QUEUE_SIZE, concurrency: int = 1):
+        super().__init__(handler, queue_size, concurrency)
+        self.framer = SipStreamFramer(on_keepalive=self._on_keepalive)
+        self.peer: Optional[Address] = None
+
+        # Messages already read can't be dropped, so the queue is unbounded and the
+        # connection stops being read past queue_size, until it's half empty
+        self.queue = asyncio.Queue()
+        self._reading_paused = False
+        self._pause_at = queue_size
+        self._resume_at = max(queue_size // 2, 1)
+        self._can_write = asyncio.Event()
+        self._can_write.set()
+
+    def connection_made(self, transport: asyncio.BaseTransport):
+        self.peer = transport.get_extra_info("peername")
+        self._start(transport)
+
+    def connection_lost(self, exc: Optional[Exception]):
+        self._stop()
+        self._can_write.set()
+
+    def _on_keepalive(self, keepalive: bytes):
+        if keepalive == KEEPALIVE_PING:
+            self.send(KEEPALIVE_PONG)
+
+    def data_received(self, data: bytes):
+        try:
+            raw_messages = self.framer.feed(data)
+        except SipParserError as e:
+            logger.debug("Closing unframeable SIP stream from %s: %s", self.peer, e)
+            self.parse_errors += 1
+            self.transport.close()  # type: ignore[union-attr]
+            return
+
+        for raw in raw_messages:
+            self._received(raw, self.peer)
+
+        if self.queue.qsize() >= self._pause_at and not self._reading_paused:
+            self._reading_paused = True
+            self.transport.pause_reading()  # type: ignore[union-attr]
+
+    def _received(self, data: bytes, addr: Address):
+        message = self._parse(data)
+        if message is not None:
+            self.received += 1
+            self.queue.put_nowait((message, addr))
+
+    def _dequeued(self):
+        if self._reading_paused and self.queue.qsize() <= self._resume_at:
+            self._reading_paused = False
+            self.transport.resume_reading()  # type: ignore[union-attr]
+
+    def pause_writing(self):
+        self._can_write.clear()
+
+    def resume_writing(self):
+        self._can_write.set()
+
+    async def drain(self):
+        """ Waits until the transport's write buffer is below its high-water mark """
+        await self._can_write.wait()
+
+    def _write(self, outgoing: List[Tuple[bytes, Optional[Address]]]):
+        self.transport.writelines([data for data, _ in outgoing])  # type: ignore[union-attr]
+
+
+async def create_udp_endpoint(
+    handler: Handler,
+    host: str = "127.0.0.1",
+    port: int = 5060,
+    reuse_port: bool = False,
+    **kwargs,
+) -> SipDatagramProtocol:
+    """ Listens for SIP over UDP. kwargs are passed to SipDatagramProtocol """
+    loop = asyncio.get_running_loop()
+    _, protocol = await loop.create_datagram_endpoint(
+        lambda: SipDatagramProtocol(handler, **kwargs),
+        local_addr=(host, port),
+        reuse_port=reuse_port,
+    )
+    return protocol
+
+
+async def start_tcp_server(
+    handler: Handler,
+    host: str = "127.0.0.1",
+    port: int = 5060,
+    ssl: Any = None,
+    reuse_port: bool = False,
+    **kwargs,
+) -> asyncio.AbstractServer:
+    """ Listens for SIP over TCP (TLS if an ssl context is given), one SipStreamProtocol per
+        connection. kwargs are passed to SipStreamProtocol
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.create_server(
+        lambda: SipStreamProtocol(handler, **kwargs), host, port, ssl=ssl, reuse_port=reuse_port
+    )
+
+
+async def open_tcp_connection(
+    handler: Handler, host: str, port: int, ssl: Any = None, **kwargs
+) -> SipStreamProtocol:
+    """ Connects to a SIP peer over TCP (TLS if an ssl context is given) """
+    loop = asyncio.get_running_loop()
+    _, protocol = await loop.create_connection(
+        lambda: SipStreamProtocol(handler, **kwargs), host, port, ssl=ssl
+    )
+    return protocol
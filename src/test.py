@@ -1,6 +1,7 @@
 import textwrap
 import json
 from sip_message import SipMessage
+from sip_fields import to_builtin
 def prepare_msg(msg: str):
     # Message lines must be CRLF-terminated and not indented
     return textwrap.dedent(msg).replace("\n", "\r\n")
@@ -93,4 +94,4 @@ register = """\
 original_message = prepare_msg(invite)
 sip_msg = SipMessage.from_string(original_message)
 
-print(json.dumps(sip_msg.headers))
\ No newline at end of file
+print(json.dumps(sip_msg.headers, default=to_builtin))
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+Hashed timing wheel: O(1) timer insertion and cancellation for very large numbers of timers
+"""
+import asyncio
+import math
+import time
+from typing import Any, Callable, List, Optional, Set
+
+
+class Timer:
+    __slots__ = ("tick", "slot", "callback", "args")
+
+    def __init__(self, tick: int, slot: int, callback: Callable, args: tuple):
+        self.tick = tick
+        self.slot = slot
+        self.callback = callback
+        self.args = args
+
+
+class TimingWheel:
+    """ Timers are hashed by their expiry tick into a ring of slots. Each tick only the slot
+        of that tick is looked at, firing the timers due (the others are for a later turn).
+
+        advance() fires the expired timers and must be called regularly, either by hand
+        (with a custom clock) or from an asyncio loop with attach()
+    """
+
+    def __init__(
+        self,
+        tick: float = 0.01,
+        size: int = 4096,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.tick_length = tick
+        self.size = size
+        self.clock = clock
+
+        self._slots: List[Set[Timer]] = [set() for _ in range(size)]
+        self._start = clock()
+        self._current = 0  # Last tick processed
+        self._count = 0
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self):
+        return self._count
+
+    def schedule(self, delay: float, callback: Callable, *args: Any) -> Timer:
+        """ Calls callback(*args) after delay seconds (rounded up to the tick length).
+
+            The expiry is counted from the clock, not from the last tick processed, so a
+            timer set while advance() lags behind doesn't fire early when it catches up
+        """
+        elapsed = self.clock() - self._start + delay
+        tick = max(self._current + 1, math.ceil(elapsed / self.tick_length))
+        timer = Timer(tick, tick % self.size, callback, args)
+        self._slots[timer.slot].add(timer)
+        self._count += 1
+        return timer
+
+    def cancel(self, timer: Timer):
+        slot = self._slots[timer.slot]
+        if timer in slot:
+            slot.remove(timer)
+            self._count -= 1
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """ Fires every timer due by now. Returns how many were fired """
+        if now is None:
+            now = self.clock()
+
+        target = int((now - self._start) / self.tick_length)
+        fired = 0
+        if target - self._current >= self.size:
+            # Every slot is due at least once: take them all in a single turn
+            due = []
+            for slot in self._slots:
+                expired = [timer for timer in slot if timer.tick <= target]
+                slot.difference_update(expired)
+                due += expired
+
+            self._current = target
+            due.sort(key=lambda timer: timer.tick)
+            return self._fire(due)
+
+        while self._current < target:
+            self._current += 1
+            slot = self._slots[self._current % self.size]
+            if not slot:
+                continue
+
+            due = [timer for timer in slot if timer.tick <= self._current]
+            if due:
+                slot.difference_update(due)
+                fired += self._fire(due)
+
+        return fired
+
+    def _fire(self, due: List[Timer]) -> int:
+        self._count -= len(due)
+        for timer in due:
+            timer.callback(*timer.args)
+
+        return len(due)
+
+    def attach(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """ Advances the wheel every tick from an asyncio loop """
+        loop = loop or asyncio.get_event_loop()
+
+        def run():
+            self._handle = loop.call_later(self.tick_length, run)
+            self.advance()
+
+        self._handle = loop.call_later(self.tick_length, run)
+
+    def detach(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
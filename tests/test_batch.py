@@ -0,0 +1,82 @@
+import pytest
+
+from exceptions import SipParserError
+from sip_batch import parse_many
+from sip_message import SipMessage
+
+
+def request(index: int) -> str:
+    return (
+        f"OPTIONS sip:bob@example.com SIP/2.0\r\n"
+        f"Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK{index}\r\n"
+        f"To: <sip:bob@example.com>\r\n"
+        f"From: <sip:alice@example.com>;tag={index}\r\n"
+        f"Call-ID: {index}@pc33.example.com\r\n"
+        f"CSeq: {index} OPTIONS\r\n"
+        f"Contact: <sip:alice@pc33.example.com>, <sip:alice@192.0.2.4>\r\n"
+        f"Content-Length: 5\r\n"
+        f"\r\n"
+        f"hello"
+    )
+
+
+RESPONSE = (
+    "SIP/2.0 200 OK\r\n"
+    "Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK1\r\n"
+    "CSeq: 1 OPTIONS\r\n"
+    "Content-Length: 0\r\n"
+    "\r\n"
+)
+MESSAGES = [request(i) for i in range(1, 20)] + [RESPONSE]
+
+
+def assert_same_message(message: SipMessage, raw: str):
+    expected = SipMessage.from_string(raw)
+    assert message.type == expected.type
+    if expected.type == SipMessage.TYPE_REQUEST:
+        assert (message.method, message.uri) == (expected.method, expected.uri)
+    else:
+        assert (message.status, message.reason) == (expected.status, expected.reason)
+    assert message.headers == expected.headers
+    assert message.content == expected.content
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_round_trip_in_order(workers):
+    results = list(parse_many(MESSAGES, workers=workers, chunksize=3))
+    assert [result.index for result in results] == list(range(len(MESSAGES)))
+    for result, raw in zip(results, MESSAGES):
+        assert result.error is None
+        assert_same_message(result.message, raw)
+
+
+def test_as_completed():
+    results = list(parse_many(MESSAGES, workers=2, chunksize=4, ordered=False))
+    assert sorted(result.index for result in results) == list(range(len(MESSAGES)))
+    for result in results:
+        assert_same_message(result.message, MESSAGES[result.index])
+
+
+def test_bytes_input():
+    (result,) = parse_many([request(1).encode()], workers=1)
+    assert_same_message(result.message, request(1))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_errors_do_not_abort_the_batch(workers):
+    raw = [
+        request(1),
+        "not a SIP message",
+        request(2).replace("CSeq: 2 OPTIONS", "CSeq: OPTIONS"),
+        request(3),
+    ]
+    results = list(parse_many(raw, workers=workers, chunksize=2))
+
+    assert [result.message is None for result in results] == [False, True, True, False]
+    assert isinstance(results[1].error, SipParserError)
+    assert "CSeq" in str(results[2].error)
+    assert results[3].message.headers["cseq"]["seq"] == 3
+
+
+def test_empty_input():
+    assert list(parse_many([], workers=2)) == []
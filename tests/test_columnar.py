@@ -0,0 +1,79 @@
+import warnings
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from sip_columnar import CallSetupStats, ColumnarExporter, call_id_hash, status_histogram
+from sip_message import SipMessage
+
+INVITE = (
+    "INVITE sip:bob@example.com SIP/2.0\r\n"
+    "Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK{call}\r\n"
+    "To: Bob <sip:bob@example.com>\r\n"
+    "From: Alice <sip:alice@example.com>;tag=1928301774\r\n"
+    "Call-ID: {call}\r\n"
+    "CSeq: 1 INVITE\r\n"
+    "Content-Length: 0\r\n"
+    "\r\n"
+)
+RESPONSE = (
+    "SIP/2.0 {status} Reason\r\n"
+    "Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK{call}\r\n"
+    "To: Bob <sip:bob@example.com>;tag=a6c85cf\r\n"
+    "From: Alice <sip:alice@example.com>;tag=1928301774\r\n"
+    "Call-ID: {call}\r\n"
+    "CSeq: 1 INVITE\r\n"
+    "Content-Length: 0\r\n"
+    "\r\n"
+)
+
+
+def invite(call: str) -> SipMessage:
+    return SipMessage.from_string(INVITE.format(call=call))
+
+
+def response(call: str, status: int) -> SipMessage:
+    return SipMessage.from_string(RESPONSE.format(call=call, status=status))
+
+
+def test_export():
+    messages = [(1.0, invite("a")), (1.5, response("a", 180)), (2.0, response("a", 200))]
+    chunks = list(ColumnarExporter(chunk_size=2).export(messages))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert list(chunks[0]["status"]) == [0, 180]
+    assert chunks[0]["call_id_hash"][0] == call_id_hash("a")
+    assert chunks[0].decode("from_user") == ["alice", "alice"]
+    assert status_histogram(chunks[1])[200] == 1
+
+
+def test_call_setup():
+    messages = [
+        (0.0, invite("a")), (0.0, invite("b")), (0.1, invite("a")),
+        (1.0, response("a", 180)), (3.0, response("a", 200)), (4.0, response("b", 486)),
+    ]
+    stats = CallSetupStats()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        for chunk in ColumnarExporter().export(messages):
+            result = stats.update(chunk)
+
+    assert (stats.attempts, stats.completed, stats.answered, stats.pending) == (2, 2, 1, 0)
+    assert stats.asr == 0.5
+    assert stats.final_statuses[486] == 1
+    assert list(result["setup_time"][:1]) == [3.0]
+    assert list(result["post_dial_delay"]) == [1.0, 4.0]
+
+
+def test_call_setup_expiry():
+    stats = CallSetupStats(timeout=10)
+    exporter = ColumnarExporter()
+    stats.update(next(exporter.export([(0.0, invite("a"))])))
+    stats.update(next(exporter.export([(20.0, invite("b"))])))
+    assert (stats.pending, stats.expired) == (1, 1)
+
+
+def test_call_setup_needs_timestamps():
+    chunk = next(ColumnarExporter().export([invite("a")]))
+    with pytest.raises(ValueError):
+        CallSetupStats().update(chunk)
@@ -0,0 +1,61 @@
+import zlib
+
+import pytest
+
+from exceptions import SipParserError
+from sip_compression import MAGIC, MAX_DECOMPRESSED_SIZE, compress, decompress, is_compressed
+from sip_message import SipMessage
+
+INVITE = (
+    b"INVITE sip:bob@example.com SIP/2.0\r\n"
+    b"Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK776asdhds\r\n"
+    b"Max-Forwards: 70\r\n"
+    b"To: Bob <sip:bob@example.com>\r\n"
+    b"From: Alice <sip:alice@example.com>;tag=1928301774\r\n"
+    b"Call-ID: a84b4c76e66710@pc33.example.com\r\n"
+    b"CSeq: 314159 INVITE\r\n"
+    b"Contact: <sip:alice@pc33.example.com>\r\n"
+    b"Content-Length: 0\r\n"
+    b"\r\n"
+)
+
+
+def test_round_trip():
+    data = compress(INVITE)
+    assert is_compressed(data)
+    assert not is_compressed(INVITE)
+    assert len(data) < len(INVITE)
+    assert decompress(data) == INVITE
+    assert decompress(bytearray(data)) == INVITE
+
+
+def test_message_round_trip():
+    message = SipMessage.from_bytes(INVITE)
+    for compact in (False, True):
+        data = message.to_bytes(compact=compact, compressed=True)
+        assert is_compressed(data)
+        parsed = SipMessage.from_bytes(data)
+        assert parsed.stringify() == message.stringify(compact)
+        assert parsed.headers["from"] == message.headers["from"]
+
+
+def test_size_limit():
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    bomb = MAGIC + compressor.compress(b"\0" * (MAX_DECOMPRESSED_SIZE + 1)) + compressor.flush()
+    assert len(bomb) < 1024
+    with pytest.raises(SipParserError):
+        decompress(bomb)
+
+    with pytest.raises(SipParserError):
+        SipMessage.from_bytes(bomb)
+
+
+def test_invalid_data():
+    with pytest.raises(SipParserError):
+        decompress(INVITE)
+
+    with pytest.raises(SipParserError):
+        decompress(compress(INVITE)[:-4])
+
+    with pytest.raises(SipParserError):
+        decompress(MAGIC + b"\xff" * 16)
@@ -0,0 +1,108 @@
+from sip_dialog import DialogTable
+from sip_message import SipMessage
+
+INVITE = (
+    b"INVITE sip:bob@example.com SIP/2.0\r\n"
+    b"Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK776asdhds\r\n"
+    b"To: Bob <sip:bob@example.com>\r\n"
+    b"From: Alice <sip:alice@example.com>;tag=1928301774\r\n"
+    b"Call-ID: a84b4c76e66710@pc33.example.com\r\n"
+    b"CSeq: 314159 INVITE\r\n"
+    b"Content-Length: 0\r\n"
+    b"\r\n"
+)
+OK = (
+    b"SIP/2.0 200 OK\r\n"
+    b"Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK776asdhds\r\n"
+    b"To: Bob <sip:bob@example.com>;tag=a6c85cf\r\n"
+    b"From: Alice <sip:alice@example.com>;tag=1928301774\r\n"
+    b"Call-ID: a84b4c76e66710@pc33.example.com\r\n"
+    b"CSeq: 314159 INVITE\r\n"
+    b"Content-Length: 0\r\n"
+    b"\r\n"
+)
+# The BYE from Bob, with the tags the other way around
+BYE = (
+    b"BYE sip:alice@pc33.example.com SIP/2.0\r\n"
+    b"Via: SIP/2.0/UDP 192.0.2.4;branch=z9hG4bKnashds10\r\n"
+    b"To: Alice <sip:alice@example.com>;tag=1928301774\r\n"
+    b"From: Bob <sip:bob@example.com>;tag=a6c85cf\r\n"
+    b"Call-ID: a84b4c76e66710@pc33.example.com\r\n"
+    b"CSeq: 231 BYE\r\n"
+    b"Content-Length: 0\r\n"
+    b"\r\n"
+)
+
+
+def test_lookup_from_both_sides():
+    table = DialogTable()
+    ok, bye = SipMessage.from_bytes(OK), SipMessage.from_bytes(BYE)
+    table.add(ok, "call")
+    assert table.get(ok) == "call"
+    assert table.get(bye) == "call"
+    assert bye in table
+    assert len(table) == 1
+    assert list(table) == [ok.dialog_key]
+
+    assert table.remove(bye) == "call"
+    assert table.get(ok) is None
+    assert len(table) == 0
+
+
+def test_early_dialog_matches_and_confirms():
+    table = DialogTable()
+    invite, ok, bye = (SipMessage.from_bytes(data) for data in (INVITE, OK, BYE))
+    table.add(invite, "call")
+    assert table.get(ok) == "call"
+    assert table.get(bye) == "call"
+
+    table.confirm(invite.dialog_key, ok)
+    assert len(table) == 1
+    assert list(table) == [ok.dialog_key]
+    assert table.get(invite) is None
+    assert table.get(bye) == "call"
+
+
+def test_iteration_with_shared_dialog_objects():
+    table = DialogTable()
+    state = {}
+    keys = [("call-1", "a", "b"), ("call-2", "c", "d"), ("call-3", "e", None)]
+    for key in keys:
+        table.add(key, state)
+
+    assert len(table) == 3
+    assert list(table) == keys
+
+
+def test_unknown_and_missing_keys():
+    table = DialogTable()
+    assert table.get(None, "default") == "default"
+    assert table.get(("call", "a", "b")) is None
+    assert table.remove(("call", "a", "b")) is None
+    assert len(table) == 0
+
+
+def test_forked_dialogs():
+    table = DialogTable()
+    invite, ok = SipMessage.from_bytes(INVITE), SipMessage.from_bytes(OK)
+    call_id, from_tag, _ = ok.dialog_key
+    forks = [(call_id, from_tag, "fork-1"), (call_id, from_tag, "fork-2")]
+
+    table.add(invite, "early")
+    for fork in forks:
+        table.add(fork, fork)
+    assert len(table) == 3
+    assert list(table) == [invite.dialog_key] + forks
+    assert table.get((call_id, "fork-2", from_tag)) == forks[1]
+    assert table.get(ok) == "early"
+
+    # Adding one again (from either side) doesn't count it twice
+    table.add((call_id, "fork-1", from_tag), forks[0])
+    assert len(table) == 3
+
+    assert table.remove((call_id, "fork-1", from_tag)) == forks[0]
+    assert table.remove(forks[1]) == forks[1]
+    assert table.remove(invite) == "early"
+    assert len(table) == 0
+    assert table.remove(forks[0]) is None
+    assert len(table) == 0
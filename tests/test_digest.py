@@ -0,0 +1,137 @@
+from sip_digest import DigestAuthenticator, compute_ha1, compute_response
+from sip_message import SipMessage
+
+REALM = "example.com"
+URI = "sip:example.com"
+REGISTER = (
+    "REGISTER sip:example.com SIP/2.0\r\n"
+    "Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bKnashds7\r\n"
+    "To: Alice <sip:alice@example.com>\r\n"
+    "From: Alice <sip:alice@example.com>;tag=456248\r\n"
+    "Call-ID: 843817637684230@998sdasdh09\r\n"
+    "CSeq: 1826 REGISTER\r\n"
+    "{authorization}"
+    "Content-Length: 0\r\n"
+    "\r\n"
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1700000000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def authenticator(clock=None, **kwargs) -> DigestAuthenticator:
+    passwords = {"alice": "secret"}
+    return DigestAuthenticator(
+        REALM, get_password=lambda username, realm: passwords.get(username),
+        clock=clock or FakeClock(), **kwargs
+    )
+
+
+def register(nonce: str, nc: int = 1, password: str = "secret", algorithm: str = "MD5") -> SipMessage:
+    """ A REGISTER with the credentials a client would compute """
+    ha1 = compute_ha1("alice", REALM, password, algorithm)
+    nc_value = f"{nc:08x}"
+    response = compute_response(ha1, algorithm, "REGISTER", URI, nonce, "auth", nc_value, "0a4f113b")
+    authorization = (
+        f'Authorization: Digest username="alice", realm="{REALM}", nonce="{nonce}", uri="{URI}", '
+        f'response="{response}", algorithm={algorithm}, qop=auth, nc={nc_value}, cnonce="0a4f113b"\r\n'
+    )
+    return SipMessage.from_string(REGISTER.format(authorization=authorization))
+
+
+def test_challenge():
+    auth = authenticator()
+    request = SipMessage.from_string(REGISTER.format(authorization=""))
+    assert auth.verify(request) == (False, None, False, "no credentials for the realm")
+
+    response = auth.build_challenge(request)
+    assert response.status == 401
+    challenges = response.headers["www-authenticate"]
+    assert [challenge.params["algorithm"] for challenge in challenges] == ["SHA-256", "MD5"]
+    assert "stale" not in challenges[0].params
+
+
+def test_verify():
+    auth = authenticator()
+    nonce = auth.make_nonce()
+    for algorithm in ("MD5", "SHA-256"):
+        result = auth.verify(register(nonce, algorithm=algorithm, nc=1 if algorithm == "MD5" else 2))
+        assert result == (True, "alice", False, None)
+
+
+def test_wrong_password_and_unknown_user():
+    auth = authenticator()
+    result = auth.verify(register(auth.make_nonce(), password="guess"))
+    assert result == (False, "alice", False, "wrong response")
+
+    request = register(auth.make_nonce())
+    cred = request.headers["authorization"][0]
+    cred.params["username"] = "mallory"
+    assert auth.verify_credentials(cred, "REGISTER").reason == "unknown user"
+
+
+def test_replay():
+    auth = authenticator()
+    nonce = auth.make_nonce()
+    assert auth.verify(register(nonce, nc=1)).ok
+    assert auth.verify(register(nonce, nc=1)) == (False, "alice", False, "replayed nonce count")
+    assert auth.verify(register(nonce, nc=2)).ok
+    assert not auth.verify(register(nonce, nc=2)).ok
+
+
+def test_stale_nonce():
+    clock = FakeClock()
+    auth = authenticator(clock, nonce_lifetime=60)
+    nonce = auth.make_nonce()
+    clock.now += 61
+    assert auth.verify(register(nonce)) == (False, "alice", True, "stale nonce")
+
+
+def test_forged_nonce():
+    auth = authenticator()
+    nonce = auth.make_nonce()
+    forged = nonce[:8] + "0" * 16 + nonce[24:]
+    assert auth.verify(register(forged)).reason == "invalid nonce"
+
+    other = authenticator(secret=b"another secret")
+    assert auth.verify(register(other.make_nonce())).reason == "invalid nonce"
+
+
+def test_nonces_are_stateless():
+    # Challenges store nothing, a flood of them can't push out the nonces in use
+    clock = FakeClock()
+    auth = authenticator(clock, nonce_cache_size=2)
+    nonce = auth.make_nonce()
+    assert auth.verify(register(nonce, nc=1)).ok
+    for _ in range(10):
+        auth.build_challenge(SipMessage.from_string(REGISTER.format(authorization="")))
+
+    assert len(auth.nonce_counts) == 1
+    assert auth.verify(register(nonce, nc=1)).reason == "replayed nonce count"
+
+    # Any process sharing the secret verifies the nonce, tracking it from its first use
+    other = authenticator(clock, secret=auth.secret)
+    assert other.verify(register(auth.make_nonce(), nc=1)).ok
+
+
+def test_forget_user():
+    calls = []
+
+    def get_password(username, realm):
+        calls.append(username)
+        return "secret"
+
+    auth = DigestAuthenticator(REALM, get_password=get_password, clock=FakeClock())
+    assert auth.verify(register(auth.make_nonce())).ok
+    assert auth.verify(register(auth.make_nonce())).ok
+    assert calls == ["alice"]
+
+    auth.forget_user("alice")
+    assert len(auth.ha1_cache) == 0
+    assert auth.verify(register(auth.make_nonce())).ok
+    assert calls == ["alice", "alice"]
@@ -0,0 +1,111 @@
+import pytest
+
+import sip_editor
+from exceptions import SipParserError
+from sip_editor import SipMessageEditor
+from sip_message import SipMessage
+
+INVITE = (
+    b"INVITE sip:bob@example.com SIP/2.0\r\n"
+    b"v: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK776asdhds\r\n"
+    b"Max-Forwards: 70\r\n"
+    b"ROUTE: <sip:proxy.example.com;lr>, <sip:edge.example.net;lr>\r\n"
+    b"Route: <sip:core.example.net;lr>\r\n"
+    b"To: Bob <sip:bob@example.com>\r\n"
+    b"From: Alice <sip:alice@example.com>;tag=1928301774\r\n"
+    b"i: a84b4c76e66710@pc33.example.com\r\n"
+    b"CSeq: 314159 INVITE\r\n"
+    b"Content-Length: 5\r\n"
+    b"\r\n"
+    b"Hello"
+)
+
+
+def at(host):
+    return lambda uri: uri.host == host
+
+
+def test_round_trip():
+    assert SipMessageEditor(INVITE).to_bytes() == INVITE
+    assert SipMessageEditor(bytearray(b"\r\n" + INVITE)).to_bytes() == INVITE
+
+
+def test_header_names_are_normalized():
+    editor = SipMessageEditor(INVITE)
+    assert editor.header_value("Call-ID") == editor.header_value("i") == "a84b4c76e66710@pc33.example.com"
+    assert editor.header_value("VIA") == editor.header_value("v")
+    assert editor.top_route().uri.host == "proxy.example.com"
+    assert editor.header_value("subject") is None
+
+
+def test_via_push_and_pop():
+    editor = SipMessageEditor(INVITE)
+    editor.push_via("SIP/2.0/UDP proxy.example.com;branch=z9hG4bKproxy1")
+    assert editor.top_via().host == "proxy.example.com"
+    message = SipMessage.from_bytes(editor.to_bytes())
+    assert [via.host for via in message.headers["via"]] == ["proxy.example.com", "pc33.example.com"]
+
+    assert editor.pop_via().params["branch"] == "z9hG4bKproxy1"
+    assert editor.to_bytes() == INVITE
+
+
+def test_max_forwards():
+    editor = SipMessageEditor(INVITE)
+    assert editor.decrement_max_forwards() == 70
+    assert editor.header_value("max-forwards") == "69"
+
+    editor = SipMessageEditor(INVITE.replace(b"Max-Forwards: 70\r\n", b""))
+    assert editor.decrement_max_forwards() == 70
+    assert SipMessage.from_bytes(editor.to_bytes()).headers["max-forwards"] == 69
+
+    # 0 is left as is, the request must not be forwarded
+    data = INVITE.replace(b"Max-Forwards: 70", b"Max-Forwards: 0")
+    editor = SipMessageEditor(data)
+    assert editor.decrement_max_forwards() == 0
+    assert editor.to_bytes() == data
+
+    with pytest.raises(SipParserError):
+        SipMessageEditor(INVITE.replace(b"Max-Forwards: 70", b"Max-Forwards: many")).decrement_max_forwards()
+
+
+def test_record_route():
+    editor = SipMessageEditor(INVITE)
+    editor.insert_record_route("<sip:proxy.example.com;lr>")
+    editor.insert_record_route("<sip:edge.example.com;lr>")
+    record_routes = SipMessage.from_bytes(editor.to_bytes()).headers["record-route"]
+    assert [route.uri.host for route in record_routes] == ["edge.example.com", "proxy.example.com"]
+
+
+def test_pop_route_if():
+    editor = SipMessageEditor(INVITE)
+    assert editor.pop_route_if(at("elsewhere.example.com")) is None
+    assert editor.to_bytes() == INVITE
+
+    # Values are removed one by one, then the lines
+    hosts = [editor.pop_route_if(lambda uri: True).uri.host for _ in range(3)]
+    assert hosts == ["proxy.example.com", "edge.example.net", "core.example.net"]
+    assert editor.pop_route_if(lambda uri: True) is None
+    assert b"oute" not in editor.to_bytes()
+
+
+def test_pop_route_if_parses_once(monkeypatch):
+    calls = []
+    scan = sip_editor.scan_aor_with_uri
+
+    def counting_scan(data, pos=0):
+        calls.append(data)
+        return scan(data, pos)
+
+    monkeypatch.setattr(sip_editor, "scan_aor_with_uri", counting_scan)
+    editor = SipMessageEditor(INVITE)
+    assert editor.pop_route_if(at("proxy.example.com")).uri.host == "proxy.example.com"
+    assert len(calls) == 1
+    assert editor.header_value("route") == "<sip:edge.example.net;lr>"
+
+
+def test_malformed():
+    with pytest.raises(SipParserError):
+        SipMessageEditor(INVITE.replace(b"\r\n\r\n", b"\r\n"))
+
+    with pytest.raises(SipParserError):
+        SipMessageEditor(INVITE.replace(b"Max-Forwards: 70", b"Max-Forwards 70"))
@@ -0,0 +1,107 @@
+import copy
+import json
+import pickle
+import sys
+import tracemalloc
+
+import pytest
+
+from sip_fields import AuthCredentials, CSeq, NameAddr, SipUri, Via, freeze, thaw, to_builtin
+from sip_parser import parse_via
+from sip_message import SipMessage
+
+INVITE = (
+    b"INVITE sip:bob@example.com SIP/2.0\r\n"
+    b"Via: SIP/2.0/UDP pc33.example.com:5060;branch=z9hG4bK776asdhds\r\n"
+    b"To: Bob <sip:bob@example.com>\r\n"
+    b"From: Alice <sip:alice@example.com>;tag=1928301774\r\n"
+    b"Call-ID: a84b4c76e66710@pc33.example.com\r\n"
+    b"CSeq: 314159 INVITE\r\n"
+    b"Contact: <sip:alice@pc33.example.com>\r\n"
+    b"Content-Length: 0\r\n"
+    b"\r\n"
+)
+
+
+def test_typed_values_have_a_dict_view():
+    headers = SipMessage.from_bytes(INVITE).headers
+    via, cseq = headers["via"][0], headers["cseq"]
+    assert isinstance(via, Via) and isinstance(cseq, CSeq)
+    assert via.host == via["host"] == via.get("host") == "pc33.example.com"
+    assert cseq == {"seq": 314159, "method": "INVITE"}
+    assert dict(cseq) == {"seq": 314159, "method": "INVITE"}
+    assert list(via) == ["version", "protocol", "host", "port", "params"]
+    assert headers["from"].params["tag"] == "1928301774"
+
+
+def test_auth_credentials_view():
+    cred = AuthCredentials("Digest", {"realm": "example.com", "nonce": "abc"})
+    assert dict(cred) == {"realm": "example.com", "nonce": "abc", "scheme": "Digest"}
+    cred["qop"] = "auth"
+    assert cred.params["qop"] == "auth"
+    assert "scheme" not in AuthCredentials(None, {})
+
+
+def test_headers_to_json():
+    headers = SipMessage.from_bytes(INVITE).headers
+    data = json.loads(json.dumps(headers, default=to_builtin))
+    assert data["cseq"] == {"seq": 314159, "method": "INVITE"}
+    assert data["via"][0]["params"] == {"branch": "z9hG4bK776asdhds"}
+
+
+def test_fields_are_fixed():
+    cseq = CSeq(1, "INVITE")
+    cseq["seq"] = 2
+    cseq.method = "BYE"
+    assert cseq == {"seq": 2, "method": "BYE"}
+    with pytest.raises(KeyError):
+        cseq["other"] = 1
+    with pytest.raises(TypeError):
+        del cseq["seq"]
+
+
+def test_copies_and_pickling():
+    uri = SipUri("sip", "bob", None, "example.com", None, {"transport": "tcp"}, {})
+    value = NameAddr("Bob", uri, {"tag": "a6c85cf"})
+    for other in (value.copy(), copy.deepcopy(value), pickle.loads(pickle.dumps(value))):
+        assert other == value and type(other) is NameAddr
+        other.uri.params["transport"] = "udp"
+
+    assert uri.params["transport"] == "tcp"
+    assert value.to_dict()["uri"] == dict(uri)
+
+
+def test_frozen_values():
+    uri = SipUri("sip", "bob", None, "example.com", None, {"transport": "tcp"}, {})
+    frozen = freeze(NameAddr("Bob", uri, {}))
+    with pytest.raises(TypeError):
+        frozen["name"] = "Eve"
+    with pytest.raises(TypeError):
+        frozen.uri.params["transport"] = "udp"
+
+    thawed = thaw(frozen)
+    thawed.uri.params["transport"] = "udp"
+    assert type(thawed) is NameAddr
+    assert frozen.uri.params["transport"] == "tcp"
+    assert pickle.loads(pickle.dumps(frozen)) == frozen
+
+
+def test_typed_values_are_smaller_than_dicts():
+    via = parse_via("SIP/2.0/UDP pc33.example.com:5060;branch=z9hG4bK776asdhds")[0]
+    assert not hasattr(via, "__dict__")
+    assert sys.getsizeof(via) < sys.getsizeof(via.to_dict())
+
+    def allocated(make):
+        tracemalloc.start()
+        values = [make(index) for index in range(10000)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del values
+        return size
+
+    params = {"branch": "z9hG4bK776asdhds"}
+    typed = allocated(lambda index: Via("2.0", "UDP", "pc33.example.com", index, params))
+    plain = allocated(lambda index: {
+        "version": "2.0", "protocol": "UDP", "host": "pc33.example.com", "port": index, "params": params,
+    })
+    assert typed < plain * 0.6
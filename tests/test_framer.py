@@ -0,0 +1,94 @@
+import pytest
+
+from sip_framer import SipStreamFramer, frame_stream, KEEPALIVE_PING, KEEPALIVE_PONG
+from exceptions import SipParserError
+
+OPTIONS = (
+    b"OPTIONS sip:bob@example.com SIP/2.0\r\n"
+    b"Via: SIP/2.0/TCP host.example.com;branch=z9hG4bK776asdhds\r\n"
+    b"CSeq: 1 OPTIONS\r\n"
+    b"Content-Length: 0\r\n"
+    b"\r\n"
+)
+MESSAGE = (
+    b"MESSAGE sip:bob@example.com SIP/2.0\r\n"
+    b"Via: SIP/2.0/TCP host.example.com;branch=z9hG4bK776asdhdt\r\n"
+    b"CSeq: 2 MESSAGE\r\n"
+    b"l: 13\r\n"
+    b"\r\n"
+    b"Hello\r\n\r\nBob!"
+)
+
+
+def test_split_at_every_byte():
+    stream = OPTIONS + MESSAGE + OPTIONS
+    for cut in range(1, len(stream)):
+        framer = SipStreamFramer()
+        messages = framer.feed(stream[:cut]) + framer.feed(stream[cut:])
+        assert messages == [OPTIONS, MESSAGE, OPTIONS]
+        assert framer.pending == 0
+
+
+def test_byte_by_byte():
+    assert list(frame_stream(bytes([b]) for b in MESSAGE + OPTIONS)) == [MESSAGE, OPTIONS]
+
+
+def test_body_is_delimited_by_content_length():
+    framer = SipStreamFramer()
+    # The body contains an empty line, the message only ends after its 13 bytes
+    assert framer.feed(MESSAGE[:-4]) == []
+    assert framer.feed(MESSAGE[-4:]) == [MESSAGE]
+
+
+def test_missing_content_length_means_empty_body():
+    message = OPTIONS.replace(b"Content-Length: 0\r\n", b"")
+    assert SipStreamFramer().feed(message + OPTIONS) == [message, OPTIONS]
+
+
+def test_keepalives():
+    keepalives = []
+    framer = SipStreamFramer(on_keepalive=keepalives.append)
+    messages = framer.feed(KEEPALIVE_PING + OPTIONS + KEEPALIVE_PONG)
+    messages += framer.feed(OPTIONS + KEEPALIVE_PING)
+    assert messages == [OPTIONS, OPTIONS]
+    assert keepalives == [KEEPALIVE_PING, KEEPALIVE_PONG, KEEPALIVE_PING]
+
+
+def test_keepalive_split_across_chunks():
+    keepalives = []
+    framer = SipStreamFramer(on_keepalive=keepalives.append)
+    assert framer.feed(b"\r\n") == []
+    assert keepalives == []
+    assert framer.feed(b"\r\n" + OPTIONS) == [OPTIONS]
+    assert keepalives == [KEEPALIVE_PING]
+
+
+@pytest.mark.parametrize("cut", [1, 2, 3])
+def test_ping_split_is_one_ping(cut):
+    keepalives = []
+    framer = SipStreamFramer(on_keepalive=keepalives.append)
+    assert framer.feed(OPTIONS + KEEPALIVE_PING[:cut]) == [OPTIONS]
+    assert framer.feed(KEEPALIVE_PING[cut:]) == []
+    assert keepalives == [KEEPALIVE_PING]
+    assert framer.pending == 0
+
+
+def test_trailing_pong_is_reported_with_the_next_chunk():
+    keepalives = []
+    framer = SipStreamFramer(on_keepalive=keepalives.append)
+    assert framer.feed(KEEPALIVE_PONG) == []
+    assert framer.pending == len(KEEPALIVE_PONG)
+    assert framer.feed(OPTIONS) == [OPTIONS]
+    assert keepalives == [KEEPALIVE_PONG]
+
+
+def test_oversized_headers():
+    framer = SipStreamFramer(max_message_size=64)
+    with pytest.raises(SipParserError):
+        framer.feed(b"OPTIONS sip:bob@example.com SIP/2.0\r\nX-Padding: " + b"x" * 100)
+
+
+def test_oversized_body():
+    framer = SipStreamFramer(max_message_size=200)
+    with pytest.raises(SipParserError):
+        framer.feed(OPTIONS.replace(b"Content-Length: 0", b"Content-Length: 1000"))
@@ -0,0 +1,73 @@
+import pytest
+
+from exceptions import SipParserError
+from sip_message import SipMessage
+
+HEAD = (
+    b"MESSAGE sip:bob@example.com SIP/2.0\r\n"
+    b"Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK776asdhds\r\n"
+    b"To: Bob <sip:bob@example.com>\r\n"
+    b"From: Alice <sip:alice@example.com>;tag=1928301774\r\n"
+    b"Call-ID: a84b4c76e66710@pc33.example.com\r\n"
+    b"CSeq: 1 MESSAGE\r\n"
+    b"Content-Type: text/plain\r\n"
+)
+
+
+def message_bytes(body: bytes) -> bytes:
+    return HEAD + b"Content-Length: %d\r\n\r\n" % len(body) + body
+
+
+def test_same_result_as_from_string():
+    data = message_bytes("Hello Bob".encode())
+    from_bytes = SipMessage.from_bytes(data)
+    from_string = SipMessage.from_string(data.decode())
+    assert from_bytes.method == from_string.method == "MESSAGE"
+    assert from_bytes.uri == from_string.uri
+    assert from_bytes.headers == from_string.headers
+    assert from_bytes.content == from_string.content == "Hello Bob"
+
+
+def test_buffer_types():
+    data = message_bytes(b"Hello")
+    for buffer in (bytearray(data), memoryview(data), b"\r\n  " + data):
+        message = SipMessage.from_bytes(buffer)
+        assert message.headers["cseq"]["seq"] == 1
+        assert bytes(message.body) == b"Hello"
+
+
+def test_body_is_a_view_of_the_buffer():
+    data = bytearray(message_bytes(b"Hello"))
+    message = SipMessage.from_bytes(data)
+    assert isinstance(message.body, memoryview)
+    assert message.body.obj is data
+
+
+def test_non_ascii_body():
+    body = "héllo wörld".encode() + b"\xff\x00\x81 binary"
+    message = SipMessage.from_bytes(message_bytes(body))
+    assert bytes(message.body) == body
+    assert message.content.startswith("héllo wörld")
+
+    # The text keeps the bytes that aren't UTF-8, they come back unchanged
+    copy = SipMessage.from_bytes(message_bytes(body))
+    copy.content = message.content
+    assert bytes(copy.body) == body
+
+
+def test_headers_are_parsed_when_read():
+    message = SipMessage.from_bytes(message_bytes(b""))
+    assert not message.headers.is_parsed("via")
+    assert message.headers["via"][0]["host"] == "pc33.example.com"
+    assert message.headers.is_parsed("via")
+
+
+def test_malformed():
+    with pytest.raises(SipParserError):
+        SipMessage.from_bytes(HEAD)  # No empty line after the headers
+
+    with pytest.raises(SipParserError):
+        SipMessage.from_bytes(b"HELLO\r\n\r\n")
+
+    with pytest.raises(SipParserError):
+        SipMessage.from_bytes(HEAD + b"Not a header\r\n\r\n")
@@ -0,0 +1,69 @@
+import pytest
+
+from sip_message import SipMessage
+
+INVITE = (
+    "INVITE sip:bob@example.com SIP/2.0\r\n"
+    "Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK776asdhds\r\n"
+    "v: SIP/2.0/UDP proxy.example.com;branch=z9hG4bK1\r\n"
+    "Max-Forwards: 70\r\n"
+    "To: Bob <sip:bob@example.com>\r\n"
+    "From: Alice <sip:alice@example.com>;tag=1928301774\r\n"
+    "Call-ID: a84b4c76e66710@pc33.example.com\r\n"
+    "CSeq: 314159 INVITE\r\n"
+    "Contact: <sip:alice@pc33.example.com>, <sip:alice@192.0.2.4>\r\n"
+    "Proxy-Authorization: Digest username=\"alice\", realm=\"example.com\", nonce=\"abc\"\r\n"
+    "Content-Length: 0\r\n"
+    "\r\n"
+)
+
+
+def test_same_headers_as_eager_parsing():
+    lazy = SipMessage.from_string(INVITE, lazy=True)
+    eager = SipMessage.from_string(INVITE)
+    assert lazy.headers == eager.headers
+    assert len(lazy.headers["via"]) == 2  # Long and compact lines of the same header
+
+
+def test_headers_are_parsed_when_first_read():
+    headers = SipMessage.from_string(INVITE, lazy=True).headers
+    assert not any(headers.is_parsed(name) for name in headers)
+
+    assert headers["cseq"]["seq"] == 314159
+    assert headers.is_parsed("cseq")
+    assert not headers.is_parsed("via")
+    assert not headers.is_parsed("proxy-authorization")
+
+    assert headers["via"] is headers["via"]  # Parsed once and cached
+
+
+def test_eager_parsing_resolves_every_header():
+    headers = SipMessage.from_string(INVITE).headers
+    assert all(headers.is_parsed(name) for name in headers)
+
+
+def test_parse_errors_are_raised_on_first_read():
+    raw = INVITE.replace("CSeq: 314159 INVITE", "CSeq: INVITE")
+    with pytest.raises(RuntimeError):
+        SipMessage.from_string(raw)
+
+    message = SipMessage.from_string(raw, lazy=True)
+    assert message.headers["call-id"] == "a84b4c76e66710@pc33.example.com"
+    with pytest.raises(RuntimeError):
+        message.headers["cseq"]
+
+
+def test_assigned_before_read():
+    message = SipMessage.from_string(INVITE, lazy=True)
+    message.headers["max-forwards"] = 69
+    del message.headers["proxy-authorization"]
+
+    assert message.headers["max-forwards"] == 69
+    assert "proxy-authorization" not in message.headers
+    assert "Max-Forwards: 69\r\n" in message.stringify()
+
+
+def test_unread_headers_are_serialized_as_received():
+    message = SipMessage.from_string(INVITE, lazy=True)
+    assert message.stringify() == INVITE
+    assert not message.headers.is_parsed("contact")
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from sip_loadgen import LoadUac, LoadUas, SCENARIOS
+from sip_message import SipMessage
+from sip_transaction import TransactionManager
+
+
+async def run_scenario(scenario: str, rate: float = 100, duration: float = 0.2):
+    uas = LoadUas()
+    endpoint = await uas.start("127.0.0.1", 0)
+    target = endpoint.transport.get_extra_info("sockname")
+    try:
+        uac = LoadUac(scenario, target, rate, duration, drain_timeout=2.0)
+        stats = await uac.run()
+    finally:
+        uas.close()
+    return stats, uas
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+def test_scenario_over_loopback(scenario):
+    stats, uas = asyncio.run(run_scenario(scenario))
+    report = stats.report()
+
+    assert report["started"] > 0
+    assert report["completed"] == report["started"]
+    assert report["failed"] == report["timeouts"] == report["unfinished"] == 0
+    assert report["statuses"] == {200: report["started"]}
+    assert uas.requests[scenario.upper()] == report["started"]
+
+
+def test_invite_and_bye_are_reported_apart():
+    stats, uas = asyncio.run(run_scenario("invite"))
+    report = stats.report()
+
+    assert set(report["methods"]) == {"INVITE", "BYE"}
+    calls = report["started"]
+    assert report["methods"]["INVITE"]["responses"] == calls
+    assert report["methods"]["BYE"]["responses"] == calls
+    assert report["methods"]["BYE"]["statuses"] == {200: calls}
+    assert uas.requests["ACK"] == calls
+
+
+def no_serialize(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("The message was serialized")
+
+    monkeypatch.setattr(SipMessage, "to_bytes", fail)
+    monkeypatch.setattr(SipMessage, "stringify", fail)
+
+
+def test_requests_are_sent_as_rendered(monkeypatch):
+    sent = []
+    uac = LoadUac("options", ("127.0.0.1", 5060), rate=1, duration=1)
+    uac._compile(("127.0.0.1", 5070))
+    no_serialize(monkeypatch)
+    uac.manager = TransactionManager(lambda data, addr: sent.append(data))
+    uac._host = "127.0.0.1"
+    uac._start()
+
+    assert len(sent) == 1
+    rendered = uac.templates["options"].render(call_id=f"1-{uac._run_id}@127.0.0.1", from_tag="1",
+                                               branch=f"z9hG4bK{uac._run_id}2")
+    assert sent[0] == rendered
+
+
+def test_uas_copies_request_lines(monkeypatch):
+    request = SipMessage.from_bytes(
+        b"INVITE sip:uas@127.0.0.1 SIP/2.0\r\n"
+        b"v: SIP/2.0/UDP 127.0.0.1:5070;branch=z9hG4bK1;rport\r\n"
+        b"Via: SIP/2.0/UDP 192.0.2.1;branch=z9hG4bK0\r\n"
+        b"f: <sip:loadgen@127.0.0.1>;tag=1\r\n"
+        b"t: <sip:uas@127.0.0.1>\r\n"
+        b"i: 1@127.0.0.1\r\n"
+        b"CSeq: 1 INVITE\r\n"
+        b"Content-Length: 0\r\n"
+        b"\r\n"
+    )
+    no_serialize(monkeypatch)
+    sent = []
+    uas = LoadUas(ringing=False)
+    uas.manager = TransactionManager(lambda data, addr: sent.append(data), on_request=uas._on_request)
+    uas._contact = "Contact: <sip:uas@127.0.0.1:5060>\r\n"
+    uas._sdp = "v=0\r\n"
+    uas.manager.receive(request, ("127.0.0.1", 5070))
+
+    assert sent == [
+        b"SIP/2.0 200 OK\r\n"
+        b"v: SIP/2.0/UDP 127.0.0.1:5070;branch=z9hG4bK1;rport\r\n"
+        b"Via: SIP/2.0/UDP 192.0.2.1;branch=z9hG4bK0\r\n"
+        b"f: <sip:loadgen@127.0.0.1>;tag=1\r\n"
+        b"t: <sip:uas@127.0.0.1>;tag=1\r\n"
+        b"i: 1@127.0.0.1\r\n"
+        b"CSeq: 1 INVITE\r\n"
+        b"Contact: <sip:uas@127.0.0.1:5060>\r\n"
+        b"Content-Type: application/sdp\r\n"
+        b"Content-Length: 5\r\n"
+        b"\r\n"
+        b"v=0\r\n"
+    ]
+    response = SipMessage.from_bytes(sent[0])
+    assert response.headers["to"]["params"]["tag"] == "1"
+
+
+def test_unknown_scenario():
+    with pytest.raises(ValueError):
+        LoadUac("subscribe", ("127.0.0.1", 5060), rate=1, duration=1)
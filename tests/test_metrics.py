@@ -0,0 +1,53 @@
+import pytest
+
+import sip_metrics
+from sip_message import SipMessage
+
+REQUEST = (
+    "{method} sip:bob@example.com SIP/2.0\r\n"
+    "Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK776asdhds\r\n"
+    "To: Bob <sip:bob@example.com>\r\n"
+    "From: Alice <sip:alice@example.com>;tag=1928301774\r\n"
+    "Call-ID: a84b4c76e66710@pc33.example.com\r\n"
+    "CSeq: 1 {method}\r\n"
+    "X-{method}: value\r\n"
+    "Content-Length: 0\r\n"
+    "\r\n"
+)
+
+
+@pytest.fixture
+def metrics():
+    yield sip_metrics.enable()
+    sip_metrics.disable()
+
+
+def test_counts(metrics):
+    for method in ("INVITE", "INVITE", "BYE"):
+        SipMessage.from_string(REQUEST.format(method=method))
+
+    data = sip_metrics.snapshot()
+    assert data["requests"] == {"INVITE": 2, "BYE": 1}
+    assert data["parse_seconds"]["count"] == 3
+    assert "sip_messages_parsed_total{type=\"request\",method=\"INVITE\"} 2" in sip_metrics.prometheus_text()
+
+
+def test_labels_are_bounded(metrics):
+    for index in range(50):
+        message = SipMessage.from_string(REQUEST.format(method=f"MADEUP{index}"))
+        message.headers["to"]
+        message.headers[f"x-madeup{index}"]
+
+    data = sip_metrics.snapshot()
+    assert data["requests"] == {sip_metrics.OTHER: 50}
+    assert set(data["header_parse"]) <= sip_metrics.PARSED_HEADERS | {sip_metrics.OTHER}
+    assert data["header_parse"]["to"]["count"] == 50
+
+
+def test_disable_removes_instrumentation():
+    from_string = SipMessage.__dict__["from_string"]
+    sip_metrics.enable()
+    sip_metrics.disable()
+    assert SipMessage.__dict__["from_string"] is from_string
+    assert sip_metrics.snapshot() == {}
+    assert sip_metrics.prometheus_text() == ""
@@ -0,0 +1,102 @@
+import pytest
+
+from exceptions import SipParserError
+from sip_message import SipMessage
+from sip_multipart import MultipartBody
+
+SDP = (
+    b"v=0\r\n"
+    b"o=- 1 1 IN IP4 192.0.2.1\r\n"
+    b"s=-\r\n"
+    b"c=IN IP4 192.0.2.1\r\n"
+    b"t=0 0\r\n"
+    b"m=audio 4000 RTP/AVP 0\r\n"
+)
+ISUP = bytes([0x01, 0x00, 0x49, 0x00, 0x00, 0x03, 0x02, 0x00, 0x07, 0x0D, 0x0A, 0x2D, 0x2D, 0xFF])
+
+BODY = (
+    b"--unique-boundary-1\r\n"
+    b"Content-Type: application/sdp\r\n"
+    b"\r\n"
+    + SDP
+    + b"\r\n--unique-boundary-1\r\n"
+    b"Content-Type: application/ISUP; version=itu-t92+\r\n"
+    b"Content-Disposition: signal;\r\n"
+    b"  handling=optional\r\n"
+    b"\r\n"
+    + ISUP
+    + b"\r\n--unique-boundary-1--\r\n"
+)
+
+
+def message(content_type: bytes, body: bytes = BODY) -> SipMessage:
+    return SipMessage.from_bytes(
+        b"INVITE sip:bob@example.com SIP/2.0\r\n"
+        b"Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK776asdhds\r\n"
+        b"Content-Type: " + content_type + b"\r\n"
+        b"Content-Length: %d\r\n"
+        b"\r\n" % len(body)
+        + body
+    )
+
+
+def test_parts():
+    parts = MultipartBody.from_message(message(b'multipart/mixed;boundary="unique-boundary-1"'))
+    assert len(parts) == 2
+
+    sdp, isup = parts
+    assert sdp.content_type == "application/sdp"
+    assert bytes(sdp.body) == SDP
+    assert isup.content_type == "application/isup"
+    assert isup.headers["content-disposition"] == "signal; handling=optional"
+    assert bytes(isup.body) == ISUP  # Binary, with a CRLF and "--" inside
+
+
+def test_bodies_are_views_of_the_message():
+    parts = MultipartBody(bytearray(BODY), "unique-boundary-1")
+    isup = parts.find("application/ISUP")
+    assert isinstance(isup.body, memoryview)
+    assert isup.body.obj is parts[0].body.obj
+
+
+def test_sdp():
+    parts = MultipartBody.from_message(message(b"multipart/mixed; boundary=unique-boundary-1"))
+    sdp = parts.sdp()
+    assert sdp.media_descriptions[0].media.port == 4000
+
+
+def test_not_multipart():
+    assert MultipartBody.from_message(message(b"application/sdp", SDP)) is None
+    assert MultipartBody.from_message(message(b"multipart/mixed;boundary=x")).sdp() is None
+
+
+def test_part_without_headers_and_nested_multipart():
+    nested = b"--inner\r\n\r\nplain text\r\n--inner--"
+    body = (
+        b"--outer\r\n"
+        b"\r\n"
+        b"no headers\r\n"
+        b"--outer\r\n"
+        b"Content-Type: multipart/alternative; boundary=inner\r\n"
+        b"\r\n"
+        + nested
+        + b"\r\n--outer--\r\n"
+    )
+    first, second = MultipartBody(body, "outer")
+    assert first.headers == {}
+    assert first.content_type == "text/plain"
+    assert first.text() == "no headers"
+    assert first.multipart() is None
+
+    (inner,) = second.multipart()
+    assert inner.text() == "plain text"
+
+
+def test_missing_boundary():
+    with pytest.raises(SipParserError):
+        MultipartBody.from_message(message(b"multipart/mixed"))
+
+
+def test_unterminated_body():
+    parts = MultipartBody(BODY[: BODY.rindex(b"\r\n--unique-boundary-1--")], "unique-boundary-1")
+    assert len(parts) == 1  # The last part has no closing delimiter
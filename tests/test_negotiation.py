@@ -0,0 +1,116 @@
+import pytest
+
+from sdp_fields import Codec, make_codec
+from sdp_message import SdpMessage
+from sdp_negotiation import CodecNegotiator, offer_key, parse_fmtp_params
+
+OFFER = (
+    "v=0\r\n"
+    "o=- 1 1 IN IP4 192.0.2.1\r\n"
+    "s=-\r\n"
+    "c=IN IP4 192.0.2.1\r\n"
+    "t=0 0\r\n"
+    "m=audio 4000 RTP/AVP 96 0 8 101\r\n"
+    "a=rtpmap:96 opus/48000/2\r\n"
+    "a=fmtp:96 useinbandfec=1\r\n"
+    "a=rtpmap:101 telephone-event/8000\r\n"
+    "a=fmtp:101 0-15\r\n"
+    "m=video 0 RTP/AVP 97\r\n"
+    "a=rtpmap:97 H264/90000\r\n"
+)
+
+CAPABILITIES = {
+    "audio": [
+        Codec("0", "PCMU", 8000, 1, None),
+        Codec("111", "opus", 48000, 2, None),
+        Codec("101", "telephone-event", 8000, 1, None),
+    ],
+    "video": [Codec("97", "H264", 90000, 1, None)],
+}
+
+
+def offer(sdp: str = OFFER) -> SdpMessage:
+    return SdpMessage.from_string(sdp)
+
+
+def test_negotiate_keeps_offered_order_and_payload_types():
+    audio, video = CodecNegotiator(CAPABILITIES).negotiate(offer())
+
+    assert audio.media == "audio"
+    assert [codec.payload_type for codec in audio.codecs] == ["96", "0", "101"]
+    assert audio.codecs[0] == Codec("96", "opus", 48000, 2, "useinbandfec=1")
+    assert video.codecs == ()  # Port 0
+
+
+def test_prefer_local_order():
+    audio, _ = CodecNegotiator(CAPABILITIES, prefer_local=True).negotiate(offer())
+    assert [codec.encoding for codec in audio.codecs] == ["PCMU", "opus", "telephone-event"]
+
+
+def test_only_auxiliary_codecs_is_rejected():
+    sdp = OFFER.replace("96 0 8 101", "101")
+    audio, _ = CodecNegotiator(CAPABILITIES).negotiate(offer(sdp))
+    assert audio.codecs == ()
+
+
+def test_fmtp_match_params():
+    local = {"video": [Codec("97", "H264", 90000, 1, "packetization-mode=1")]}
+    sdp = OFFER.replace("m=video 0", "m=video 5000")
+    assert CodecNegotiator(local).negotiate(offer(sdp))[1].codecs == ()
+
+    sdp += "a=fmtp:97 profile-level-id=42e01f;packetization-mode=1\r\n"
+    assert len(CodecNegotiator(local).negotiate(offer(sdp))[1].codecs) == 1
+
+
+def test_memoized_by_codec_set():
+    negotiator = CodecNegotiator(CAPABILITIES)
+    first = negotiator.negotiate(offer())
+    second = negotiator.negotiate(offer(OFFER.replace("192.0.2.1", "198.51.100.7")))
+
+    assert second is first
+    info = negotiator.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+    negotiator.negotiate(offer(OFFER.replace("opus/48000/2", "opus/48000/1")))
+    assert negotiator.cache_info().misses == 2
+
+
+def test_offer_key():
+    assert offer_key(offer()) == (
+        ("audio", True, (
+            ("96", "opus/48000/2", "useinbandfec=1"),
+            ("0", None, None),
+            ("8", None, None),
+            ("101", "telephone-event/8000", "0-15"),
+        )),
+        ("video", False, (("97", "H264/90000", None),)),
+    )
+
+
+def test_make_codec():
+    assert make_codec("0", None, None) == Codec("0", "PCMU", 8000, 1, None)
+    assert make_codec("96", "opus/48000/2", "stereo=1") == Codec("96", "opus", 48000, 2, "stereo=1")
+    assert make_codec("96", None, None) is None
+
+
+@pytest.mark.parametrize("payload_type, rtpmap", [
+    ("96", "opus/fast"),
+    ("96", "opus/48000/two"),
+    ("x", "PCMU/8000"),
+    ("", None),
+])
+def test_make_codec_malformed(payload_type, rtpmap):
+    assert make_codec(payload_type, rtpmap, None) is None
+
+
+def test_malformed_rtpmap_is_skipped():
+    sdp = OFFER.replace("a=rtpmap:96 opus/48000/2", "a=rtpmap:96 opus/fast/2")
+    audio, _ = CodecNegotiator(CAPABILITIES).negotiate(offer(sdp))
+    assert [codec.payload_type for codec in audio.codecs] == ["0", "101"]
+    assert audio.media == "audio"
+
+
+def test_parse_fmtp_params():
+    assert parse_fmtp_params("Mode=20; octet-align=1") == {"mode": "20", "octet-align": "1"}
+    assert parse_fmtp_params("0-15") == {}
+    assert parse_fmtp_params(None) == {}
@@ -0,0 +1,58 @@
+import pytest
+
+import sip_parser
+from sip_message import SipMessage
+
+INVITE = (
+    b"INVITE sip:bob@example.com SIP/2.0\r\n"
+    b"Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK776asdhds\r\n"
+    b"To: Bob <sip:bob@example.com>\r\n"
+    b"From: Alice <sip:alice@example.com>;tag=1928301774\r\n"
+    b"Call-ID: a84b4c76e66710@pc33.example.com\r\n"
+    b"CSeq: 314159 INVITE\r\n"
+    b"Contact: <sip:alice@pc33.example.com>;expires=60\r\n"
+    b"Content-Length: 0\r\n"
+    b"\r\n"
+)
+
+
+@pytest.fixture
+def parse_cache():
+    sip_parser.enable_parse_cache(16)
+    yield
+    sip_parser.disable_parse_cache()
+
+
+def test_same_results_as_without_cache(parse_cache):
+    cached = [SipMessage.from_bytes(INVITE).headers for _ in range(2)]
+    sip_parser.disable_parse_cache()
+    assert cached[0] == cached[1] == SipMessage.from_bytes(INVITE).headers
+
+
+def test_hits(parse_cache):
+    for _ in range(3):
+        SipMessage.from_bytes(INVITE).headers["from"]
+        sip_parser.parse_uri("sip:bob@example.com")
+
+    info = sip_parser.parse_cache_info()
+    assert info["aor"].hits == 2
+    assert info["uri"].hits >= 2
+
+
+def test_cached_values_are_shared_and_read_only(parse_cache):
+    first, _ = sip_parser.parse_aor("Bob <sip:bob@example.com>;tag=a6c85cf")
+    second, _ = sip_parser.parse_aor("Bob <sip:bob@example.com>;tag=a6c85cf")
+    assert first is second
+    with pytest.raises(TypeError):
+        first.params["tag"] = "other"
+
+
+def test_message_headers_are_mutable_copies(parse_cache):
+    message = SipMessage.from_bytes(INVITE)
+    contact = message.headers["contact"]
+    contact[0]["params"]["expires"] = "0"
+    message.headers["from"]["params"]["tag"] = "changed"
+
+    other = SipMessage.from_bytes(INVITE)
+    assert other.headers["contact"][0]["params"]["expires"] == "60"
+    assert other.headers["from"]["params"]["tag"] == "1928301774"
@@ -0,0 +1,83 @@
+import pytest
+
+from sip_parser import (
+    parse_aor_with_uri,
+    parse_auth_header_with_scheme,
+    parse_multi_header,
+    parse_params,
+    parse_via,
+    scan_aor,
+    scan_aor_with_uri,
+    scan_auth_header_with_scheme,
+    scan_multi_header,
+    scan_params,
+    scan_via,
+)
+
+CONTACT_3GPP = (
+    '<sip:alice@192.0.2.4:5060;transport=tcp>;+g.3gpp.icsi-ref="urn%3Aurn-7%3A3gpp-service.ims.icsi.mmtel"'
+    ";+g.3gpp.smsip;+sip.instance=\"<urn:gsma:imei:35850000-000000-0>\";audio;video;expires=600"
+)
+
+
+@pytest.mark.parametrize("scan_fn, parse_fn, data", [
+    (scan_via, parse_via, "SIP/2.0/UDP [2001:db8::1]:5060;branch=z9hG4bK1;rport, SIP/2.0/TCP b"),
+    (scan_params, parse_params, ";tag=1;lr;x=\"y\" rest"),
+    (scan_aor_with_uri, parse_aor_with_uri, CONTACT_3GPP + ", <sip:bob@example.com>"),
+    (scan_auth_header_with_scheme, parse_auth_header_with_scheme,
+     'Digest username="alice", realm="example.com", nonce="a,b", uri="sip:x", response="00"'),
+])
+def test_scanning_matches_parsing(scan_fn, parse_fn, data):
+    prefix = "Header: "
+    value, pos = scan_fn(prefix + data, len(prefix))
+    parsed, leftover = parse_fn(data)
+
+    assert value == parsed
+    assert (prefix + data)[pos:] == leftover
+
+
+def test_many_params():
+    params = "".join(f";+g.3gpp.p{i}=v{i}" for i in range(200))
+    value, pos = scan_aor("<sip:alice@example.com>" + params)
+    assert len(value.params) == 200
+    assert value.params["+g.3gpp.p199"] == "v199"
+    assert pos == len("<sip:alice@example.com>" + params)
+
+
+def test_3gpp_contact():
+    (contact,), leftover = parse_multi_header(parse_aor_with_uri, CONTACT_3GPP)
+    assert leftover == ""
+    assert contact.uri.host == "192.0.2.4"
+    assert contact.uri.port == 5060
+    assert contact.params["+g.3gpp.icsi-ref"] == "urn%3Aurn-7%3A3gpp-service.ims.icsi.mmtel"
+    assert contact.params["+g.3gpp.smsip"] is None
+    assert contact.params["expires"] == "600"
+
+
+def test_multi_header():
+    data = "x SIP/2.0/UDP a;branch=1 ,  SIP/2.0/TCP b;rport rest"
+    values, pos = scan_multi_header(scan_via, data, 2)
+    assert [(via.protocol, via.host, via.params) for via in values] == [
+        ("UDP", "a", {"branch": "1"}),
+        ("TCP", "b", {"rport": None}),
+    ]
+    assert data[pos:] == " rest"
+
+
+def test_multi_header_with_foreign_parser():
+    def parse_word(data):
+        word, sep, rest = data.partition(",")
+        return word.strip().upper(), sep + rest
+
+    assert parse_multi_header(parse_word, "a, b, c") == (["A", "B", "C"], "")
+
+
+@pytest.mark.parametrize("scan_fn, data", [
+    (scan_via, "HTTP/1.1 host"),
+    (scan_aor, ""),
+    (scan_aor_with_uri, ";tag=1"),
+    (scan_auth_header_with_scheme, "Digest"),
+])
+def test_malformed(scan_fn, data):
+    with pytest.raises(RuntimeError):
+        scan_fn(data)
@@ -0,0 +1,131 @@
+import socket
+import struct
+
+import pytest
+
+from exceptions import SipParserError
+from sip_pcap import PcapReader, read_capture, LINKTYPE_ETHERNET, LINKTYPE_RAW, TCP_SYN
+
+SRC = ("192.0.2.1", 5060)
+DST = ("192.0.2.2", 5060)
+
+
+def options(seq: int) -> bytes:
+    return (
+        b"OPTIONS sip:bob@example.com SIP/2.0\r\n"
+        b"Via: SIP/2.0/UDP 192.0.2.1;branch=z9hG4bK%d\r\n"
+        b"Call-ID: %d@example.com\r\n"
+        b"CSeq: %d OPTIONS\r\n"
+        b"Content-Length: 0\r\n"
+        b"\r\n" % (seq, seq, seq)
+    )
+
+
+def ipv4(protocol: int, segment: bytes, flags_fragment: int = 0) -> bytes:
+    return struct.pack(
+        "!BBHHHBBH4s4s", 0x45, 0, 20 + len(segment), 0, flags_fragment, 64, protocol, 0,
+        socket.inet_aton(SRC[0]), socket.inet_aton(DST[0]),
+    ) + segment
+
+
+def udp(payload: bytes, src=SRC, dst=DST) -> bytes:
+    return struct.pack("!HHHH", src[1], dst[1], 8 + len(payload), 0) + payload
+
+
+def tcp(seq: int, payload: bytes, flags: int = 0x18) -> bytes:
+    return struct.pack("!HHIIBBHHH", SRC[1], DST[1], seq, 0, 5 << 4, flags, 65535, 0, 0) + payload
+
+
+def ethernet(packet: bytes) -> bytes:
+    return b"\x00" * 12 + b"\x08\x00" + packet
+
+
+def pcap(frames, linktype: int = LINKTYPE_ETHERNET, order: str = "<") -> bytes:
+    data = struct.pack(order + "IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, linktype)
+    for index, frame in enumerate(frames):
+        data += struct.pack(order + "IIII", 1000 + index, 500000, len(frame), len(frame)) + frame
+    return data
+
+
+def pcapng(frames, linktype: int = LINKTYPE_ETHERNET) -> bytes:
+    def block(block_type: int, body: bytes) -> bytes:
+        body += b"\x00" * (-len(body) % 4)
+        return struct.pack("<II", block_type, 12 + len(body)) + body + struct.pack("<I", 12 + len(body))
+
+    data = block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+    data += block(1, struct.pack("<HHI", linktype, 0, 65535) + struct.pack("<HHB3x", 9, 1, 3) + b"\x00" * 4)
+    for index, frame in enumerate(frames):
+        timestamp = (1000 + index) * 1000
+        data += block(6, struct.pack("<IIIII", 0, timestamp >> 32, timestamp & 0xFFFFFFFF, len(frame), len(frame)) + frame)
+    return data
+
+
+@pytest.fixture
+def capture(tmp_path):
+    def write(data: bytes) -> str:
+        path = tmp_path / "capture.pcap"
+        path.write_bytes(data)
+        return str(path)
+
+    return write
+
+
+@pytest.mark.parametrize("order", ["<", ">"])
+def test_udp(capture, order):
+    frames = [ethernet(ipv4(17, udp(options(seq)))) for seq in (1, 2)]
+    messages = list(read_capture(capture(pcap(frames, order=order))))
+
+    assert [m.message.headers["cseq"]["seq"] for m in messages] == [1, 2]
+    first = messages[0]
+    assert (first.src, first.dst, first.transport) == (SRC, DST, "UDP")
+    assert first.timestamp == pytest.approx(1000.5)
+
+
+def test_pcapng_and_raw_ip(capture):
+    messages = list(read_capture(capture(pcapng([ipv4(17, udp(options(3)))], LINKTYPE_RAW))))
+    assert len(messages) == 1
+    assert messages[0].message.headers["call-id"] == "3@example.com"
+    assert messages[0].timestamp == pytest.approx(1000.0)  # Microsecond resolution option
+
+
+def test_tcp_reassembly(capture):
+    stream = options(1) + options(2)
+    isn = 0xFFFFFFF0  # The sequence numbers wrap around
+    segments = [(isn + 1 + offset) & 0xFFFFFFFF for offset in (0, 40, 100)]
+    frames = [
+        ethernet(ipv4(6, tcp(isn, b"", TCP_SYN))),
+        ethernet(ipv4(6, tcp(segments[0], stream[:40]))),
+        ethernet(ipv4(6, tcp(segments[2], stream[100:]))),  # Out of order
+        ethernet(ipv4(6, tcp(segments[1], stream[40:100]))),
+        ethernet(ipv4(6, tcp(segments[1], stream[40:100]))),  # Retransmitted
+    ]
+    messages = list(read_capture(capture(pcap(frames))))
+
+    assert [m.message.headers["cseq"]["seq"] for m in messages] == [1, 2]
+    assert {m.transport for m in messages} == {"TCP"}
+
+
+def test_skipped_and_errors(capture):
+    frames = [
+        ethernet(ipv4(17, udp(options(1)), flags_fragment=0x2000)),  # IP fragment
+        ethernet(ipv4(17, udp(b"\x80\x00RTP"))),  # Not SIP
+        ethernet(ipv4(17, udp(b"OPTIONS sip:bob@example.com SIP/2.0\r\n"))),  # Malformed
+        ethernet(ipv4(17, udp(options(2), src=("192.0.2.1", 40000), dst=("192.0.2.2", 40001)))),
+        ethernet(ipv4(1, b"\x08\x00" + b"\x00" * 10)),  # ICMP
+    ]
+    with PcapReader(capture(pcap(frames)), ports=(5060,)) as reader:
+        assert list(reader) == []
+        assert reader.packets == 5
+        assert reader.skipped == 3
+        assert reader.errors == 1
+
+
+def test_truncated_capture(capture):
+    data = pcap([ethernet(ipv4(17, udp(options(seq)))) for seq in (1, 2)])
+    assert len(list(read_capture(capture(data[:-10])))) == 1
+
+
+@pytest.mark.parametrize("data", [b"", b"abc", b"not a capture file"])
+def test_not_a_capture(capture, data):
+    with pytest.raises(SipParserError):
+        list(read_capture(capture(data)))
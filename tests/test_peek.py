@@ -0,0 +1,64 @@
+import pytest
+
+from exceptions import SipParserError
+from sip_message import SipMessage
+from sip_peek import peek, PeekResult
+
+INVITE = (
+    "INVITE sip:bob@example.com SIP/2.0\r\n"
+    "Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK776asdhds, SIP/2.0/UDP b;branch=z9hG4bK2\r\n"
+    "Via: SIP/2.0/UDP c;branch=z9hG4bK3\r\n"
+    "Max-Forwards: 70\r\n"
+    "To: Bob <sip:bob@example.com>\r\n"
+    "From: Alice <sip:alice@example.com>;tag=1928301774\r\n"
+    "Call-ID: a84b4c76e66710@pc33.example.com\r\n"
+    "CSeq: 314159 INVITE\r\n"
+    "Content-Length: 13\r\n"
+    "\r\n"
+    "Call-ID: body"
+)
+
+
+def test_matches_full_parse():
+    message = SipMessage.from_string(INVITE)
+    result = peek(INVITE)
+
+    assert result == PeekResult(
+        "INVITE", None, "a84b4c76e66710@pc33.example.com", 314159, "INVITE", "z9hG4bK776asdhds"
+    )
+    assert result.method == message.method
+    assert result.call_id == message.headers["call-id"]
+    assert result.cseq == message.headers["cseq"]["seq"]
+    assert result.branch == message.headers["via"][0]["params"]["branch"]
+
+
+def test_bytes_and_memoryview():
+    data = INVITE.encode()
+    assert peek(data) == peek(bytearray(data)) == peek(memoryview(data)) == peek(INVITE)
+
+
+def test_response_with_compact_and_folded_headers():
+    raw = (
+        "\r\nSIP/2.0 180 Ringing\r\n"
+        "v: SIP/2.0/TCP pc33.example.com\r\n"
+        " ;branch=z9hG4bKfolded\r\n"
+        "i: 1@pc33.example.com\r\n"
+        "cseq: 2 BYE\r\n"
+        "\r\n"
+    )
+    assert peek(raw) == PeekResult(None, 180, "1@pc33.example.com", 2, "BYE", "z9hG4bKfolded")
+
+
+def test_missing_fields_are_none():
+    result = peek("OPTIONS sip:bob@example.com SIP/2.0\r\nCSeq: x\r\n\r\nCall-ID: body\r\n")
+    assert result == PeekResult("OPTIONS", None, None, None, None, None)
+
+
+def test_head_without_end():
+    assert peek("BYE sip:bob@example.com SIP/2.0\r\ni: 2@h").call_id == "2@h"
+
+
+@pytest.mark.parametrize("raw", ["", "INVITE\r\n\r\n", b"SIP/2.0 abc OK\r\n\r\n"])
+def test_malformed_start_line(raw):
+    with pytest.raises(SipParserError):
+        peek(raw)
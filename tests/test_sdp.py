@@ -0,0 +1,102 @@
+import pytest
+
+from exceptions import SdpParserError
+from sdp_fields import Codec, ConnectionDataField, MediaField, OriginField, TimingField
+from sdp_message import SdpMessage
+
+SDP = (
+    "v=0\r\n"
+    "o=alice 2890844526 2890844526 IN IP4 192.0.2.1\r\n"
+    "s=Call\r\n"
+    "c=IN IP4 192.0.2.1\r\n"
+    "b=AS:128\r\n"
+    "t=0 0\r\n"
+    "r=604800 3600 0 90000\r\n"
+    "a=group:BUNDLE 0 1\r\n"
+    "m=audio 49170 RTP/AVP 0 96\r\n"
+    "a=rtpmap:96 opus/48000/2\r\n"
+    "a=fmtp:96 useinbandfec=1\r\n"
+    "a=fingerprint:sha-256 4A:AD:B9:B1\r\n"
+    "a=sendrecv\r\n"
+    "m=video 51372/2 RTP/AVP 97\r\n"
+    "i=Camera\r\n"
+    "c=IN IP4 192.0.2.2\r\n"
+    "a=rtpmap:97 H264/90000\r\n"
+    "a=rtcp-fb:97 nack\r\n"
+    "a=rtcp-fb:97 nack pli\r\n"
+)
+
+
+def test_parse():
+    sdp = SdpMessage.from_string(SDP)
+    fields = sdp.session_description_fields
+    assert fields["v"] == 0
+    assert fields["o"] == OriginField("alice", "2890844526", "2890844526", "IN", "IP4", "192.0.2.1")
+    assert fields["c"] == ConnectionDataField("IN", "IP4", "192.0.2.1")
+    assert fields["b"] == ["AS:128"]
+    assert fields["a"] == [("group", "BUNDLE 0 1")]
+
+    (time,) = sdp.time_descriptions
+    assert time.timing == TimingField("0", "0")
+    assert time.repeat_times[0].offsets == ["0", "90000"]
+
+    audio, video = sdp.media_descriptions
+    assert audio.media == MediaField("audio", 49170, 1, "RTP/AVP", "0 96")
+    assert audio.attribute("fingerprint") == "sha-256 4A:AD:B9:B1"  # Split on the first colon only
+    assert audio.attribute("sendrecv") is True
+    assert video.media.number_of_ports == 2
+    assert video.media_title == "Camera"
+    assert video.connection_information == ConnectionDataField("IN", "IP4", "192.0.2.2")
+
+
+def test_media_attributes_by_payload_type():
+    audio, video = SdpMessage.from_string(SDP).media_descriptions
+    assert audio.payload_attributes("96") == {"rtpmap": "opus/48000/2", "fmtp": "useinbandfec=1"}
+    assert audio.codecs() == [
+        Codec("0", "PCMU", 8000, 1, None),
+        Codec("96", "opus", 48000, 2, "useinbandfec=1"),
+    ]
+    assert video.payload_attributes("97")["rtcp-fb"] == ["nack", "nack pli"]
+    assert video.attributes("missing") == []
+
+
+def test_lazy_media_descriptions():
+    sdp = SdpMessage.from_string(SDP, lazy=True)
+    media = sdp.media_descriptions
+    assert len(media) == 2
+    assert not media.is_parsed(0) and not media.is_parsed(1)
+
+    assert media[1].media.media == "video"
+    assert media.is_parsed(1) and not media.is_parsed(0)
+    assert media == SdpMessage.from_string(SDP).media_descriptions
+
+
+def test_lf_line_endings():
+    assert SdpMessage.from_string(SDP.replace("\r\n", "\n")).media_descriptions == \
+        SdpMessage.from_string(SDP).media_descriptions
+
+
+@pytest.mark.parametrize("raw", [
+    "o=- 1 1 IN IP4 h\r\nv=0\r\ns=-\r\nt=0 0\r\n",  # v= must come first
+    "v=0\r\no=- 1 1 IN IP4 h\r\ns=-\r\n",  # No t=
+    "v=0\r\no=- 1 1 IN IP4 h\r\ns=-\r\nt=0 0\r\nc=IN IP4 h\r\n",  # c= after t= outside media
+    "v=0\r\no=- 1 1 IN IP4 h\r\ns=-\r\nt=0 0\r\nm=audio 1 RTP/AVP 0\r\nt=0 0\r\n",
+    "v=0\r\no=- 1 1 IN IP4 h\r\ns=-\r\nt=0 0\r\ngarbage\r\n",
+    "v=1\r\no=- 1 1 IN IP4 h\r\ns=-\r\nt=0 0\r\n",
+    "v=0\r\no=- 1 IN IP4 h\r\ns=-\r\nt=0 0\r\n",
+])
+def test_malformed(raw):
+    for lazy in (False, True):
+        with pytest.raises(SdpParserError):
+            SdpMessage.from_string(raw, lazy=lazy)
+
+
+def test_lazy_media_errors_are_raised_when_read():
+    raw = SDP.replace("m=video 51372/2", "m=video port")
+    with pytest.raises(SdpParserError):
+        SdpMessage.from_string(raw)
+
+    media = SdpMessage.from_string(raw, lazy=True).media_descriptions
+    assert media[0].media.port == 49170
+    with pytest.raises(SdpParserError):
+        media[1]
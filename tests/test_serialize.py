@@ -0,0 +1,73 @@
+from sip_message import SipMessage
+
+INVITE = (
+    "INVITE sip:bob@example.com SIP/2.0\r\n"
+    "Via: SIP/2.0/UDP   pc33.example.com;branch=z9hG4bK776asdhds ;rport\r\n"
+    "v: SIP/2.0/TCP proxy.example.com;branch=z9hG4bK1\r\n"
+    "To: Bob <sip:bob@example.com>\r\n"
+    "From: \"Alice\" <sip:alice@example.com>;tag=1928301774\r\n"
+    "Call-ID: a84b4c76e66710@pc33.example.com\r\n"
+    "CSeq: 314159 INVITE\r\n"
+    "X-Folded: first,\r\n second\r\n"
+    "Content-Type: text/plain\r\n"
+    "Content-Length: 5\r\n"
+    "\r\n"
+    "Hello"
+)
+
+
+def test_unmodified_headers_are_copied_verbatim():
+    for message in (SipMessage.from_string(INVITE), SipMessage.from_string(INVITE, lazy=True),
+                    SipMessage.from_bytes(INVITE.encode())):
+        assert message.stringify() == INVITE
+
+
+def test_peeked_and_str_headers_stay_verbatim():
+    message = SipMessage.from_bytes(INVITE.encode())
+    message.peek_header("via")
+    message.headers["x-folded"]
+    assert message.to_bytes() == INVITE.encode()
+
+
+def test_modified_headers_are_serialized():
+    message = SipMessage.from_bytes(INVITE.encode())
+    message.headers["cseq"]["seq"] = 314160
+    message.headers["max-forwards"] = 69
+    data = message.stringify()
+    assert "CSeq: 314160 INVITE\r\n" in data
+    assert data.endswith("Max-Forwards: 69\r\n\r\nHello")
+    assert "Via: SIP/2.0/UDP   pc33.example.com" in data
+
+
+def test_unparsable_header_is_passed_through():
+    # Lazily parsed headers that are never read don't need to be valid
+    data = INVITE.replace("CSeq: 314159 INVITE", "CSeq: not a number")
+    assert SipMessage.from_string(data, lazy=True).stringify() == data
+    assert SipMessage.from_bytes(data.encode()).to_bytes() == data.encode()
+
+
+def test_content_length_counts_bytes():
+    message = SipMessage.from_string(INVITE)
+    message.content = "café"
+    assert "Content-Length: 5\r\n" in message.stringify()
+    assert message.to_bytes().endswith(b"Content-Length: 5\r\n\r\ncaf\xc3\xa9")
+    assert SipMessage.from_bytes(message.to_bytes()).content == "café"
+
+
+def test_binary_body_is_copied_as_is():
+    body = b"\x01\x00\x8f\xff ISUP"
+    head = INVITE[: INVITE.index("Content-Length")].encode()
+    data = head + b"Content-Length: 9\r\n\r\n" + body
+    message = SipMessage.from_bytes(data)
+    message.headers["max-forwards"] = 70
+    serialized = message.to_bytes()
+    assert serialized.endswith(b"Max-Forwards: 70\r\n\r\n" + body)
+    assert bytes(SipMessage.from_bytes(serialized).body) == body
+
+
+def test_compact():
+    message = SipMessage.from_bytes(INVITE.encode())
+    data = message.stringify(compact=True)
+    assert "v: SIP/2.0/UDP   pc33.example.com" in data
+    assert "\r\nf: \"Alice\"" in data and "\r\ni: a84b4c76e66710" in data
+    assert SipMessage.from_string(data).headers == SipMessage.from_string(INVITE).headers
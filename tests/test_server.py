@@ -0,0 +1,106 @@
+import asyncio
+import marshal
+import os
+import socket
+
+import pytest
+
+from sip_server import SipServer, ShardedDatagramProtocol, worker_for
+
+OPTIONS = (
+    "OPTIONS sip:bob@example.com SIP/2.0\r\n"
+    "Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK{seq}\r\n"
+    "Call-ID: {call_id}\r\n"
+    "CSeq: {seq} OPTIONS\r\n"
+    "Content-Length: 0\r\n"
+    "\r\n"
+)
+ADDR = ("192.0.2.4", 5060)
+
+requires_reuseport = pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="No SO_REUSEPORT")
+
+
+def options(call_id: str, seq: int = 1) -> bytes:
+    return OPTIONS.format(call_id=call_id, seq=seq).encode()
+
+
+def call_id_for(worker: int, workers: int) -> str:
+    return next(f"{i}@example.com" for i in range(1000) if worker_for(f"{i}@example.com", workers) == worker)
+
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append((data, addr))
+
+
+async def _answer(message, addr, endpoint):
+    """ Module level so the workers can unpickle it """
+    call_id = message.headers["call-id"]
+    endpoint.send(f"SIP/2.0 200 OK\r\nCall-ID: {call_id}\r\nX-Worker: {os.getpid()}\r\n\r\n", addr)
+
+
+def test_worker_for():
+    assert worker_for(None, 4) is None
+    assert worker_for("", 4) is None
+    owners = {worker_for(f"{i}@example.com", 4) for i in range(100)}
+    assert owners == {0, 1, 2, 3}
+    assert worker_for("a@example.com", 4) == worker_for("a@example.com", 4)
+
+
+def test_datagrams_of_other_workers_are_forwarded():
+    async def run():
+        async def handler(message, addr, endpoint):
+            pass
+
+        endpoint = ShardedDatagramProtocol(handler, 0, ["worker-0", "worker-1"])
+        endpoint.channel = FakeChannel()
+
+        own, other = options(call_id_for(0, 2)), options(call_id_for(1, 2))
+        endpoint._received(own, ADDR)
+        endpoint._received(other, ADDR)
+        endpoint._received(b"not SIP", ADDR)  # No owner, handled (and dropped) here
+
+        assert endpoint.queue.qsize() == 1
+        assert endpoint.forwarded == 1
+        assert endpoint.parse_errors == 1
+        (payload, channel), = endpoint.channel.sent
+        assert channel == "worker-1"
+
+        endpoint.received_from_worker(payload)
+        assert endpoint.queue.qsize() == 2
+        endpoint.queue.get_nowait()
+        message, addr = endpoint.queue.get_nowait()
+        assert addr == ADDR
+        assert message.headers["call-id"] == call_id_for(1, 2)
+        assert marshal.loads(payload)[1] == other
+
+    asyncio.run(run())
+
+
+@requires_reuseport
+def test_call_id_affinity_over_loopback():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    with SipServer(_answer, "127.0.0.1", port, workers=2):
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        client.settimeout(5)
+        workers = {}
+        try:
+            for seq in range(1, 4):
+                for worker in range(2):
+                    call_id = call_id_for(worker, 2)
+                    client.sendto(options(call_id, seq), ("127.0.0.1", port))
+                    lines = client.recv(65536).decode().split("\r\n")
+                    assert f"Call-ID: {call_id}" in lines
+                    pid = next(line.split(": ")[1] for line in lines if line.startswith("X-Worker"))
+                    workers.setdefault(call_id, set()).add(pid)
+        finally:
+            client.close()
+
+    assert all(len(pids) == 1 for pids in workers.values())
+    assert len(set.union(*workers.values())) == 2
@@ -0,0 +1,79 @@
+import pytest
+
+from exceptions import SipBuilderError
+from sip_message import SipMessage
+from sip_template import MessageTemplate, Slot
+
+OPTIONS = {
+    "method": "OPTIONS",
+    "uri": "sip:server@10.0.0.1",
+    "headers": {
+        "via": [{"version": "2.0", "protocol": "UDP", "host": "10.0.0.2", "port": 5060,
+                 "params": {"branch": Slot("branch")}}],
+        "max-forwards": 70,
+        "from": {"uri": "sip:probe@10.0.0.2", "params": {"tag": Slot("tag")}},
+        "to": {"uri": "sip:server@10.0.0.1"},
+        "call-id": Slot("call_id"),
+        "cseq": {"seq": Slot("cseq"), "method": "OPTIONS"},
+    },
+}
+
+
+def test_render_fills_the_slots():
+    template = MessageTemplate(OPTIONS)
+    assert template.slots == ("branch", "call_id", "cseq", "tag")
+
+    message = template.render_message(branch="z9hG4bK1", tag="abc", call_id="call-1", cseq=7)
+    assert message.method == "OPTIONS"
+    assert message.headers["via"][0]["params"]["branch"] == "z9hG4bK1"
+    assert message.headers["from"]["params"]["tag"] == "abc"
+    assert message.headers["call-id"] == "call-1"
+    assert message.headers["cseq"]["seq"] == 7
+    assert message.headers["content-length"] == 0
+
+
+def test_render_matches_from_dict():
+    values = {"branch": "z9hG4bK1", "tag": "abc", "call_id": "call-1", "cseq": 7}
+    template = MessageTemplate(OPTIONS)
+
+    def fill(value):
+        if isinstance(value, Slot):
+            return values[value.name]
+        if isinstance(value, dict):
+            return {key: fill(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [fill(item) for item in value]
+        return value
+
+    expected = SipMessage.from_dict(fill(OPTIONS)).stringify().encode("utf-8")
+    assert template.render(**values) == expected
+
+
+def test_body_slot_sets_content_length():
+    data = dict(OPTIONS, content=Slot("body"))
+    data["headers"] = dict(OPTIONS["headers"], **{"content-type": "text/plain"})
+    template = MessageTemplate(data)
+    assert "body" in template.slots
+
+    values = {"branch": "z9hG4bK1", "tag": "abc", "call_id": "call-1", "cseq": 1}
+    for body in ("", "héllo", b"\x00\x01binary"):
+        message = template.render_message(body=body, **values)
+        expected = body.encode("utf-8") if isinstance(body, str) else body
+        assert message.headers["content-length"] == len(expected)
+        assert message.body == expected
+
+
+def test_missing_slot_value():
+    with pytest.raises(SipBuilderError):
+        MessageTemplate(OPTIONS).render(branch="z9hG4bK1", tag="abc", call_id="call-1")
+
+
+def test_invalid_templates():
+    with pytest.raises(SipBuilderError):
+        Slot("not a name")
+
+    with pytest.raises(SipBuilderError):
+        MessageTemplate(dict(OPTIONS, content=Slot("payload")))
+
+    with pytest.raises(SipBuilderError):
+        MessageTemplate(dict(OPTIONS, content="fixed " + Slot("body")))
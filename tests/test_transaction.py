@@ -0,0 +1,235 @@
+import pytest
+
+from sip_message import SipMessage
+from sip_transaction import TransactionManager, build_response, T1, T2, T4, TIMER_C
+from timing_wheel import TimingWheel
+
+INVITE = (
+    b"INVITE sip:bob@example.com SIP/2.0\r\n"
+    b"Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK776asdhds\r\n"
+    b"Max-Forwards: 70\r\n"
+    b"To: Bob <sip:bob@example.com>\r\n"
+    b"From: Alice <sip:alice@example.com>;tag=1928301774\r\n"
+    b"Call-ID: a84b4c76e66710@pc33.example.com\r\n"
+    b"CSeq: 314159 INVITE\r\n"
+    b"Content-Length: 0\r\n"
+    b"\r\n"
+)
+ADDR = ("192.0.2.4", 5060)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_manager(clock, **kwargs):
+    sent = []
+    wheel = TimingWheel(tick=0.01, size=256, clock=clock)
+    manager = TransactionManager(lambda data, addr: sent.append(data), wheel=wheel, **kwargs)
+    return manager, sent
+
+
+def run_until(manager, clock, when):
+    """ Advances the wheel tick by tick, as attach() does """
+    wheel = manager.wheel
+    while clock.now < when:
+        clock.now = min(when, clock.now + wheel.tick_length)
+        wheel.advance()
+
+
+def request(method: str = "INVITE") -> SipMessage:
+    return SipMessage.from_bytes(INVITE.replace(b"INVITE", method.encode()))
+
+
+def test_timer_a_doubles_the_retransmit_interval(clock):
+    manager, sent = make_manager(clock)
+    manager.send_request(request(), ADDR)
+    assert len(sent) == 1
+
+    # Retransmissions at T1, 3*T1, 7*T1, 15*T1
+    for count, when in enumerate((1, 3, 7, 15), 2):
+        run_until(manager, clock, when * T1 - 0.02)
+        assert len(sent) == count - 1
+        run_until(manager, clock, when * T1 + 0.02)
+        assert len(sent) == count
+
+    assert manager.retransmissions == 4
+
+
+def test_timer_b_times_out(clock):
+    manager, _ = make_manager(clock)
+    timeouts = []
+    transaction = manager.send_request(request(), ADDR, on_timeout=timeouts.append)
+
+    run_until(manager, clock, 64 * T1 - 0.02)
+    assert timeouts == []
+    run_until(manager, clock, 64 * T1 + 0.02)
+    assert timeouts == [transaction]
+    assert len(manager) == 0
+    assert manager.timeouts == 1
+
+
+def test_reliable_transport_does_not_retransmit(clock):
+    manager, sent = make_manager(clock)
+    manager.send_request(request(), ADDR, reliable=True)
+    run_until(manager, clock, 64 * T1 - 0.02)
+    assert len(sent) == 1
+
+
+def test_timer_e_caps_at_t2(clock):
+    manager, sent = make_manager(clock)
+    manager.send_request(request("OPTIONS"), ADDR)
+    # T1, 2*T1, 4*T1, then T2: at 0.5, 1.5, 3.5, 7.5, 11.5
+    run_until(manager, clock, 11.5 + 0.1)
+    assert len(sent) == 6
+    run_until(manager, clock, 15.5 - 0.1)
+    assert len(sent) == 6
+
+
+def test_provisional_response_stops_retransmissions(clock):
+    manager, sent = make_manager(clock)
+    responses = []
+    invite = request()
+    manager.send_request(invite, ADDR, on_response=lambda transaction, response: responses.append(response))
+    manager.receive(build_response(invite, 180, "Ringing"), ADDR)
+    assert [response.status for response in responses] == [180]
+
+    # Timer B doesn't apply in Proceeding anymore
+    run_until(manager, clock, 64 * T1 + 1)
+    assert len(sent) == 1
+    assert len(manager) == 1
+
+
+def test_timer_c_times_out_proceeding(clock):
+    manager, _ = make_manager(clock, proceeding_timeout=10.0)
+    timeouts = []
+    invite = request()
+    transaction = manager.send_request(invite, ADDR, on_timeout=timeouts.append)
+
+    run_until(manager, clock, 1.0)
+    manager.receive(build_response(invite, 180, "Ringing"), ADDR)
+    run_until(manager, clock, 10.9)
+    assert timeouts == []
+
+    # Each provisional response restarts it
+    manager.receive(build_response(invite, 183, "Session Progress"), ADDR)
+    run_until(manager, clock, 20.8)
+    assert timeouts == []
+    run_until(manager, clock, 21.0)
+    assert timeouts == [transaction]
+    assert len(manager) == 0
+
+
+def test_timer_c_disabled(clock):
+    manager, _ = make_manager(clock, proceeding_timeout=None)
+    invite = request()
+    manager.send_request(invite, ADDR)
+    manager.receive(build_response(invite, 180, "Ringing"), ADDR)
+    run_until(manager, clock, TIMER_C * 2)
+    assert len(manager) == 1
+
+
+def test_final_response_acked_and_timer_d(clock):
+    manager, sent = make_manager(clock)
+    invite = request()
+    manager.send_request(invite, ADDR)
+    busy = build_response(invite, 486, "Busy Here", to_tag="a6c85cf")
+    manager.receive(busy, ADDR)
+    assert sent[-1].startswith(b"ACK sip:bob@example.com SIP/2.0\r\n")
+
+    # A retransmitted response is ACKed again, until Timer D
+    manager.receive(busy, ADDR)
+    assert len(sent) == 3 and sent[-1] == sent[-2]
+    run_until(manager, clock, 32.0 + 0.02)
+    assert len(manager) == 0
+
+
+def test_non_invite_final_response_and_timer_k(clock):
+    manager, sent = make_manager(clock)
+    options = request("OPTIONS")
+    manager.send_request(options, ADDR)
+    manager.receive(build_response(options, 200, "OK"), ADDR)
+    run_until(manager, clock, T4 - 0.02)
+    assert len(manager) == 1
+    run_until(manager, clock, T4 + 0.02)
+    assert len(manager) == 0
+    assert len(sent) == 1
+
+
+def test_server_invite_sends_trying_then_retransmits_final_response(clock):
+    manager, sent = make_manager(clock)
+    transactions = []
+    manager.on_request = lambda transaction, message: transactions.append(transaction)
+    invite = request()
+    manager.receive(invite, ADDR)
+    run_until(manager, clock, 0.25)
+    assert sent[-1].startswith(b"SIP/2.0 100 Trying\r\n")
+
+    # Timer G until the ACK comes
+    transactions[0].send_response(build_response(invite, 486, "Busy Here", to_tag="a6c85cf"))
+    run_until(manager, clock, 0.25 + T1 + 0.02)
+    assert len(sent) == 3
+    manager.receive(request("ACK"), ADDR)
+    run_until(manager, clock, 0.25 + T1 + T2)
+    assert len(sent) == 3
+
+    # Timer I
+    run_until(manager, clock, 0.25 + T1 + T4 + 0.05)
+    assert len(manager) == 0
+
+
+def test_wheel_timers_do_not_fire_early_after_a_lag(clock):
+    wheel = TimingWheel(tick=0.01, size=256, clock=clock)
+    fired = []
+    clock.now = 5.0  # advance() wasn't called for a while
+    wheel.schedule(1.0, fired.append, "late")
+    wheel.advance()
+    assert fired == []
+    clock.now = 5.99
+    wheel.advance()
+    assert fired == []
+    clock.now = 6.01
+    wheel.advance()
+    assert fired == ["late"]
+
+
+def test_wheel_cancel(clock):
+    wheel = TimingWheel(tick=0.01, size=16, clock=clock)
+    fired = []
+    timer = wheel.schedule(0.5, fired.append, 1)
+    wheel.schedule(0.5, fired.append, 2)
+    wheel.cancel(timer)
+    assert len(wheel) == 1
+    clock.now = 1.0
+    assert wheel.advance() == 1
+    assert fired == [2]
+
+
+@pytest.mark.parametrize("line, replacement", [
+    (b"CSeq: 314159 INVITE", b"CSeq: INVITE"),
+    (b"CSeq: 314159 INVITE", b"CSeq: "),
+    (b"Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK776asdhds", b"Via: garbage"),
+])
+def test_malformed_messages_are_dropped(clock, line, replacement):
+    manager, sent = make_manager(clock)
+    requests = []
+    manager.on_request = lambda transaction, message: requests.append(message)
+    manager.receive(SipMessage.from_bytes(INVITE.replace(line, replacement)), ADDR)
+    assert requests == [] and sent == []
+    assert len(manager) == 0
+
+    # Responses too
+    invite = request()
+    manager.send_request(invite, ADDR)
+    response = build_response(invite, 180, "Ringing").to_bytes()
+    manager.receive(SipMessage.from_bytes(response.replace(line, replacement)), ADDR)
+    assert len(manager) == 1
@@ -0,0 +1,201 @@
+import asyncio
+
+from sip_framer import KEEPALIVE_PING, KEEPALIVE_PONG
+from sip_message import SipMessage
+from sip_transport import (
+    SipStreamProtocol,
+    create_udp_endpoint,
+    open_tcp_connection,
+    start_tcp_server,
+)
+
+OPTIONS = (
+    b"OPTIONS sip:bob@example.com SIP/2.0\r\n"
+    b"Via: SIP/2.0/UDP pc33.example.com;branch=z9hG4bK776asdhds\r\n"
+    b"To: <sip:bob@example.com>\r\n"
+    b"From: <sip:alice@example.com>;tag=1928301774\r\n"
+    b"Call-ID: a84b4c76e66710@pc33.example.com\r\n"
+    b"CSeq: %d OPTIONS\r\n"
+    b"Content-Length: 0\r\n"
+    b"\r\n"
+)
+
+
+def options(seq: int = 1) -> bytes:
+    return OPTIONS % seq
+
+
+async def wait_for(predicate, timeout: float = 2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "Timed out"
+        await asyncio.sleep(0.005)
+
+
+class FakeStreamTransport:
+    def __init__(self):
+        self.writes = []
+        self.paused = False
+        self.closed = False
+
+    def get_extra_info(self, name, default=None):
+        return ("192.0.2.4", 5060) if name == "peername" else default
+
+    def writelines(self, data):
+        self.writes.append(list(data))
+
+    def pause_reading(self):
+        self.paused = True
+
+    def resume_reading(self):
+        self.paused = False
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+def test_udp_round_trip():
+    async def run():
+        async def echo(message, addr, endpoint):
+            endpoint.send(message, addr)
+
+        received = []
+
+        async def collect(message, addr, endpoint):
+            received.append(message)
+
+        server = await create_udp_endpoint(echo, "127.0.0.1", 0)
+        client = await create_udp_endpoint(collect, "127.0.0.1", 0)
+        target = server.transport.get_extra_info("sockname")
+        try:
+            for seq in range(1, 4):
+                client.send(options(seq), target)
+            client.send(b"not SIP\r\n\r\n", target)
+            client.send(b"\r\n\r\n", target)  # Keepalive, ignored
+            await wait_for(lambda: len(received) == 3 and server.parse_errors == 1)
+        finally:
+            client.close()
+            server.close()
+
+        assert sorted(message.headers["cseq"]["seq"] for message in received) == [1, 2, 3]
+        assert server.received == 3
+
+    asyncio.run(run())
+
+
+def test_udp_drops_when_the_handler_falls_behind():
+    async def run():
+        release = asyncio.Event()
+
+        async def slow(message, addr, endpoint):
+            await release.wait()
+
+        server = await create_udp_endpoint(slow, "127.0.0.1", 0, queue_size=2)
+        try:
+            for seq in range(1, 6):
+                server.datagram_received(options(seq), ("192.0.2.4", 5060))
+
+            # The handler didn't get to run in between: two are queued, the rest dropped
+            assert server.received == 5
+            assert server.dropped == 3
+            release.set()
+            await server.queue.join()
+        finally:
+            server.close()
+
+    asyncio.run(run())
+
+
+def test_tcp_round_trip():
+    async def run():
+        async def echo(message, addr, endpoint):
+            endpoint.send(message)
+
+        received = []
+
+        async def collect(message, addr, endpoint):
+            received.append(message)
+
+        server = await start_tcp_server(echo, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client = await open_tcp_connection(collect, "127.0.0.1", port)
+        try:
+            # A message split across writes and two in one write
+            data = options(1) + options(2) + options(3)
+            client.send(data[:50])
+            await asyncio.sleep(0.01)
+            client.send(data[50:])
+            await wait_for(lambda: len(received) == 3)
+        finally:
+            client.close()
+            server.close()
+            await server.wait_closed()
+
+        assert [message.headers["cseq"]["seq"] for message in received] == [1, 2, 3]
+
+    asyncio.run(run())
+
+
+def test_tcp_ping_is_answered_and_writes_are_batched():
+    async def run():
+        async def ignore(message, addr, endpoint):
+            pass
+
+        protocol = SipStreamProtocol(ignore)
+        transport = FakeStreamTransport()
+        protocol.connection_made(transport)
+
+        protocol.data_received(KEEPALIVE_PING)
+        protocol.send(options(1))
+        protocol.send(SipMessage.from_bytes(options(2)))
+        await asyncio.sleep(0)
+
+        assert transport.writes == [[KEEPALIVE_PONG, options(1), options(2)]]
+        protocol.connection_lost(None)
+
+    asyncio.run(run())
+
+
+def test_tcp_backpressure_pauses_reading():
+    async def run():
+        release = asyncio.Event()
+
+        async def slow(message, addr, endpoint):
+            await release.wait()
+
+        protocol = SipStreamProtocol(slow, queue_size=4)
+        transport = FakeStreamTransport()
+        protocol.connection_made(transport)
+
+        protocol.data_received(b"".join(options(seq) for seq in range(1, 6)))
+        assert transport.paused
+        assert protocol.received == 5  # Nothing read is dropped
+
+        release.set()
+        await protocol.queue.join()
+        assert not transport.paused
+        protocol.connection_lost(None)
+
+    asyncio.run(run())
+
+
+def test_tcp_unframeable_stream_is_closed():
+    async def run():
+        async def ignore(message, addr, endpoint):
+            pass
+
+        protocol = SipStreamProtocol(ignore)
+        transport = FakeStreamTransport()
+        protocol.connection_made(transport)
+        protocol.framer.max_message_size = 64
+
+        protocol.data_received(b"OPTIONS sip:bob@example.com SIP/2.0\r\nX-Padding: " + b"x" * 100)
+        assert transport.closed
+        assert protocol.parse_errors == 1
+        protocol.connection_lost(None)
+
+    asyncio.run(run())